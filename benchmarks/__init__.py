@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
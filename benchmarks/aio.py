@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+benchmarks.aio
+--------------
+
+asyncio mode of the benchmarks (Python 3.7 or later).
+'''
+
+import array
+import time
+
+from dnszonetest.aio import AsyncDnsZoneTest, AsyncRecord
+
+
+def async_zone_test(*args, **kwargs):
+    '''
+    Returns an AsyncDnsZoneTest keeping the latency of every query in its
+    `latencies` attribute.
+    '''
+    latencies = array.array('d')
+
+    class Record(AsyncRecord):
+        __slots__ = ()
+
+        async def query(self, *args, **kwargs):
+            start = time.time()
+            await AsyncRecord.query(self, *args, **kwargs)
+            latencies.append(time.time() - start)
+
+    class AsyncBenchZoneTest(AsyncDnsZoneTest):
+        record_class = Record
+
+    dzt = AsyncBenchZoneTest(*args, **kwargs)
+    dzt.latencies = latencies
+    return dzt
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+benchmarks.bench
+----------------
+
+Times :meth:`dnszonetest.main.DnsZoneTest.compare` against the stand-in
+name server of :mod:`benchmarks.server`, for generated zones of several
+sizes and in every query mode. Reports queries per second, p50 and p99
+query latency and peak RSS.
+
+Every case runs in a fresh process, so peak RSS is that of the case. Run
+from the top of the repository::
+
+  python -m benchmarks.bench --records 1000,100000 --modes udp,udp-threads
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import array
+import json
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.server import Server, write_zonefile
+from dnszonetest.main import DnsZoneTest
+
+ORIGIN = 'bench.example.'
+
+# Keyword arguments of DnsZoneTest per mode; concurrency is added for the
+# concurrent modes.
+MODES = {
+    'udp': dict(protocol='udp'),
+    'udp-threads': dict(protocol='udp', concurrency=None),
+    'udp-processes': dict(protocol='udp', concurrency=None, processes=None),
+    'tcp': dict(protocol='tcp'),
+    'tcp-threads': dict(protocol='tcp', concurrency=None),
+    'tcp-pipeline': dict(protocol='tcp', concurrency=None, tcp_connections=4),
+}
+if sys.version_info >= (3, 7):
+    # dnszonetest.aio needs asyncio.run and asyncio.get_running_loop.
+    MODES['asyncio'] = dict(concurrency=None)
+
+
+class BenchZoneTest(DnsZoneTest):
+    '''
+    DnsZoneTest keeping the latency of every query.
+    '''
+    def __init__(self, *args, **kwargs):
+        DnsZoneTest.__init__(self, *args, **kwargs)
+        self.latencies = array.array(str('d'))
+
+    def query_record(self, record):
+        start = time.time()
+        DnsZoneTest.query_record(self, record)
+        self.latencies.append(time.time() - start)
+        return record
+
+    def merge_shard(self, shard):
+        DnsZoneTest.merge_shard(self, shard)
+        self.latencies.extend(shard.latencies)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def peak_rss():
+    '''
+    Returns the peak RSS in MB of this process and its finished children.
+    '''
+    rss = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # Kilobytes on Linux, bytes on macOS.
+    if sys.platform == 'darwin':
+        rss /= 1024
+    return rss / 1024.0
+
+
+def run_case(args):
+    '''
+    Runs one case in this process and returns its result.
+    '''
+    kwargs = dict(MODES[args.mode])
+    for option in ('concurrency', 'processes'):
+        if option in kwargs:
+            kwargs[option] = getattr(args, option)
+    kwargs.update(
+        quiet=True,
+        stream=args.stream,
+        compact=args.compact,
+        retries=args.retries,
+        timeout=args.timeout,
+    )
+    with Server(ORIGIN, args.latency, args.loss, args.truncation) as server:
+        kwargs['port'] = server.port
+        if args.mode == 'asyncio':
+            import asyncio
+            from benchmarks.aio import async_zone_test
+            dzt = async_zone_test(ORIGIN, args.zonefile, '127.0.0.1',
+                                  **kwargs)
+            start = time.time()
+            asyncio.run(dzt.compare())
+        else:
+            dzt = BenchZoneTest(ORIGIN, args.zonefile, '127.0.0.1', **kwargs)
+            start = time.time()
+            dzt.compare()
+        elapsed = time.time() - start
+    latencies = sorted(dzt.latencies)
+    return dict(
+        mode=args.mode,
+        records=args.records,
+        seconds=round(elapsed, 3),
+        qps=round(len(latencies) / elapsed, 1),
+        p50_ms=round(percentile(latencies, 0.5) * 1000, 3),
+        p99_ms=round(percentile(latencies, 0.99) * 1000, 3),
+        peak_rss_mb=round(peak_rss(), 1),
+        mismatches=dzt.mismatch_rdataset,
+    )
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description='dnszonetest benchmarks',
+    )
+    parser.add_argument(
+        '--records',
+        default='1000,100000,1000000',
+        help='Comma separated zone sizes (default: 1000,100000,1000000).',
+    )
+    parser.add_argument(
+        '--modes',
+        default=','.join(sorted(MODES)),
+        help='Comma separated modes (default: all): {0}.'.format(
+            ', '.join(sorted(MODES))),
+    )
+    parser.add_argument(
+        '-c',
+        '--concurrency',
+        type=int,
+        default=64,
+        help='Concurrency of the concurrent modes (default: 64).',
+    )
+    parser.add_argument(
+        '-P',
+        '--processes',
+        type=int,
+        default=4,
+        help='Processes of the processes modes (default: 4).',
+    )
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0,
+        help='Seconds the server delays every response (default: 0).',
+    )
+    parser.add_argument(
+        '--loss',
+        type=float,
+        default=0,
+        help='Fraction of UDP queries the server drops (default: 0).',
+    )
+    parser.add_argument(
+        '--truncation',
+        type=float,
+        default=0,
+        help='Fraction of UDP responses the server truncates (default: 0).',
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=2,
+        help='Maximum query timeout in seconds (default: 2).',
+    )
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=2,
+        help='Query retries (default: 2).',
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Read the zone file in chunks.',
+    )
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='Keep the zone in compact form.',
+    )
+    parser.add_argument(
+        '--json',
+        help='Write the results as JSON to this file.',
+    )
+    # Internal: run one case in this process.
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    parser.add_argument('--zonefile', help=argparse.SUPPRESS)
+    return parser.parse_args(args)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.CRITICAL)
+    if args.case:
+        args.mode = args.case
+        args.records = int(args.records)
+        print(json.dumps(run_case(args)))
+        return 0
+    modes = args.modes.split(',')
+    for mode in modes:
+        if mode not in MODES:
+            sys.exit('Unknown mode: {0}'.format(mode))
+    results = []
+    columns = ('mode', 'records', 'seconds', 'qps', 'p50_ms', 'p99_ms',
+               'peak_rss_mb', 'mismatches')
+    print(' '.join('{0:>14}'.format(column) for column in columns))
+    tmpdir = tempfile.mkdtemp(prefix='dnszonetest-bench-')
+    try:
+        for records in [int(records) for records in args.records.split(',')]:
+            zonefile = os.path.join(tmpdir, 'zone{0}'.format(records))
+            write_zonefile(zonefile, ORIGIN, records)
+            for mode in modes:
+                output = subprocess.check_output(
+                    [sys.executable, '-m', 'benchmarks.bench'] + argv + [
+                        '--case', mode,
+                        '--records', str(records),
+                        '--zonefile', zonefile,
+                    ]
+                )
+                result = json.loads(output.decode('utf-8').splitlines()[-1])
+                results.append(result)
+                print(' '.join(
+                    '{0:>14}'.format(result[column]) for column in columns))
+                sys.stdout.flush()
+    finally:
+        shutil.rmtree(tmpdir)
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+benchmarks.server
+-----------------
+
+In-process stand-in authoritative name server for benchmarks.
+
+The zone is generated, not loaded: ``h<n>.<origin>`` has the A record
+10.x.y.z with x.y.z the bytes of n, so answers are computed from the query
+name and the server needs no memory for large zones. UDP and TCP are
+served on the same port of 127.0.0.1, with optional latency, loss and
+truncation of UDP responses.
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import heapq
+import io
+import random
+import socket
+import struct
+import threading
+import time
+
+from dnszonetest.wire import read_name
+
+TTL = 3600
+
+
+def address(index):
+    '''
+    Returns the IPv4 address of host index as text.
+    '''
+    return '10.{0}.{1}.{2}'.format(
+        (index >> 16) & 0xff, (index >> 8) & 0xff, index & 0xff)
+
+
+def write_zonefile(path, origin, records):
+    '''
+    Writes a zone file with records A records served by :class:`Server`.
+    '''
+    with io.open(path, 'w', encoding='utf-8') as fh:
+        fh.write('$ORIGIN {0}\n$TTL {1}\n'.format(origin, TTL))
+        fh.write('@ IN SOA ns hostmaster 1 3600 900 604800 300\n')
+        fh.write('@ IN NS ns\n')
+        for index in range(records):
+            fh.write('h{0} IN A {1}\n'.format(index, address(index)))
+
+
+class _Delayer(object):
+    '''
+    Calls functions after a delay, in one thread.
+    '''
+    def __init__(self):
+        self._queue = []
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._count = 0
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def call_later(self, delay, func, *args):
+        with self._cond:
+            self._count += 1
+            heapq.heappush(
+                self._queue, (time.time() + delay, self._count, func, args))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped and (
+                        not self._queue or
+                        self._queue[0][0] > time.time()):
+                    self._cond.wait(
+                        self._queue[0][0] - time.time()
+                        if self._queue else None)
+                if self._stopped:
+                    return
+                _, _, func, args = heapq.heappop(self._queue)
+            try:
+                func(*args)
+            except socket.error:
+                pass
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+
+class Server(object):
+    '''
+    Stand-in name server for the zone of :func:`write_zonefile`. Use as a
+    context manager; the port is in `self.port` and the number of queries
+    answered in `self.queries`.
+    '''
+    def __init__(self, origin, latency=0, loss=0, truncation=0):
+        '''
+        :param str origin: zone name.
+        :param float latency: seconds to delay every response.
+        :param float loss: fraction of UDP queries to drop.
+        :param float truncation: fraction of UDP responses to truncate, so
+            the client retries over TCP.
+        '''
+        self.origin = tuple(
+            label.encode('ascii') for label in origin.lower().split('.')
+            if label
+        )
+        self.latency = latency
+        self.loss = loss
+        self.truncation = truncation
+        self.queries = 0
+        self._random = random.Random(0)
+        self._delayer = None
+        self._threads = []
+        self.tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.tcp.bind(('127.0.0.1', 0))
+        self.port = self.tcp.getsockname()[1]
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        self.udp.bind(('127.0.0.1', self.port))
+
+    def answer(self, query, tcp=False):
+        '''
+        Returns the response to query in wire format, or None to drop it.
+        '''
+        if len(query) < 12:
+            return None
+        flags, qdcount = struct.unpack('!HH', query[2:6])
+        if flags & 0x8000 or qdcount != 1:
+            return None
+        try:
+            labels, end = read_name(query, 12)
+            qtype, _ = struct.unpack('!HH', query[end:end + 4])
+        except (IndexError, ValueError, struct.error):
+            return None
+        self.queries += 1
+        if not tcp:
+            if self.loss and self._random.random() < self.loss:
+                return None
+            truncate = self.truncation and \
+                self._random.random() < self.truncation
+        else:
+            truncate = False
+        question = query[12:end + 4]
+        # QR, AA, and RD copied from the query.
+        flags = 0x8400 | (flags & 0x0100)
+        rdata = None
+        if not labels or labels[1:] != self.origin or \
+                not labels[0].startswith(b'h'):
+            flags |= 3  # NXDOMAIN
+        elif qtype == 1:
+            try:
+                index = int(labels[0][1:])
+            except ValueError:
+                index = -1
+            if index < 0:
+                flags |= 3
+            else:
+                rdata = struct.pack('!I', (10 << 24) | (index & 0xffffff))
+        if truncate:
+            flags |= 0x0200
+            rdata = None
+        header = query[:2] + struct.pack(
+            '!HHHHH', flags, 1, 1 if rdata else 0, 0, 0)
+        if rdata is None:
+            return header + question
+        return header + question + b'\xc0\x0c' + \
+            struct.pack('!HHIH', 1, 1, TTL, 4) + rdata
+
+    def _send(self, func, *args):
+        if self.latency:
+            self._delayer.call_later(self.latency, func, *args)
+        else:
+            func(*args)
+
+    def _serve_udp(self):
+        while True:
+            try:
+                query, addr = self.udp.recvfrom(65535)
+            except socket.error:
+                return
+            response = self.answer(query)
+            if response is not None:
+                self._send(self.udp.sendto, response, addr)
+
+    def _serve_tcp_connection(self, conn):
+        lock = threading.Lock()
+
+        def send(data):
+            with lock:
+                conn.sendall(data)
+
+        try:
+            while True:
+                data = b''
+                while len(data) < 2:
+                    chunk = conn.recv(2 - len(data))
+                    if not chunk:
+                        return
+                    data += chunk
+                length = struct.unpack('!H', data)[0]
+                query = b''
+                while len(query) < length:
+                    chunk = conn.recv(length - len(query))
+                    if not chunk:
+                        return
+                    query += chunk
+                response = self.answer(query, tcp=True)
+                if response is not None:
+                    self._send(
+                        send, struct.pack('!H', len(response)) + response)
+        except socket.error:
+            pass
+        finally:
+            if self.latency:
+                # Close after the delayed responses are sent.
+                self._delayer.call_later(self.latency, conn.close)
+            else:
+                conn.close()
+
+    def _serve_tcp(self):
+        self.tcp.listen(128)
+        while True:
+            try:
+                conn, _ = self.tcp.accept()
+            except socket.error:
+                return
+            thread = threading.Thread(
+                target=self._serve_tcp_connection, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def __enter__(self):
+        if self.latency:
+            self._delayer = _Delayer()
+        for target in (self._serve_udp, self._serve_tcp):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def __exit__(self, *exc_info):
+        for sock in (self.udp, self.tcp):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            sock.close()
+        if self._delayer is not None:
+            self._delayer.stop()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.aio
+---------------
+
+asyncio API for dnszonetest (Python 3.7 or later).
+
+All queries for a zone are multiplexed over a small pool of non-blocking
+UDP sockets and responses are matched to queries by message ID.
+'''
+
+import asyncio
+import itertools
+import logging
+import random
+import struct
+
+import dns.exception
+import dns.message
+
+from dnszonetest.main import DnsZoneTest, Record
+from dnszonetest.profiling import NULL_PROFILER, cprofile
+from dnszonetest.scheduler import RetryScheduler
+from dnszonetest.wire import is_response
+
+logger = logging.getLogger(__name__)
+
+
+class _Protocol(asyncio.DatagramProtocol):
+    def __init__(self, pending):
+        self.pending = pending
+
+    def datagram_received(self, data, addr):
+        if len(data) < 2:
+            return
+        future = self.pending.get((data[0] << 8) | data[1])
+        if future is not None and not future.done():
+            future.set_result(data)
+
+
+class UDPMultiplexer(object):
+    '''
+    Sends DNS queries to one name server over a pool of UDP sockets.
+    '''
+    def __init__(self, nameserver_ip, port=53, sockets=1):
+        '''
+        :param str nameserver_ip: IP number of the name server.
+        :param int port: port of the name server.
+        :param int sockets: number of UDP sockets to use.
+        '''
+        self.nameserver_ip = nameserver_ip
+        self.port = port
+        self.sockets = sockets
+        self._transports = []
+        self._pending = []
+        self._next = None
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        for _ in range(self.sockets):
+            pending = {}
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _Protocol(pending),
+                remote_addr=(self.nameserver_ip, self.port),
+            )
+            self._transports.append(transport)
+            self._pending.append(pending)
+        self._next = itertools.cycle(range(self.sockets))
+
+    def close(self):
+        for transport in self._transports:
+            transport.close()
+        self._transports = []
+        self._pending = []
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    async def query(self, q, timeout=10):
+        '''
+        Sends query message q and waits for the matching response.
+
+        :param dns.message.Message q: query message. Its ID is replaced by
+            one that is unique on the socket used.
+        :param float timeout: seconds to wait for the response.
+
+        :raises dns.exception.Timeout: when no response arrived in time.
+
+        :returns: response message.
+        :rtype: dns.message.Message
+        '''
+        return dns.message.from_wire(await self.query_wire(q, timeout))
+
+    async def query_wire(self, q, timeout=10):
+        '''
+        As :meth:`query`, but returns the response in wire format without
+        parsing it. q may also be a query in wire format.
+
+        :rtype: bytes
+        '''
+        loop = asyncio.get_running_loop()
+        index = next(self._next)
+        pending = self._pending[index]
+        qid = random.randint(0, 0xffff)
+        while qid in pending:
+            qid = random.randint(0, 0xffff)
+        if isinstance(q, bytes):
+            wire = struct.pack('!H', qid) + q[2:]
+        else:
+            q.id = qid
+            wire = q.to_wire()
+        deadline = loop.time() + timeout
+        try:
+            pending[qid] = loop.create_future()
+            self._transports[index].sendto(wire)
+            while True:
+                try:
+                    data = await asyncio.wait_for(
+                        pending[qid],
+                        max(deadline - loop.time(), 0),
+                    )
+                except asyncio.TimeoutError:
+                    raise dns.exception.Timeout(timeout=timeout)
+                if is_response(wire, data):
+                    return data
+                # Not an answer to our question; keep waiting.
+                pending[qid] = loop.create_future()
+        finally:
+            pending.pop(qid, None)
+
+
+class AsyncRecord(Record):
+    __slots__ = ()
+
+    async def query(self, multiplexer, no_recursion=False, scheduler=None,
+                    profiler=NULL_PROFILER, cache=None):
+        self.nameserver_ip = multiplexer.nameserver_ip
+        with profiler.stage('build'):
+            self.make_query_msg(no_recursion)
+        loop = asyncio.get_running_loop()
+        if cache is not None:
+            # The cache blocks on SQLite; keep it off the event loop.
+            self.query_res = await loop.run_in_executor(
+                None, cache.get, self.nameserver_ip, multiplexer.port,
+                self.query_msg)
+            if self.query_res is not None:
+                with profiler.stage('response'):
+                    self.read_responses()
+                return
+        if scheduler is None:
+            scheduler = RetryScheduler(retries=0, initial_timeout=10)
+        metrics = scheduler.metrics
+        try:
+            with profiler.stage('network'):
+                for attempt in range(scheduler.retries + 1):
+                    timeout = scheduler.timeout(self.nameserver_ip, attempt)
+                    if scheduler.pacer is not None:
+                        await asyncio.sleep(
+                            scheduler.pacer.reserve(self.nameserver_ip))
+                    if metrics is not None:
+                        metrics.sent(self.nameserver_ip, len(self.query_msg),
+                                     attempt > 0)
+                    start = loop.time()
+                    try:
+                        self.query_res = await multiplexer.query_wire(
+                            self.query_msg,
+                            timeout=timeout,
+                        )
+                    except dns.exception.Timeout:
+                        if metrics is not None:
+                            metrics.count(self.nameserver_ip, 'timeouts')
+                        if attempt == scheduler.retries:
+                            raise
+                        continue
+                    rtt = loop.time() - start
+                    scheduler.update(self.nameserver_ip, rtt)
+                    if metrics is not None:
+                        metrics.received(self.nameserver_ip,
+                                         len(self.query_res), rtt)
+                    break
+        except dns.exception.Timeout as err:
+            logger.error(
+                '%-21s: %s %s',
+                'Timeout',
+                self.name,
+                err,
+            )
+        if cache is not None and self.query_res is not None:
+            await loop.run_in_executor(
+                None, cache.put, self.nameserver_ip, multiplexer.port,
+                self.query_msg, self.query_res)
+        with profiler.stage('response'):
+            self.read_responses()
+
+
+class AsyncDnsZoneTest(DnsZoneTest):
+    '''
+    asyncio equivalent of :class:`dnszonetest.main.DnsZoneTest`. Only
+    supports the UDP protocol; truncated responses are not retried over
+    TCP.
+    '''
+    record_class = AsyncRecord
+
+    def __init__(self, *args, sockets=1, **kwargs):
+        '''
+        Takes the arguments of :class:`dnszonetest.main.DnsZoneTest`, with
+        concurrency defaulting to 100, and:
+
+        :param int sockets: number of UDP sockets to multiplex queries over.
+        '''
+        kwargs.setdefault('concurrency', 100)
+        super().__init__(*args, **kwargs)
+        self.sockets = sockets
+
+    async def compare_rdatasets(self):
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        multiplexers = {}
+
+        async def check(record):
+            start = loop.time()
+            try:
+                await record.query(
+                    multiplexers[record.nameserver_ip],
+                    self.no_recursion,
+                    self.scheduler,
+                    self.profiler,
+                    self.cache,
+                )
+            finally:
+                semaphore.release()
+            self.metrics.record(record.name, record.nameserver_ip,
+                                loop.time() - start)
+            self.check_records(record)
+
+        self.open_cache()
+        try:
+            for nameserver_ip in self.nameserver_ips:
+                multiplexers[nameserver_ip] = UDPMultiplexer(
+                    nameserver_ip, self.port, self.sockets)
+                await multiplexers[nameserver_ip].open()
+            for record in itertools.chain(self.records(),
+                                          self.removed_records(),
+                                          self.probe_records()):
+                await semaphore.acquire()
+                if self.should_abort():
+                    semaphore.release()
+                    break
+                task = asyncio.ensure_future(check(record))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if self.aborted:
+                # Cancel the queries in flight.
+                for task in list(tasks):
+                    task.cancel()
+            for result in await asyncio.gather(*tasks,
+                                               return_exceptions=True):
+                # CancelledError is an Exception before Python 3.8.
+                if isinstance(result, Exception) and \
+                        not isinstance(result, asyncio.CancelledError):
+                    raise result
+        finally:
+            for multiplexer in multiplexers.values():
+                multiplexer.close()
+            self.close_cache()
+        self.update_errno()
+
+    async def compare(self):
+        loop = asyncio.get_running_loop()
+        self.metrics.start()
+        self.open_results()
+        try:
+            with cprofile(self.profile_file):
+                # Resolving, parsing and zone transfers block; keep them off
+                # the event loop.
+                await loop.run_in_executor(None, self.get_nameserver_ip)
+                if not self.stream:
+                    await loop.run_in_executor(None, self.get_zone_from_file)
+                if self.axfr:
+                    await loop.run_in_executor(None, self.compare_axfr)
+                else:
+                    await self.compare_rdatasets()
+        finally:
+            self.close_results()
+        self.finish()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.batch
+-----------------
+
+Checks many zones in one run, through one worker pool and one set of name
+server connections.
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import io
+import itertools
+import logging
+import os
+
+import dns.exception
+
+from dnszonetest.exceptions import DnszonetestException
+from dnszonetest.main import DnsZoneTest
+from dnszonetest.pool import imap_unordered
+from dnszonetest.profiling import cprofile
+
+logger = logging.getLogger(__name__)
+
+ZONEFILE_PREFIXES = ('db.',)
+ZONEFILE_SUFFIXES = ('.zone', '.db')
+
+# Errors that fail one zone of a batch and not the batch: its zone file can
+# not be read or parsed, or the zone can not be transferred.
+_ZONE_ERRORS = (DnszonetestException, dns.exception.DNSException, IOError,
+                OSError)
+
+
+def read_manifest(manifest):
+    '''
+    Returns (zonename, zonefile) tuples from a manifest file with one
+    "zonename zonefile" pair per line. Zone file names are relative to the
+    directory of the manifest. Empty lines and lines starting with # are
+    ignored.
+
+    :param str manifest: manifest file name.
+    '''
+    directory = os.path.dirname(manifest)
+    zones = []
+    try:
+        with io.open(manifest, 'r', encoding='utf-8') as fh:
+            for line in fh:
+                fields = line.split('#', 1)[0].split()
+                if not fields:
+                    continue
+                if len(fields) != 2:
+                    raise DnszonetestException(
+                        'Invalid manifest line: {0}'.format(line.strip())
+                    )
+                zones.append(
+                    (fields[0], os.path.join(directory, fields[1]))
+                )
+    except IOError as err:
+        raise DnszonetestException(
+            'Unable to read manifest: {0}'.format(err)
+        )
+    return zones
+
+
+def read_directory(directory):
+    '''
+    Returns (zonename, zonefile) tuples for the zone files in directory.
+    A zone file is named after its zone, optionally with a "db." prefix or
+    a ".zone" or ".db" suffix (db.example.com, example.com.zone).
+
+    :param str directory: directory name.
+    '''
+    zones = []
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        if filename.startswith('.') or not os.path.isfile(path):
+            continue
+        zonename = filename
+        for prefix in ZONEFILE_PREFIXES:
+            if zonename.startswith(prefix):
+                zonename = zonename[len(prefix):]
+        for suffix in ZONEFILE_SUFFIXES:
+            if zonename.endswith(suffix):
+                zonename = zonename[:-len(suffix)]
+        zones.append((zonename, path))
+    return zones
+
+
+def read_zones(path):
+    '''
+    Returns (zonename, zonefile) tuples from a manifest file or a directory
+    of zone files.
+    '''
+    if os.path.isdir(path):
+        return read_directory(path)
+    return read_manifest(path)
+
+
+class BatchZoneTest(object):
+    '''
+    Runs a :class:`dnszonetest.main.DnsZoneTest` per zone. Name servers are
+    resolved once, and all zones share the worker pool, query scheduler,
+    TCP connections, response cache, state file, metrics, profiler and
+    results file.
+    '''
+    def __init__(self, zones, **kwargs):
+        '''
+        :param list zones: (zonename, zonefile) tuples.
+
+        Other keyword arguments are passed to every
+        :class:`dnszonetest.main.DnsZoneTest`. processes is not used: all
+        zones run in this process.
+        '''
+        self.tests = [
+            DnsZoneTest(zonename, zonefile, **kwargs)
+            for zonename, zonefile in zones
+        ]
+        self.concurrency = kwargs.get('concurrency', 1)
+        self.failed = set()
+        self.aborted = False
+        self.errno = 3
+
+    def records(self):
+        '''
+        Yields (DnsZoneTest, Record) for the records of all zones, reading
+        one zone file at a time.
+        '''
+        for dzt in self.tests:
+            try:
+                if not dzt.stream:
+                    dzt.get_zone_from_file()
+                for record in itertools.chain(dzt.records(),
+                                              dzt.removed_records(),
+                                              dzt.probe_records()):
+                    yield dzt, record
+            except _ZONE_ERRORS as err:
+                logger.error('%-21s: %s', dzt.zonename, err)
+                self.failed.add(dzt)
+            finally:
+                # Records in flight keep their own rdatasets.
+                dzt.close_zone()
+                dzt.zone_from_file = None
+
+    @staticmethod
+    def query_record(item):
+        dzt, record = item
+        dzt.query_record(record)
+        return item
+
+    def compare_axfr(self):
+        for dzt in self.tests:
+            try:
+                dzt.get_zone_from_file()
+                dzt.compare_axfr()
+            except _ZONE_ERRORS as err:
+                logger.error('%-21s: %s', dzt.zonename, err)
+                self.failed.add(dzt)
+            finally:
+                dzt.close_zone()
+                dzt.zone_from_file = None
+
+    def compare_rdatasets(self):
+        '''
+        Queries and compares the records of all zones. Stops once
+        max_mismatches records of all zones together mismatched.
+        '''
+        if self.concurrency > 1:
+            items = imap_unordered(
+                self.query_record,
+                self.records(),
+                self.concurrency,
+            )
+        else:
+            items = (self.query_record(item) for item in self.records())
+        max_mismatches = self.tests[0].max_mismatches
+        mismatches = 0
+        try:
+            for dzt, record in items:
+                for result in dzt.check_records(record):
+                    mismatches += result.mismatch
+                if max_mismatches and mismatches >= max_mismatches:
+                    logger.error('%-21s: %d mismatches', 'Stopped',
+                                 mismatches)
+                    self.aborted = True
+                    break
+        finally:
+            items.close()
+
+    def write_metrics(self):
+        '''
+        Writes the query metrics of all zones to the metrics files of the
+        first, with the mismatches of all zones added up.
+        '''
+        first = self.tests[0]
+        first.metrics.stop()
+        mismatches = collections.defaultdict(collections.Counter)
+        for dzt in self.tests:
+            for nameserver_ip, counter in dzt.nameserver_mismatches.items():
+                mismatches[nameserver_ip].update(counter)
+        if first.metrics_file:
+            first.metrics.write_json(first.metrics_file, mismatches)
+        if first.prometheus_file:
+            first.metrics.write_prometheus(first.prometheus_file, mismatches)
+
+    def compare(self):
+        if not self.tests:
+            self.errno = 0
+            return
+        first = self.tests[0]
+        first.metrics.start()
+        first.open_results()
+        with cprofile(first.profile_file):
+            first.get_nameserver_ip()
+            first.open_transports()
+            first.open_cache()
+            for dzt in self.tests[1:]:
+                dzt.nameserver_ip = first.nameserver_ip
+                dzt.nameserver_ips = first.nameserver_ips
+                dzt.scheduler = first.scheduler
+                dzt.metrics = first.metrics
+                dzt.profiler = first.profiler
+                dzt.state = first.state
+                dzt.transports = first.transports
+                dzt.cache = first.cache
+                dzt.results_writer = first.results_writer
+            try:
+                if first.axfr:
+                    self.compare_axfr()
+                else:
+                    self.compare_rdatasets()
+            finally:
+                first.close_transports()
+                first.close_cache()
+                first.close_results()
+        for dzt in self.tests:
+            if dzt not in self.failed:
+                dzt.update_errno()
+                logger.info(
+                    '%-21s: %d rdataset, %d TTL, %d extra, %d response, '
+                    '%d NXDOMAIN mismatches',
+                    dzt.zonename,
+                    dzt.mismatch_rdataset,
+                    dzt.mismatch_ttl,
+                    dzt.mismatch_extra,
+                    dzt.mismatch_response,
+                    dzt.mismatch_nxdomain,
+                )
+                if dzt.sample_population:
+                    dzt.log_sample()
+        if first.state is not None:
+            first.state.save()
+        self.write_metrics()
+        if first.profiler.enabled:
+            first.profiler.log()
+        self.errno = max(dzt.errno for dzt in self.tests)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.cache
+-----------------
+
+On-disk cache of responses, shared by runs, zones and processes: a SQLite
+database of responses in wire format, keyed by name server, query name,
+type, class and flags.
+
+A response is kept for the lowest TTL of its records, and at most max_age
+seconds. Only NOERROR and NXDOMAIN responses that are not truncated are
+kept; responses without records only with max_age.
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import sqlite3
+import threading
+import time
+
+import dns.flags
+import dns.name
+import dns.rcode
+
+from dnszonetest.wire import min_ttl, read_header, read_question, to_wire
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS responses (
+    nameserver TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    qname TEXT NOT NULL,
+    qtype INTEGER NOT NULL,
+    qclass INTEGER NOT NULL,
+    flags INTEGER NOT NULL,
+    expires REAL NOT NULL,
+    response BLOB NOT NULL,
+    PRIMARY KEY (nameserver, port, qname, qtype, qclass, flags)
+)
+'''
+
+_KEY = ('nameserver = ? AND port = ? AND qname = ? AND qtype = ? AND '
+        'qclass = ? AND flags = ?')
+
+# Responses are committed in batches of this many.
+COMMIT_EVERY = 100
+
+
+class ResponseCache(object):
+    '''
+    Thread safe cache of responses in a SQLite database. Every process opens
+    its own ResponseCache.
+    '''
+    def __init__(self, path, max_age=None, metrics=None):
+        '''
+        :param str path: database file name.
+        :param float max_age: maximum seconds to keep a response (default:
+            its lowest TTL).
+        :param dnszonetest.metrics.Metrics metrics: counts the responses
+            read from the cache ("cached").
+        '''
+        self.path = path
+        self.max_age = max_age
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._db = sqlite3.connect(path, timeout=30,
+                                   check_same_thread=False)
+        with self._lock:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(_SCHEMA)
+            self._db.execute('DELETE FROM responses WHERE expires <= ?',
+                             (time.time(),))
+            self._db.commit()
+
+    @staticmethod
+    def key(nameserver_ip, port, query):
+        '''
+        Returns the key of query, in wire format, to nameserver_ip.
+        '''
+        flags, labels, rdtype, rdclass = read_question(query)
+        qname = dns.name.Name(labels + (b'',)).to_text()
+        # The flags of the query, but the opcode.
+        flags &= dns.flags.RD | dns.flags.CD | dns.flags.AD
+        return (nameserver_ip, port, qname, rdtype, rdclass, flags)
+
+    def get(self, nameserver_ip, port, query):
+        '''
+        Returns the cached response to query, in wire format, with the ID of
+        query, or None.
+
+        :param str nameserver_ip: IP number of the name server.
+        :param int port: port of the name server.
+        :param bytes query: query in wire format.
+        '''
+        with self._lock:
+            row = self._db.execute(
+                'SELECT response, expires FROM responses WHERE ' + _KEY,
+                self.key(nameserver_ip, port, query),
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        if self.metrics is not None:
+            self.metrics.count(nameserver_ip, 'cached')
+        return query[:2] + bytes(row[0])[2:]
+
+    def put(self, nameserver_ip, port, query, response):
+        '''
+        Caches response to query, when it may be kept.
+
+        :param str nameserver_ip: IP number of the name server.
+        :param int port: port of the name server.
+        :param bytes query: query in wire format.
+        :param response: response message or its wire format.
+        '''
+        response = to_wire(response)
+        flags = read_header(response)[0]
+        if flags & 0xf not in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN) or \
+                flags & dns.flags.TC:
+            return
+        ttl = min_ttl(response)
+        if self.max_age is not None:
+            ttl = self.max_age if ttl is None else min(ttl, self.max_age)
+        if not ttl:
+            return
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, '
+                '?, ?)',
+                self.key(nameserver_ip, port, query) +
+                (time.time() + ttl, sqlite3.Binary(response)),
+            )
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._db.commit()
+                self._pending = 0
+
+    def close(self):
+        '''
+        Commits the pending responses and closes the database.
+        '''
+        with self._lock:
+            self._db.commit()
+            self._db.close()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.classify
+--------------------
+
+Classifies a whole response to a query: its rcode, AA flag, the RRsets of
+the answer section, and the authority section of a negative answer or a
+referral.
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import dns.flags
+import dns.rcode
+import dns.rdatatype
+
+# Kinds of response. Other rcodes than NOERROR and NXDOMAIN are their name
+# in lower case.
+ANSWER = 'answer'
+CNAME = 'cname'
+DNAME = 'dname'
+NODATA = 'nodata'
+NXDOMAIN = 'nxdomain'
+REFERRAL = 'referral'
+TIMEOUT = 'timeout'
+
+
+class Verdict(object):
+    '''
+    Classification of a response.
+
+    :ivar str kind: kind of response.
+    :ivar bool authoritative: the AA flag is set.
+    :ivar str target: target of a CNAME or DNAME, or the delegated name of
+        a referral.
+    :ivar list unexpected: "name type" of the answer RRsets that are neither
+        the RRset queried, nor its signatures, nor an alias chain leading to
+        it.
+    '''
+    __slots__ = ('kind', 'authoritative', 'target', 'unexpected')
+
+    def __init__(self, kind, authoritative=False, target=None,
+                 unexpected=()):
+        self.kind = kind
+        self.authoritative = authoritative
+        self.target = target
+        self.unexpected = list(unexpected)
+
+    def __str__(self):
+        if self.kind == REFERRAL:
+            return 'referral to {0}'.format(self.target)
+        if self.kind in (ANSWER, TIMEOUT):
+            return self.kind
+        if self.target is not None:
+            return '{0} {1}'.format(self.kind.upper(), self.target)
+        return self.kind.upper()
+
+    __unicode__ = __str__
+
+
+# Verdicts of answers read in wire format; see :func:`answer_verdict`.
+_ANSWERS = {
+    True: Verdict(ANSWER, True),
+    False: Verdict(ANSWER, False),
+}
+
+TIMEOUT_VERDICT = Verdict(TIMEOUT)
+
+
+def answer_verdict(authoritative):
+    '''
+    Returns the Verdict of a NOERROR response that holds only the RRset
+    queried. Verdicts are shared; do not change them.
+    '''
+    return _ANSWERS[bool(authoritative)]
+
+
+def classify(response, qname, rdtype, covers=dns.rdatatype.NONE):
+    '''
+    Returns the Verdict of response to a query for qname and rdtype.
+
+    :param dns.message.Message response: response.
+    :param dns.name.Name qname: name queried.
+    :param int rdtype: type queried.
+    :param int covers: type covered, for RRSIG records.
+    '''
+    authoritative = bool(response.flags & dns.flags.AA)
+    rcode = response.rcode()
+    # Follow CNAME and DNAME records from qname, as a resolver would.
+    names = [qname]
+    kind = None
+    target = None
+    unexpected = []
+    for rrset in response.answer:
+        if rrset.rdtype == dns.rdatatype.DNAME and \
+                names[-1].is_subdomain(rrset.name) and \
+                names[-1] != rrset.name and rdtype != dns.rdatatype.DNAME:
+            if kind is None:
+                kind, target = DNAME, rrset[0].target
+            continue
+        if rrset.name not in names:
+            unexpected.append(rrset)
+            continue
+        if rrset.rdtype == rdtype and (
+                rdtype not in (dns.rdatatype.RRSIG, dns.rdatatype.SIG) or
+                rrset.covers == covers):
+            if rrset.name == qname:
+                kind = ANSWER
+            continue
+        if rrset.rdtype == dns.rdatatype.CNAME and \
+                rdtype != dns.rdatatype.CNAME:
+            if kind is None:
+                kind, target = CNAME, rrset[0].target
+            names.append(rrset[0].target)
+            continue
+        if rrset.rdtype in (dns.rdatatype.RRSIG, dns.rdatatype.SIG) or \
+                rdtype == dns.rdatatype.RRSIG:
+            continue
+        unexpected.append(rrset)
+    if rcode == dns.rcode.NXDOMAIN:
+        kind = NXDOMAIN
+    elif rcode != dns.rcode.NOERROR:
+        kind = dns.rcode.to_text(rcode).lower()
+    elif kind is None:
+        kind = NODATA
+        if not authoritative:
+            for rrset in response.authority:
+                if rrset.rdtype == dns.rdatatype.SOA:
+                    break
+                if rrset.rdtype == dns.rdatatype.NS:
+                    kind, target = REFERRAL, rrset.name
+    return Verdict(
+        kind,
+        authoritative,
+        target,
+        [
+            '{0} {1}'.format(rrset.name, dns.rdatatype.to_text(rrset.rdtype))
+            for rrset in unexpected
+        ],
+    )
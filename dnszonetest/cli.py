@@ -16,7 +16,9 @@ import logging
 import logging.handlers
 import sys
 
+from dnszonetest.batch import BatchZoneTest, read_zones
 from dnszonetest.main import DnsZoneTest
+from dnszonetest.results import WRITERS
 
 logger = logging.getLogger(__name__)
 
@@ -76,16 +78,27 @@ def parse_args(args):
     )
     parser.add_argument(
         'zonename',
+        nargs='?',
         help='zone name',
     )
     parser.add_argument(
         'zonefile',
+        nargs='?',
         help='zone file',
     )
+    parser.add_argument(
+        '-b',
+        '--batch',
+        help='Check many zones: a manifest file with a "zonename zonefile" '
+        'pair per line, or a directory of zone files named after their '
+        'zone.',
+    )
     parser.add_argument(
         '-d',
         '--nameserver',
-        help='DNS server to query.',
+        action='append',
+        help='DNS server to query. Give more than once to compare against '
+        'several servers; all their IP numbers are queried.',
     )
     parser.add_argument(
         '-p',
@@ -133,7 +146,207 @@ def parse_args(args):
         dest='compare_soa',
         help='Compare SOA records.',
     )
-    return parser.parse_args(args)
+    parser.add_argument(
+        '-c',
+        '--concurrency',
+        type=int,
+        default=1,
+        help='Number of queries in flight at once (default: 1).',
+    )
+    parser.add_argument(
+        '--tcp-connections',
+        type=int,
+        default=0,
+        help='With protocol tcp, pipeline queries over this many persistent '
+        'connections (default: 0, one connection per query).',
+    )
+    parser.add_argument(
+        '-x',
+        '--axfr',
+        action='store_true',
+        help='Compare against a zone transfer (AXFR) instead of querying '
+        'every record.',
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=10,
+        help='Maximum seconds to wait for a response (default: 10). Queries '
+        'start with a timeout based on the round trip time of the name '
+        'server that doubles on every retry.',
+    )
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=2,
+        help='Number of retries of a query that timed out (default: 2).',
+    )
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=0,
+        help='Maximum queries per second per name server (default: 0, '
+        'unlimited).',
+    )
+    parser.add_argument(
+        '--burst',
+        type=int,
+        help='Queries per name server that may be sent at once before rate '
+        'applies (default: rate).',
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Read the zone file in chunks while querying, instead of '
+        'loading the whole zone first.',
+    )
+    parser.add_argument(
+        '--state-file',
+        help='File to keep digests of matching records in. Records that '
+        'matched in a previous run and did not change are not queried.',
+    )
+    parser.add_argument(
+        '--recheck-fraction',
+        type=float,
+        default=0,
+        help='Fraction of the unchanged records to query anyway (default: '
+        '0).',
+    )
+    parser.add_argument(
+        '-P',
+        '--processes',
+        type=int,
+        default=1,
+        help='Number of processes to spread the records over (default: 1). '
+        'Every process runs --concurrency queries at once, and they share '
+        '--rate.',
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=53,
+        help='Port of the name servers (default: 53).',
+    )
+    parser.add_argument(
+        '--metrics',
+        dest='metrics_file',
+        help='File to write query metrics (round trip times, retries, '
+        'timeouts, truncations, bytes, slowest records) to as JSON.',
+    )
+    parser.add_argument(
+        '--prometheus',
+        dest='prometheus_file',
+        help='File to write query metrics to in the Prometheus text format.',
+    )
+    parser.add_argument(
+        '--profile',
+        dest='profile_file',
+        help='Log the time spent resolving, parsing, building queries, '
+        'waiting for the network, reading responses, comparing and logging, '
+        'and write cProfile statistics of the run to this file.',
+    )
+    parser.add_argument(
+        '--results',
+        dest='results_file',
+        help='File to write a result per record to as records complete, - '
+        'for standard output.',
+    )
+    parser.add_argument(
+        '--results-format',
+        choices=sorted(WRITERS),
+        help='Format of the results file: jsonl (JSON lines) or csv '
+        '(default: csv for a .csv file, jsonl otherwise).',
+    )
+    parser.add_argument(
+        '--max-mismatches',
+        type=int,
+        default=0,
+        help='Stop querying once this many records mismatched (default: 0, '
+        'never).',
+    )
+    parser.add_argument(
+        '--fail-fast',
+        action='store_const',
+        const=1,
+        dest='max_mismatches',
+        help='Stop querying at the first mismatch; --max-mismatches 1.',
+    )
+    parser.add_argument(
+        '--probes',
+        type=int,
+        default=0,
+        help='After the records, query up to this many names that are not in '
+        'the zone file, below names sampled from it, and expect NXDOMAIN '
+        '(default: 0).',
+    )
+    parser.add_argument(
+        '--cache',
+        dest='cache_file',
+        help='SQLite database to cache responses in, shared by runs, zones '
+        'and processes. Cached responses are used instead of querying the '
+        'name servers.',
+    )
+    parser.add_argument(
+        '--cache-max-age',
+        type=float,
+        help='Maximum seconds to keep a cached response (default: its lowest '
+        'TTL).',
+    )
+    parser.add_argument(
+        '--snapshots',
+        dest='snapshot_dir',
+        help='Directory to keep binary snapshots of the parsed zone files in. '
+        'A zone file that did not change is read from its snapshot instead of '
+        'parsed.',
+    )
+    parser.add_argument(
+        '--diff',
+        dest='previous_zonefile',
+        metavar='PREVIOUS',
+        help='Previous version of the zone file, or a snapshot of it. Query '
+        'only the records that were added or changed since, and expect the '
+        'removed records to be gone.',
+    )
+    parser.add_argument(
+        '--sanity-sample',
+        type=int,
+        default=100,
+        help='With --diff, number of unchanged records to query anyway '
+        '(default: 100).',
+    )
+    parser.add_argument(
+        '--sample',
+        type=int,
+        help='Query only a random sample of this many records, stratified by '
+        'type and subtree, and estimate the mismatch rate of the zone.',
+    )
+    parser.add_argument(
+        '--sample-fraction',
+        type=float,
+        help='Query only a random sample of this fraction of the records, as '
+        '--sample does.',
+    )
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='Keep the zone in a compact form in memory, for large zones.',
+    )
+    args = parser.parse_args(args)
+    if args.batch is None and args.zonefile is None:
+        parser.error('zonename and zonefile, or --batch, are required')
+    if args.batch is not None and args.zonename is not None:
+        parser.error('zonename and zonefile can not be used with --batch')
+    if args.batch is not None and args.processes > 1:
+        parser.error('--processes can not be used with --batch')
+    if args.batch is not None and args.previous_zonefile is not None:
+        parser.error('--diff can not be used with --batch')
+    if args.sample is not None and args.sample_fraction is not None:
+        parser.error('--sample and --sample-fraction can not be used '
+                     'together')
+    if args.previous_zonefile is not None and \
+            (args.sample is not None or args.sample_fraction is not None):
+        parser.error('--diff can not be used with --sample')
+    return args
 
 
 def main():
@@ -149,9 +362,7 @@ def main():
     # Setup basic logging
     setup_logging(args.verbose, args.quiet)
     logger.debug('Arguments: %s', args)
-    dnszonetest = DnsZoneTest(
-        args.zonename,
-        args.zonefile,
+    kwargs = dict(
         nameserver=args.nameserver,
         protocol=args.protocol,
         verbose=args.verbose,
@@ -160,6 +371,37 @@ def main():
         compare_ttl=args.compare_ttl,
         compare_ns=args.compare_ns,
         compare_soa=args.compare_soa,
+        concurrency=args.concurrency,
+        tcp_connections=args.tcp_connections,
+        axfr=args.axfr,
+        timeout=args.timeout,
+        retries=args.retries,
+        rate=args.rate,
+        burst=args.burst,
+        stream=args.stream,
+        state_file=args.state_file,
+        recheck_fraction=args.recheck_fraction,
+        processes=args.processes,
+        compact=args.compact,
+        port=args.port,
+        metrics_file=args.metrics_file,
+        prometheus_file=args.prometheus_file,
+        profile_file=args.profile_file,
+        results_file=args.results_file,
+        results_format=args.results_format,
+        max_mismatches=args.max_mismatches,
+        probes=args.probes,
+        cache_file=args.cache_file,
+        cache_max_age=args.cache_max_age,
+        snapshot_dir=args.snapshot_dir,
+        previous_zonefile=args.previous_zonefile,
+        sanity_sample=args.sanity_sample,
+        sample=args.sample,
+        sample_fraction=args.sample_fraction,
     )
+    if args.batch is not None:
+        dnszonetest = BatchZoneTest(read_zones(args.batch), **kwargs)
+    else:
+        dnszonetest = DnsZoneTest(args.zonename, args.zonefile, **kwargs)
     dnszonetest.compare()
     return dnszonetest.errno
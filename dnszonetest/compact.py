@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.compact
+-------------------
+
+Compact in-memory zone.
+
+A :class:`dns.zone.Zone` keeps a node, an rdataset and an rdata object per
+record. :class:`CompactZone` keeps a tuple per rdataset instead, with the
+owner name shared by all rdatasets of a name and all rdata in uncompressed
+wire format in one bytes object. Rdatasets are rebuilt while iterating.
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import struct
+
+import dns.rdata
+import dns.rdataset
+import dns.rdatatype
+
+_LENGTH = struct.Struct(str('!H'))
+
+
+def rdata_wire(rdataset, origin=None):
+    '''
+    Returns the rdata of rdataset in uncompressed wire format, each
+    preceded by its length.
+    '''
+    fh = io.BytesIO()
+    for rdata in rdataset:
+        start = fh.tell()
+        fh.write(b'\0\0')
+        rdata.to_wire(fh, None, origin)
+        end = fh.tell()
+        fh.seek(start)
+        fh.write(_LENGTH.pack(end - start - 2))
+        fh.seek(end)
+    return fh.getvalue()
+
+
+def rdataset_from_wire(rdclass, rdtype, covers, ttl, wire, offset=0,
+                       end=None):
+    '''
+    Returns an rdataset with the rdata in wire[offset:end], in the format
+    of :func:`rdata_wire`.
+    '''
+    if end is None:
+        end = len(wire)
+    rdataset = dns.rdataset.Rdataset(rdclass, rdtype, covers)
+    rdataset.update_ttl(ttl)
+    while offset < end:
+        rdlen, = _LENGTH.unpack_from(wire, offset)
+        offset += 2
+        rdataset.add(
+            dns.rdata.from_wire(rdclass, rdtype, wire, offset, rdlen)
+        )
+        offset += rdlen
+    return rdataset
+
+
+class CompactZone(object):
+    '''
+    Read-only sequence of the rdatasets of a zone.
+    '''
+    def __init__(self, origin):
+        '''
+        :param dns.name.Name origin: zone name.
+        '''
+        self.origin = origin
+        self._names = {}
+        self._rdatasets = []
+
+    @classmethod
+    def from_zone(cls, zone):
+        '''
+        Returns a CompactZone with the rdatasets of zone. The nodes of zone
+        are removed while they are copied, so the two are not both in
+        memory.
+
+        :param dns.zone.Zone zone: zone to copy.
+        '''
+        compact = cls(zone.origin)
+        for name in list(zone.nodes):
+            for rdataset in zone.nodes.pop(name).rdatasets:
+                compact.add(name, rdataset)
+        return compact
+
+    @classmethod
+    def from_rdatasets(cls, origin, rdatasets):
+        '''
+        Returns a CompactZone with rdatasets, so a zone read with
+        :func:`dnszonetest.zonefile.stream_rdatasets` is never whole in
+        memory as a :class:`dns.zone.Zone`. Rdatasets of the same owner name
+        and type are merged, as in a zone parsed whole, even when the
+        stream yields them apart.
+
+        :param dns.name.Name origin: zone name.
+        :param rdatasets: iterable of (name, rdataset).
+        '''
+        compact = cls(origin)
+        # Index in compact._rdatasets per (name, rdclass, rdtype, covers).
+        indexes = {}
+        for name, rdataset in rdatasets:
+            key = (name, rdataset.rdclass, rdataset.rdtype, rdataset.covers)
+            index = indexes.get(key)
+            if index is None:
+                indexes[key] = len(compact._rdatasets)
+                compact.add(name, rdataset)
+                continue
+            name, rdclass, rdtype, covers, ttl, wire = \
+                compact._rdatasets[index]
+            merged = rdataset_from_wire(rdclass, rdtype, covers, ttl, wire)
+            merged.union_update(rdataset)
+            compact._rdatasets[index] = (name, rdclass, rdtype, covers,
+                                         merged.ttl,
+                                         rdata_wire(merged, compact.origin))
+        return compact
+
+    def add(self, name, rdataset):
+        '''
+        Adds rdataset of owner name.
+        '''
+        name = self._names.setdefault(name, name)
+        self._rdatasets.append((
+            name,
+            rdataset.rdclass,
+            rdataset.rdtype,
+            rdataset.covers,
+            rdataset.ttl,
+            rdata_wire(rdataset, self.origin),
+        ))
+
+    def __len__(self):
+        return len(self._rdatasets)
+
+    def iterate_rdatasets(self, rdtype=dns.rdatatype.ANY):
+        '''
+        Yields (name, rdataset) for every rdataset, or every rdataset of
+        type rdtype, as :meth:`dns.zone.Zone.iterate_rdatasets` does.
+        '''
+        for name, rdclass, rdtype_, covers, ttl, wire in self._rdatasets:
+            if rdtype not in (dns.rdatatype.ANY, rdtype_):
+                continue
+            yield name, rdataset_from_wire(rdclass, rdtype_, covers, ttl,
+                                           wire)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.diff
+----------------
+
+Differences between a zone file and its previous version, by rdataset, so
+only what changed is queried.
+
+The previous version is a zone file or a snapshot (see
+:mod:`dnszonetest.snapshot`). Rdatasets are compared by a digest of their
+TTL and rdata in canonical wire format, kept per owner name, type and type
+covered.
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import copy
+import hashlib
+import random
+import struct
+
+import dns.exception
+import dns.zone
+
+from dnszonetest.exceptions import NoZoneFileException
+from dnszonetest.snapshot import MAGIC, SnapshotZone, load_snapshot
+
+# Changes of an rdataset.
+ADDED = 'added'
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+# Unchanged, but in the sanity sample.
+SAMPLED = 'sampled'
+REMOVED = 'removed'
+
+_TTL = struct.Struct(str('!I'))
+
+
+def rdataset_digest(rdataset):
+    '''
+    Returns a digest of the TTL and rdata of rdataset.
+    '''
+    digest = hashlib.sha1(_TTL.pack(rdataset.ttl))
+    for wire in sorted(rdata.to_digestable() for rdata in rdataset):
+        digest.update(_TTL.pack(len(wire)))
+        digest.update(wire)
+    return digest.digest()
+
+
+def load_previous(path, origin, snapshot_dir=None):
+    '''
+    Returns the previous version of a zone: the snapshot file path, or the
+    zone file path, read from its snapshot in snapshot_dir when it has a
+    fresh one.
+
+    :raises NoZoneFileException: when path can not be read.
+    '''
+    try:
+        with open(path, 'rb') as fh:
+            is_snapshot = fh.read(len(MAGIC)) == MAGIC
+        if is_snapshot:
+            return SnapshotZone(path)
+        if snapshot_dir:
+            zone = load_snapshot(snapshot_dir, path, origin)
+            if zone is not None:
+                return zone
+        return dns.zone.from_file(path, origin=origin, relativize=False)
+    except (IOError, OSError, ValueError, dns.exception.DNSException) as err:
+        raise NoZoneFileException(
+            'Unable to read previous zone file: {0}'.format(err)
+        )
+
+
+class ZoneDiff(object):
+    '''
+    Compares the rdatasets of a zone file, one at a time, to the previous
+    version of the zone.
+    '''
+    def __init__(self, previous, sample=0):
+        '''
+        :param previous: previous version of the zone, a
+            :class:`dns.zone.Zone`, :class:`dnszonetest.compact.CompactZone`
+            or :class:`dnszonetest.snapshot.SnapshotZone`.
+        :param int sample: number of rdatasets of previous to pick at random
+            as a sanity sample; those that did not change are SAMPLED.
+        '''
+        self.previous = dict(
+            ((name, rdataset.rdtype, rdataset.covers),
+             rdataset_digest(rdataset))
+            for name, rdataset in previous.iterate_rdatasets()
+        )
+        self.sample = set(
+            random.sample(list(self.previous),
+                          min(sample, len(self.previous)))
+        )
+
+    def check(self, name, rdataset):
+        '''
+        Returns ADDED, CHANGED, UNCHANGED or SAMPLED for rdataset of owner
+        name from the zone file. Call once per rdataset.
+        '''
+        key = (name, rdataset.rdtype, rdataset.covers)
+        digest = self.previous.pop(key, None)
+        if digest is None:
+            return ADDED
+        if digest != rdataset_digest(rdataset):
+            return CHANGED
+        if key in self.sample:
+            return SAMPLED
+        return UNCHANGED
+
+    def split(self, count, shard):
+        '''
+        Returns count ZoneDiffs, the one at index i with the rdatasets of
+        the previous version, and of the sanity sample, whose owner names
+        are in shard i.
+
+        :param int count: number of shards.
+        :param callable shard: returns the shard of an owner name, given
+            the name and count.
+        '''
+        parts = []
+        for _ in range(count):
+            part = copy.copy(self)
+            part.previous = {}
+            part.sample = set()
+            parts.append(part)
+        for key, digest in self.previous.items():
+            part = parts[shard(key[0], count)]
+            part.previous[key] = digest
+            if key in self.sample:
+                part.sample.add(key)
+        return parts
+
+    def removed(self):
+        '''
+        Returns (name, rdtype, covers) of the rdatasets of the previous
+        version that :meth:`check` was not called for, in the order of the
+        previous version. Call after checking every rdataset.
+        '''
+        return list(self.previous)
@@ -26,3 +26,9 @@ class NoZoneFileException(DnszonetestException):
     """
     Raised when zone file does not exist.
     """
+
+
+class ZoneTransferException(DnszonetestException):
+    """
+    Raised when the zone could not be transferred from the nameserver.
+    """
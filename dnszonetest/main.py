@@ -12,66 +12,322 @@ Main dnszonetest
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
+import copy
+import functools
+import itertools
 import logging
+import multiprocessing
+import os
+import random
 import socket
+import tempfile
+import time
+import zlib
 
-import dns.flags
+import dns.exception
 import dns.message
+import dns.name
+import dns.flags
 import dns.query
+import dns.rcode
+import dns.rdataclass
+import dns.rdataset
 import dns.rdatatype
 import dns.resolver
 import dns.zone
 
+import dnszonetest.transport
+from dnszonetest.cache import ResponseCache
+from dnszonetest.classify import (
+    REFERRAL,
+    TIMEOUT_VERDICT,
+    answer_verdict,
+    classify,
+)
+from dnszonetest.compact import CompactZone
+from dnszonetest.diff import (
+    REMOVED,
+    UNCHANGED,
+    ZoneDiff,
+    load_previous,
+)
 from dnszonetest.exceptions import (
     UnableToResolveNameServerException,
     NoZoneFileException,
+    ZoneTransferException,
+)
+from dnszonetest.metrics import Metrics
+from dnszonetest.pacer import Pacer
+from dnszonetest.planner import (
+    OCCLUDED,
+    REASONS,
+    QueryPlanner,
+    probe_qname,
+    wildcard_qname,
+)
+from dnszonetest.pool import imap_unordered
+from dnszonetest.profiling import NULL_PROFILER, Profiler, cprofile, timed
+from dnszonetest.results import (
+    EXTRA,
+    MATCH,
+    NXDOMAIN,
+    RDATASET,
+    RESPONSE,
+    TTL,
+    Result,
+    open_writer,
+    results_format,
 )
+from dnszonetest.sample import StratifiedSample, estimate, stratum
+from dnszonetest.scheduler import RetryScheduler
+from dnszonetest.snapshot import (
+    SnapshotZone,
+    file_key,
+    load_snapshot,
+    snapshot_path,
+    write_snapshot,
+)
+from dnszonetest.state import State, rdataset_digest
+from dnszonetest.transport import TCPPipeline
+from dnszonetest.wire import (
+    QueryTemplate,
+    rdataset_wire,
+    read_answer,
+    read_header,
+)
+from dnszonetest.zonefile import stream_rdatasets
 
 logger = logging.getLogger(__name__)
 
+# Mismatch counter of all worker processes of a comparison, in a worker
+# process.
+_shared_mismatches = None
+
+# Queries with and without the RD flag.
+QUERY_TEMPLATES = {
+    True: QueryTemplate(recursion_desired=True),
+    False: QueryTemplate(recursion_desired=False),
+}
+
+
+class RdatasetText(object):
+    '''
+    Text of an rdataset for log messages, with its records sorted and on
+    one line. The text is only built when a log message is emitted, and
+    only once.
+    '''
+    __slots__ = ('rdataset', '_text')
+
+    def __init__(self, rdataset):
+        self.rdataset = rdataset
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            self._text = ' '.join(
+                sorted(x for x in str(self.rdataset).split('\n') if x)
+            )
+            if self.rdataset is not None and not self.rdataset:
+                self._text = 'no {0} records'.format(
+                    dns.rdatatype.to_text(self.rdataset.rdtype))
+        return self._text
+
+    __unicode__ = __str__
+
 
 class Record(object):
-    def __init__(self, name, rdataset_file, protocol='udp'):
+    __slots__ = (
+        'name',
+        'rdataset_file',
+        'protocol',
+        'nameserver_ip',
+        'qname',
+        'siblings',
+        'probe',
+        'digest',
+        'verdict',
+        'rdataset_query',
+        'query_msg',
+        'query_res',
+        '_text_file',
+        '_text_query',
+    )
+
+    def __init__(self, name, rdataset_file, protocol='udp',
+                 nameserver_ip=None, qname=None):
+        '''
+        :param dns.name.Name name: owner name.
+        :param dns.rdataset.Rdataset rdataset_file: rdataset from the zone
+            file.
+        :param str protocol: protocol to use (udp/tcp).
+        :param str nameserver_ip: IP number of the name server.
+        :param dns.name.Name qname: name to query (default: name).
+        '''
         self.name = name
         self.rdataset_file = rdataset_file
         self.protocol = protocol
+        self.nameserver_ip = nameserver_ip
+        if qname is None:
+            qname = name
+        if not isinstance(qname, dns.name.Name):
+            qname = dns.name.from_text(qname)
+        self.qname = qname
+        # Records that share the query of this record.
+        self.siblings = ()
+        # A name not in the zone file, expected not to exist.
+        self.probe = False
+        self.digest = None
+        self.verdict = None
         self.rdataset_query = None
         self.query_msg = None
         self.query_res = None
+        self._text_file = None
+        self._text_query = None
 
-    def query(self, nameserver_ip, no_recursion=False):
+    def make_query_msg(self, no_recursion=False):
+        '''
+        Logs the expected rdataset and builds self.query_msg, the query in
+        wire format.
+
+        :param bool no_recursion: clear the Recursion Desired flag.
+        '''
         logger.debug(
             '%-21s: %s %s',
             'Expected',
             self.name,
-            ' '.join(
-                sorted(
-                    [
-                        x for x in
-                        str(self.rdataset_file).split('\n')
-                        if x
-                    ]
-                )
-            )
+            self.text_file,
         )
-        self.query_msg = dns.message.make_query(
-            self.name,
+        self.query_msg = QUERY_TEMPLATES[not no_recursion].make(
+            self.qname,
             self.rdataset_file.rdtype,
-            use_edns=True,
-            payload=2048,
         )
-        if self.protocol == 'tcp':
-            dns_query = dns.query.tcp
-        else:
-            dns_query = dns.query.udp
-        if no_recursion:
-            self.query_msg.flags ^= dns.flags.RD
-        try:
-            self.query_res = dns_query(
-                self.query_msg,
+
+    def read_response(self, nameserver_ip):
+        '''
+        Sets self.rdataset_query and self.verdict from self.query_res. A
+        response in wire format is only parsed when its answer differs from
+        the zone file.
+
+        :param str nameserver_ip: IP number the response came from.
+        '''
+        if self.query_res is None:
+            self.verdict = TIMEOUT_VERDICT
+            return
+        if isinstance(self.query_res, bytes):
+            if self.read_wire():
+                logger.debug(
+                    'From %-16s: %s %s',
+                    nameserver_ip,
+                    self.name,
+                    self.text_query,
+                )
+                return
+            self.query_res = dns.message.from_wire(self.query_res)
+        self.verdict = classify(
+            self.query_res,
+            self.qname,
+            self.rdataset_file.rdtype,
+            self.rdataset_file.covers,
+        )
+        self.rdataset_query = self.find_rdataset()
+        if self.rdataset_query is not None:
+            logger.debug(
+                'From %-16s: %s %s',
                 nameserver_ip,
-                timeout=10
+                self.name,
+                self.text_query,
             )
+
+    def find_rdataset(self):
+        '''
+        Returns the rdataset of the owner name and type of the record in
+        self.query_res, a response message: from the answer section, or for
+        NS records also from the authority section of a referral. Returns
+        None when the response has none.
+        '''
+        rdataset_file = self.rdataset_file
+        sections = [self.query_res.answer]
+        if rdataset_file.rdtype == dns.rdatatype.NS:
+            sections.append(self.query_res.authority)
+        for section in sections:
+            for rrset in section:
+                if rrset.name == self.qname and \
+                        rrset.rdclass == rdataset_file.rdclass and \
+                        rrset.rdtype == rdataset_file.rdtype and \
+                        rrset.covers == rdataset_file.covers:
+                    return rrset.to_rdataset()
+        return None
+
+    def read_shared_response(self, record):
+        '''
+        Reads the response to the query of record, which this record shares.
+        '''
+        self.nameserver_ip = record.nameserver_ip
+        self.query_msg = record.query_msg
+        self.query_res = record.query_res
+        self.read_response(record.nameserver_ip)
+
+    def read_wire(self):
+        '''
+        Compares the answer of self.query_res, a response in wire format, to
+        the zone file. When the response is a NOERROR answer that holds only
+        the rdata of the zone file for the query name, sets
+        self.rdataset_query to a copy of the zone file rdataset with the TTL
+        of the answer, self.verdict, and returns True.
+        '''
+        answer = read_answer(self.query_res)
+        if answer is None or \
+                answer[1:3] != (self.rdataset_file.rdclass,
+                                self.rdataset_file.rdtype) or \
+                answer[4] != rdataset_wire(self.rdataset_file) or \
+                answer[0] != tuple(
+                    label.lower() for label in self.qname.labels if label):
+            return False
+        flags, ancount = read_header(self.query_res)
+        if flags & 0xf != dns.rcode.NOERROR or ancount != len(answer[4]):
+            return False
+        self.verdict = answer_verdict(flags & dns.flags.AA)
+        self.rdataset_query = self.rdataset_file.copy()
+        self.rdataset_query.ttl = answer[3]
+        return True
+
+    def query(self, nameserver_ip, no_recursion=False, transport=None,
+              scheduler=None, port=53, profiler=NULL_PROFILER, cache=None):
+        self.nameserver_ip = nameserver_ip
+        with profiler.stage('build'):
+            self.make_query_msg(no_recursion)
+        if cache is not None:
+            self.query_res = cache.get(nameserver_ip, port, self.query_msg)
+            if self.query_res is not None:
+                with profiler.stage('response'):
+                    self.read_responses()
+                return
+        if transport is not None:
+            dns_query = tcp_query = transport.query_wire
+        else:
+            tcp_query = functools.partial(dnszonetest.transport.tcp,
+                                          port=port)
+            if self.protocol == 'tcp':
+                dns_query = tcp_query
+            else:
+                dns_query = functools.partial(dnszonetest.transport.udp,
+                                              port=port)
+        try:
+            with profiler.stage('network'):
+                if scheduler is None:
+                    self.query_res = dns_query(
+                        self.query_msg,
+                        nameserver_ip,
+                        timeout=10
+                    )
+                else:
+                    self.query_res = scheduler.query(
+                        self.query_msg,
+                        nameserver_ip,
+                        dns_query,
+                        tcp_query,
+                    )
         except dns.exception.Timeout as err:
             logger.error(
                 '%-21s: %s %s',
@@ -79,31 +335,80 @@ class Record(object):
                 self.name,
                 err,
             )
-        try:
-            self.rdataset_query = self.query_res.answer[0].to_rdataset()
-            logger.debug(
-                'From %-16s: %s %s',
-                nameserver_ip,
-                self.name,
-                ' '.join(
-                    sorted(
-                        [
-                            x for x in
-                            str(self.rdataset_query).split('\n')
-                            if x
-                        ]
-                    )
-                )
-            )
-        except (IndexError, AttributeError):
-            pass
+        if cache is not None and self.query_res is not None:
+            cache.put(nameserver_ip, port, self.query_msg, self.query_res)
+        with profiler.stage('response'):
+            self.read_responses()
+
+    def read_responses(self):
+        '''
+        Reads the response to the query of this record and its siblings.
+        '''
+        self.read_response(self.nameserver_ip)
+        for sibling in self.siblings:
+            sibling.read_shared_response(self)
+
+    @property
+    def key(self):
+        '''
+        Owner name and type of the record as text.
+        '''
+        key = '{0} {1}'.format(
+            self.name,
+            dns.rdatatype.to_text(self.rdataset_file.rdtype),
+        )
+        if self.rdataset_file.covers:
+            key += ' ' + dns.rdatatype.to_text(self.rdataset_file.covers)
+        return key
+
+    def release(self):
+        '''
+        Drops the query and response messages, which are not needed after
+        the comparison.
+        '''
+        self.query_msg = None
+        self.query_res = None
+
+    @property
+    def text_file(self):
+        '''
+        :class:`RdatasetText` of the rdataset from the zone file.
+        '''
+        if self._text_file is None:
+            self._text_file = RdatasetText(self.rdataset_file)
+        return self._text_file
+
+    @property
+    def text_query(self):
+        '''
+        :class:`RdatasetText` of the rdataset from the name server.
+        '''
+        if self._text_query is None or \
+                self._text_query.rdataset is not self.rdataset_query:
+            self._text_query = RdatasetText(self.rdataset_query)
+        return self._text_query
+
+    @property
+    def text_received(self):
+        '''
+        :attr:`text_query`, or when the name server sent no rdataset the
+        kind of response it sent.
+        '''
+        if self.rdataset_query is None and self.verdict is not None:
+            return self.verdict
+        return self.text_query
 
     @property
     def rdataset_match(self):
+        if not self.rdataset_file:
+            # An rdataset removed from the zone file: expect none.
+            return self.rdataset_query is None
         return self.rdataset_file == self.rdataset_query
 
     @property
     def ttl_match(self):
+        if not self.rdataset_file:
+            return True
         try:
             res = self.rdataset_file.ttl == self.rdataset_query.ttl
         except AttributeError as err:
@@ -116,13 +421,25 @@ class DnsZoneTest(object):
     '''
     API equivalent to using dnszonetest at the command line.
     '''
+    record_class = Record
+
     def __init__(self, zonename, zonefile, nameserver=None, protocol='udp',
                  verbose=False, quiet=False, no_recursion=False,
-                 compare_ttl=False, compare_ns=False, compare_soa=False):
+                 compare_ttl=False, compare_ns=False, compare_soa=False,
+                 concurrency=1, tcp_connections=0, axfr=False, timeout=10,
+                 retries=2, rate=0, burst=None, stream=False,
+                 state_file=None, recheck_fraction=0, processes=1,
+                 compact=False, port=53, metrics_file=None,
+                 prometheus_file=None, profile_file=None, results_file=None,
+                 results_format=None, max_mismatches=0, probes=0,
+                 cache_file=None, cache_max_age=None, snapshot_dir=None,
+                 previous_zonefile=None, sanity_sample=100, sample=None,
+                 sample_fraction=None):
         '''
         :param str zonename: Zone name.
         :param str zonefile: Zone file name.
-        :param str nameserver: name server to use.
+        :param nameserver: name server to use, or a list of name servers to
+            compare against concurrently.
         :param str protocol: protocol to use (UDP/TCP)
         :param bool verbose: verbose output.
         :param bool quiet: suppress output.
@@ -130,6 +447,69 @@ class DnsZoneTest(object):
         :param bool compare_ttl: include TTL field in comparison.
         :param bool compare_ns: include NS records in comparison.
         :param bool compare_soa: include SOA records in comparison.
+        :param int concurrency: number of queries in flight at once.
+        :param int tcp_connections: with protocol TCP, pipeline queries over
+            this many persistent connections instead of opening a connection
+            per query.
+        :param bool axfr: compare against a zone transfer (AXFR) from the
+            name server instead of querying every rdataset.
+        :param float timeout: maximum seconds to wait for a response. Queries
+            start with a timeout based on the round trip time of the name
+            server that doubles on every retry up to this maximum.
+        :param int retries: number of retries of a query that timed out.
+        :param float rate: maximum queries per second per name server
+            (default: 0, unlimited).
+        :param int burst: queries per name server that may be sent at once
+            before rate applies (default: rate).
+        :param bool stream: read the zone file in chunks while querying,
+            instead of loading the whole zone before the first query.
+        :param str state_file: file to keep digests of matching rdatasets
+            in. Rdatasets that matched in a previous run and did not change
+            since are not queried.
+        :param float recheck_fraction: fraction of the unchanged rdatasets
+            to query anyway.
+        :param int processes: number of processes to shard the rdatasets
+            over, each running its own queries with the given concurrency.
+        :param bool compact: keep the zone file in a
+            :class:`dnszonetest.compact.CompactZone` instead of a
+            :class:`dns.zone.Zone`.
+        :param int port: port of the name servers.
+        :param str metrics_file: file to write query metrics to as JSON.
+        :param str prometheus_file: file to write query metrics to in the
+            Prometheus text format.
+        :param str profile_file: time the stages of the run, log the times
+            and write cProfile statistics of the run to this file.
+        :param str results_file: file to write a result per record to as
+            records complete, - for standard output.
+        :param str results_format: format of results_file, jsonl (JSON
+            lines) or csv; by default csv for a .csv file and jsonl
+            otherwise.
+        :param int max_mismatches: stop querying once this many records
+            mismatched (default: 0, never).
+        :param int probes: after the records, query up to this many names
+            that are not in the zone file, below names sampled from it, and
+            expect NXDOMAIN.
+        :param str cache_file: SQLite database to cache responses in, shared
+            by runs, zones and processes. Cached responses are used instead
+            of querying the name servers.
+        :param float cache_max_age: maximum seconds to keep a cached
+            response (default: its lowest TTL).
+        :param str snapshot_dir: directory to keep binary snapshots of the
+            parsed zone files in. A zone file that did not change since its
+            snapshot was written is read from the snapshot instead of
+            parsed; see :mod:`dnszonetest.snapshot`.
+        :param str previous_zonefile: previous version of the zone file, or
+            a snapshot of it. Only the rdatasets that were added or changed
+            since are queried, and the removed rdatasets are expected to be
+            gone; see :mod:`dnszonetest.diff`.
+        :param int sanity_sample: with previous_zonefile, number of
+            rdatasets of the previous version to pick at random, and query
+            anyway when they did not change.
+        :param int sample: query only a stratified random sample of this
+            many rdatasets, and estimate the mismatch rate of the zone; see
+            :mod:`dnszonetest.sample`.
+        :param float sample_fraction: query only a stratified random sample
+            of this fraction of the rdatasets, when sample is not given.
         '''
         self.zonename = zonename
         self.zonefile = zonefile
@@ -141,108 +521,1172 @@ class DnsZoneTest(object):
         self.compare_ttl = compare_ttl
         self.compare_ns = compare_ns
         self.compare_soa = compare_soa
+        self.concurrency = concurrency
+        self.tcp_connections = tcp_connections
+        self.axfr = axfr
+        self.timeout = timeout
+        self.retries = retries
+        self.rate = rate
+        self.burst = burst
+        self.stream = stream
+        self.state_file = state_file
+        self.recheck_fraction = recheck_fraction
+        self.state = State(state_file) if state_file else None
+        self.unchanged = 0
+        self.processes = processes
+        self.compact = compact
+        self.port = port
+        self.metrics_file = metrics_file
+        self.prometheus_file = prometheus_file
+        self.profile_file = profile_file
+        self.metrics = Metrics()
+        self.profiler = Profiler(enabled=bool(profile_file))
+        self.profile_files = []
+        self.results_file = results_file
+        self.results_format = results_format
+        self.results_writer = None
+        self.results_part = None
+        self.max_mismatches = max_mismatches
+        self.mismatch_records = 0
+        self.aborted = False
+        self.skipped = collections.Counter()
+        self.probes = probes
+        self.probe_parents = []
+        self.probe_population = 0
+        self.planner = None
+        self.cache_file = cache_file
+        self.cache_max_age = cache_max_age
+        self.cache = None
+        self.snapshot_dir = snapshot_dir
+        self.previous_zonefile = previous_zonefile
+        self.sanity_sample = sanity_sample
+        self.diff = None
+        self.diff_counts = collections.Counter()
+        self.sample = sample
+        self.sample_fraction = sample_fraction
+        self.sampler = None
+        # (name, rdtype, covers) of the sample, drawn for the shards.
+        self.sample_keys = None
+        self.sample_population = collections.Counter()
+        self.sample_size = 0
+        self.sample_checked = collections.Counter()
+        self.sample_mismatched = collections.Counter()
+        self.shard = None
+        # Part of the zone of a shard, and the planner of the whole zone.
+        self.shard_zone = None
+        self.zone_planner = None
+        self.scheduler = self.make_scheduler()
+        self.transports = {}
         self.nameserver_ip = None
+        self.nameserver_ips = []
         self.zone_from_file = None
         self.mismatch_ttl = 0
         self.mismatch_rdataset = 0
+        self.mismatch_extra = 0
+        self.mismatch_response = 0
+        self.mismatch_nxdomain = 0
+        self.nameserver_mismatches = collections.defaultdict(
+            collections.Counter)
         self.errno = 3
 
+    def __getstate__(self):
+        # Worker processes get a copy without the parsed zone and the thread
+        # based helpers, which they build themselves.
+        state = self.__dict__.copy()
+        state.update(
+            zone_from_file=None,
+            transports={},
+            scheduler=None,
+            state=None,
+            results_writer=None,
+            cache=None,
+            sampler=None,
+        )
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.scheduler = self.make_scheduler()
+        if self.state_file:
+            self.state = State(self.state_file)
+
+    def make_scheduler(self):
+        '''
+        Returns the RetryScheduler for the queries of this test. Shards
+        share the query rate.
+        '''
+        pacer = None
+        if self.rate:
+            rate, burst = self.rate, self.burst
+            if self.shard is not None:
+                rate = float(rate) / self.shard[1]
+                if burst:
+                    burst = max(burst // self.shard[1], 1)
+            pacer = Pacer(rate, burst)
+        return RetryScheduler(self.retries, self.timeout, pacer=pacer,
+                              metrics=self.metrics)
+
+    def add_hook(self, hook):
+        '''
+        Calls hook(stage, seconds) after every stage of the comparison; see
+        :mod:`dnszonetest.profiling`. Hooks are not called for stages that
+        run in worker processes.
+
+        :param callable hook: function of the stage name and its duration
+            in seconds.
+        '''
+        self.profiler.add_hook(hook)
+
+    @timed('resolve')
     def get_nameserver_ip(self):
         '''
-        Get Resolver object depending on self.nameserver
+        Get IP numbers depending on self.nameserver. Sets
+        self.nameserver_ips to all IPv4 and IPv6 addresses of all given name
+        servers and self.nameserver_ip to the first of them.
         '''
         if self.nameserver is None:
             logger.debug('Get IP number(s) of system resolvers')
             self.nameserver_ip = \
                 dns.resolver.get_default_resolver().nameservers[0]
+            self.nameserver_ips = [self.nameserver_ip]
+            return
+        if isinstance(self.nameserver, (list, tuple)):
+            nameservers = self.nameserver
         else:
-            try:
-                self.nameserver_ip = socket.gethostbyname_ex(
-                    self.nameserver)[2][0]
-            except socket.gaierror as err:
-                raise UnableToResolveNameServerException(
-                    'Unable to resolve nameserver "{0}". {1}'.format(
-                        self.nameserver,
-                        err
-                    )
+            nameservers = [self.nameserver]
+        self.nameserver_ips = []
+        for nameserver in nameservers:
+            for nameserver_ip in self.resolve_nameserver(nameserver):
+                if nameserver_ip not in self.nameserver_ips:
+                    self.nameserver_ips.append(nameserver_ip)
+        self.nameserver_ip = self.nameserver_ips[0]
+
+    @staticmethod
+    def resolve_nameserver(nameserver):
+        '''
+        Returns the IPv4 addresses followed by the IPv6 addresses of
+        nameserver.
+
+        :param str nameserver: host name or IP number.
+
+        :raises UnableToResolveNameServerException: when nameserver has no
+            addresses.
+        '''
+        try:
+            nameserver_ips = socket.gethostbyname_ex(nameserver)[2]
+        except socket.gaierror as err:
+            nameserver_ips = []
+            error = err
+        try:
+            nameserver_ips += [
+                info[4][0] for info in socket.getaddrinfo(
+                    nameserver, 53, socket.AF_INET6, socket.SOCK_DGRAM)
+                if info[4][0] not in nameserver_ips
+            ]
+        except socket.gaierror:
+            pass
+        if not nameserver_ips:
+            raise UnableToResolveNameServerException(
+                'Unable to resolve nameserver "{0}". {1}'.format(
+                    nameserver,
+                    error
+                )
+            )
+        return nameserver_ips
+
+    def get_zone_from_axfr(self, nameserver_ip):
+        '''
+        Transfer the zone from a name server.
+
+        :param str nameserver_ip: IP number of the name server.
+
+        :returns: the transferred zone.
+        :rtype: dns.zone.Zone
+        '''
+        try:
+            return dns.zone.from_xfr(
+                dns.query.xfr(
+                    nameserver_ip,
+                    self.zonename,
+                    timeout=self.timeout,
+                    port=self.port,
+                    relativize=False,
+                    lifetime=self.timeout,
+                ),
+                relativize=False,
+            )
+        except (dns.exception.DNSException, socket.error, EOFError) as err:
+            raise ZoneTransferException(
+                'Unable to transfer zone "{0}" from {1}. {2}'.format(
+                    self.zonename,
+                    nameserver_ip,
+                    err
                 )
+            )
 
+    @timed('parse')
     def get_zone_from_file(self):
         '''
         Read records from zone file. Sets self.zone_from_file
+
+        With snapshot_dir, reads the snapshot of the zone file instead when
+        the zone file did not change since, and writes a snapshot after
+        parsing otherwise.
         '''
-        try:
-            self.zone_from_file = dns.zone.from_file(
+        self.close_zone()
+        if self.snapshot_dir:
+            self.zone_from_file = load_snapshot(
+                self.snapshot_dir,
                 self.zonefile,
-                origin=self.zonename,
-                relativize=False
+                self.zonename,
             )
+            if self.zone_from_file is not None:
+                return
+        try:
+            if self.snapshot_dir:
+                key = file_key(self.zonefile)
+            if self.compact:
+                self.zone_from_file = CompactZone.from_rdatasets(
+                    dns.name.from_text(self.zonename),
+                    stream_rdatasets(self.zonefile, self.zonename),
+                )
+            else:
+                self.zone_from_file = dns.zone.from_file(
+                    self.zonefile,
+                    origin=self.zonename,
+                    relativize=False
+                )
         except IOError as err:
             raise NoZoneFileException(
                 'Unable to read zone file: {0}'.format(err)
             )
+        if self.snapshot_dir:
+            self.write_snapshot(key)
 
-    def compare_rdatasets(self):
-        for name, rdataset_file in self.zone_from_file.iterate_rdatasets():
-            if not self.compare_ns and \
-                    rdataset_file.rdtype == dns.rdatatype.NS:
+    def close_zone(self):
+        '''
+        Closes self.zone_from_file and drops it when it was read from a
+        snapshot, releasing its memory map and file.
+        '''
+        if isinstance(self.zone_from_file, SnapshotZone):
+            self.zone_from_file.close()
+            self.zone_from_file = None
+
+    def write_snapshot(self, key):
+        '''
+        Writes the snapshot of self.zone_from_file to snapshot_dir. Logs
+        when it can not be written.
+
+        :param tuple key: :func:`dnszonetest.snapshot.file_key` of the zone
+            file before it was parsed.
+        '''
+        path = snapshot_path(self.snapshot_dir, self.zonefile, self.zonename)
+        try:
+            if not os.path.isdir(self.snapshot_dir):
+                os.makedirs(self.snapshot_dir)
+            write_snapshot(path, self.zone_from_file, key)
+        except (IOError, OSError) as err:
+            logger.warning('%-21s: %s', 'Unable to snapshot', err)
+
+    def iterate_rdatasets(self):
+        '''
+        Yields (name, rdataset) for every rdataset from the zone file.
+        '''
+        if self.stream:
+            return stream_rdatasets(self.zonefile, self.zonename)
+        return self.zone_from_file.iterate_rdatasets()
+
+    def skip_rdataset(self, rdataset):
+        '''
+        Returns True when rdataset is excluded from the comparison.
+        '''
+        if not self.compare_ns and rdataset.rdtype == dns.rdatatype.NS:
+            return True
+        if not self.compare_soa and rdataset.rdtype == dns.rdatatype.SOA:
+            return True
+        return False
+
+    def plan(self):
+        '''
+        Yields (qname, group, reason) for the rdatasets from the zone file,
+        as :meth:`dnszonetest.planner.QueryPlanner.plan` does.
+        '''
+        if self.zone_planner is not None:
+            self.planner = self.zone_planner
+        elif self.zone_from_file is not None:
+            self.planner = QueryPlanner.from_zone(self.zone_from_file)
+        else:
+            self.planner = QueryPlanner(self.zonename)
+        return self.planner.plan(self.iterate_rdatasets())
+
+    def records(self, planned=True):
+        '''
+        Yields a Record for every query to make: for every group of
+        rdatasets from the zone file that is to be compared (see
+        :mod:`dnszonetest.planner`) and every name server IP number. The
+        other records of the group are the siblings of the record.
+
+        :param bool planned: yield a Record for every rdataset instead,
+            including those that are not to be queried.
+
+        Samples the names of the groups as parents of probe names. With
+        previous_zonefile, leaves out the rdatasets that did not change
+        (but the sanity sample). With sample or sample_fraction, leaves out
+        the rdatasets not in the sample.
+        '''
+        if planned:
+            if self.previous_zonefile and self.diff is None:
+                self.diff = self.load_diff()
+            if (self.sample is not None or
+                    self.sample_fraction is not None) and \
+                    self.sample_keys is None:
+                self.draw_sample()
+            groups = self.plan()
+        else:
+            groups = (
+                (name, [(name, rdataset)], None)
+                for name, rdataset in self.iterate_rdatasets()
+            )
+        diff = self.diff if planned else None
+        sampler = self.sampler if planned else None
+        last_name = None
+        for qname, group, reason in groups:
+            if diff is not None:
+                changes = [
+                    diff.check(name, rdataset_file)
+                    for name, rdataset_file in group
+                ]
+            else:
+                changes = [None] * len(group)
+            if self.sample_keys is not None:
+                chosen = [
+                    (name, rdataset_file.rdtype, rdataset_file.covers) in
+                    self.sample_keys
+                    for name, rdataset_file in group
+                ]
+            elif sampler is not None:
+                chosen = [
+                    reason is None and
+                    not self.skip_rdataset(rdataset_file) and
+                    sampler.check(name, rdataset_file)
+                    for name, rdataset_file in group
+                ]
+            else:
+                chosen = [True] * len(group)
+            if self.shard is not None and \
+                    shard_index(group[0][0], self.shard[1]) != self.shard[0]:
                 continue
-            if not self.compare_soa and \
-                    rdataset_file.rdtype == dns.rdatatype.SOA:
+            if planned and self.probes and reason != OCCLUDED and \
+                    group[0][0] != last_name:
+                last_name = group[0][0]
+                self.sample_probe_parent(last_name)
+            items = [
+                (item, change, keep)
+                for item, change, keep in zip(group, changes, chosen)
+                if not self.skip_rdataset(item[1])
+            ]
+            group = [item for item, change, keep in items]
+            if reason is not None:
+                self.skip_group(group, reason)
                 continue
-            record = Record(name, rdataset_file, self.protocol)
-            record.query(self.nameserver_ip, self.no_recursion)
-            if self.compare_ttl and record.rdataset_query is not None:
-                if not record.ttl_match:
-                    self.mismatch_ttl += 1
-                    logger.warning(
-                        '%-21s: %s TTL: %s',
-                        'Expected',
-                        record.name,
-                        record.rdataset_file.ttl
-                    )
-                    logger.warning(
-                        'From %-16s: %s TTL: %s',
-                        self.nameserver_ip,
-                        record.name,
-                        record.rdataset_query.ttl
+            if diff is not None:
+                self.diff_counts.update(change for item, change, keep in items)
+            group = [
+                item for item, change, keep in items
+                if keep and change != UNCHANGED
+            ]
+            if not group:
+                continue
+            if self.state is not None:
+                digests = [
+                    rdataset_digest(name, rdataset_file)
+                    for name, rdataset_file in group
+                ]
+            else:
+                digests = [None] * len(group)
+            for nameserver_ip in self.nameserver_ips:
+                records = []
+                for (name, rdataset_file), digest in zip(group, digests):
+                    record = self.record_class(
+                        name,
+                        rdataset_file,
+                        self.protocol,
+                        nameserver_ip,
+                        qname,
                     )
-            if not record.rdataset_match:
+                    if self.state is not None:
+                        record.digest = digest
+                        if self.state.unchanged(self.zonename, nameserver_ip,
+                                                record.key, digest) and \
+                                random.random() >= self.recheck_fraction:
+                            self.unchanged += 1
+                            self.state.keep(self.zonename, nameserver_ip,
+                                            record.key, digest)
+                            continue
+                    records.append(record)
+                if records:
+                    records[0].siblings = tuple(records[1:])
+                    yield records[0]
+
+    def load_diff(self):
+        '''
+        Returns the :class:`dnszonetest.diff.ZoneDiff` of the zone file
+        with previous_zonefile.
+        '''
+        previous = load_previous(self.previous_zonefile, self.zonename,
+                                 self.snapshot_dir)
+        try:
+            return ZoneDiff(previous, self.sanity_sample)
+        finally:
+            if isinstance(previous, SnapshotZone):
+                previous.close()
+
+    def draw_sample(self):
+        '''
+        Sets self.sampler to a stratified sample of the rdatasets that are
+        to be queried, in a first pass over the zone file.
+        '''
+        self.sampler = StratifiedSample(
+            dns.name.from_text(self.zonename),
+            self.sample,
+            self.sample_fraction,
+        )
+        for qname, group, reason in self.plan():
+            if reason is not None:
+                continue
+            for name, rdataset_file in group:
+                if not self.skip_rdataset(rdataset_file):
+                    self.sampler.count(name, rdataset_file)
+        self.sampler.draw()
+        self.sample_population = self.sampler.population
+        self.sample_size = self.sampler.drawn
+
+    def select_sample(self):
+        '''
+        Draws the sample as :meth:`draw_sample` does, and returns the
+        (name, rdtype, covers) of its rdatasets, for shards that do not see
+        every rdataset.
+        '''
+        self.draw_sample()
+        return frozenset(
+            (name, rdataset_file.rdtype, rdataset_file.covers)
+            for qname, group, reason in self.plan() if reason is None
+            for name, rdataset_file in group
+            if not self.skip_rdataset(rdataset_file) and
+            self.sampler.check(name, rdataset_file)
+        )
+
+    def split_zone(self):
+        '''
+        Returns a :class:`dnszonetest.compact.CompactZone` per shard, with
+        the rdatasets of the owner names of the shard from
+        self.zone_from_file, and the
+        :class:`dnszonetest.planner.QueryPlanner` of the whole zone.
+        '''
+        zone = self.zone_from_file
+        zones = [CompactZone(zone.origin) for _ in range(self.processes)]
+        planner = QueryPlanner(zone.origin)
+        for name, rdataset in zone.iterate_rdatasets():
+            zones[shard_index(name, self.processes)].add(name, rdataset)
+            if rdataset.rdtype == dns.rdatatype.NS and name != zone.origin:
+                planner.cuts.add(name)
+            elif rdataset.rdtype == dns.rdatatype.DNAME:
+                planner.dnames.add(name)
+            if name.is_wild():
+                planner.wildcards.add(name.parent())
+        return zones, planner
+
+    def removed_records(self):
+        '''
+        Yields a Record, that expects no rdataset, for every rdataset of the
+        previous zone file that the zone file lacks and every name server
+        IP number. Call after :meth:`records` is exhausted.
+        '''
+        if self.diff is None:
+            return
+        for name, rdtype, covers in self.diff.removed():
+            rdataset_file = dns.rdataset.Rdataset(dns.rdataclass.IN, rdtype,
+                                                  covers)
+            if self.skip_rdataset(rdataset_file) or \
+                    not self.planner.authoritative(name, rdtype):
+                continue
+            self.diff_counts[REMOVED] += 1
+            qname = wildcard_qname(name) if name.is_wild() else name
+            for nameserver_ip in self.nameserver_ips:
+                yield self.record_class(
+                    name,
+                    rdataset_file,
+                    self.protocol,
+                    nameserver_ip,
+                    qname,
+                )
+
+    def sample_probe_parent(self, name):
+        '''
+        Keeps name in self.probe_parents, a uniform sample of self.probes
+        of the names seen (reservoir sampling).
+        '''
+        self.probe_population += 1
+        if len(self.probe_parents) < self.probes:
+            self.probe_parents.append(name)
+            return
+        index = random.randrange(self.probe_population)
+        if index < self.probes:
+            self.probe_parents[index] = name
+
+    def probe_records(self):
+        '''
+        Yields a probe Record for a name below every sampled parent and
+        every name server IP number. Parents below which names may exist
+        without being in the zone (see
+        :meth:`dnszonetest.planner.QueryPlanner.nxdomain_below`) are left
+        out. Call after :meth:`records` is exhausted.
+        '''
+        for parent in self.probe_parents:
+            if self.planner is not None and \
+                    not self.planner.nxdomain_below(parent):
+                continue
+            name = probe_qname(parent)
+            for nameserver_ip in self.nameserver_ips:
+                record = self.record_class(
+                    name,
+                    dns.rdataset.Rdataset(dns.rdataclass.IN,
+                                          dns.rdatatype.A),
+                    self.protocol,
+                    nameserver_ip,
+                )
+                record.probe = True
+                yield record
+
+    def skip_group(self, group, reason):
+        '''
+        Logs and counts the rdatasets of a group that is not queried.
+
+        :param list group: (name, rdataset) tuples.
+        :param str reason: reason from :mod:`dnszonetest.planner`.
+        '''
+        for name, rdataset_file in group:
+            self.skipped[reason] += 1
+            logger.log(
+                logging.DEBUG if reason == OCCLUDED else logging.WARNING,
+                '%-21s: %s %s',
+                REASONS[reason],
+                name,
+                RdatasetText(rdataset_file),
+            )
+
+    def query_record(self, record):
+        '''
+        Queries the name server for record. Safe to call from worker threads.
+
+        :param Record record: record to query.
+
+        :returns: record
+        :rtype: Record
+        '''
+        start = time.time()
+        record.query(
+            record.nameserver_ip,
+            self.no_recursion,
+            self.transports.get(record.nameserver_ip),
+            self.scheduler,
+            self.port,
+            self.profiler,
+            self.cache,
+        )
+        self.metrics.record(record.name, record.nameserver_ip,
+                            time.time() - start)
+        return record
+
+    def check_record(self, record):
+        '''
+        Compares a queried record, updates the mismatch counters and writes
+        the result to the results file.
+
+        :param Record record: queried record.
+
+        :returns: the result of the comparison.
+        :rtype: dnszonetest.results.Result
+        '''
+        if record.probe:
+            return self.check_probe(record)
+        with self.profiler.stage('compare'):
+            mismatch_ttl = self.compare_ttl and \
+                record.rdataset_query is not None and not record.ttl_match
+            mismatch_rdataset = not record.rdataset_match
+            problems = [] if mismatch_rdataset else \
+                self.response_problems(record)
+            if self.state is not None and record.digest is not None and \
+                    not mismatch_ttl and not mismatch_rdataset and \
+                    not problems:
+                self.state.keep(self.zonename, record.nameserver_ip,
+                                record.key, record.digest)
+            if mismatch_ttl:
+                self.mismatch_ttl += 1
+                self.nameserver_mismatches[record.nameserver_ip]['ttl'] += 1
+            if mismatch_rdataset:
                 self.mismatch_rdataset += 1
+                self.nameserver_mismatches[record.nameserver_ip][
+                    'rdataset'] += 1
+            if problems:
+                self.mismatch_response += 1
+                self.nameserver_mismatches[record.nameserver_ip][
+                    'response'] += 1
+            if mismatch_rdataset:
+                status = RDATASET
+            elif mismatch_ttl:
+                status = TTL
+            elif problems:
+                status = RESPONSE
+            else:
+                status = MATCH
+            result = Result.from_record(self.zonename, record, status)
+            if status != MATCH:
+                self.count_mismatch()
+            if self.sample_population:
+                key = stratum(record.name, record.rdataset_file.rdtype,
+                              self.planner.origin)
+                self.sample_checked[key] += 1
+                if status != MATCH:
+                    self.sample_mismatched[key] += 1
+        with self.profiler.stage('log'):
+            if mismatch_ttl:
+                logger.warning(
+                    '%-21s: %s TTL: %s',
+                    'Expected',
+                    record.name,
+                    record.rdataset_file.ttl
+                )
+                logger.warning(
+                    'From %-16s: %s TTL: %s',
+                    record.nameserver_ip,
+                    record.name,
+                    record.rdataset_query.ttl
+                )
+            if mismatch_rdataset:
                 logger.warning(
                     '%-21s: %s %s',
                     'Expected',
                     record.name,
-                    ' '.join(
-                        sorted(
-                            [
-                                x for x in
-                                str(record.rdataset_file).split('\n')
-                                if x
-                            ]
-                        )
-                    )
+                    record.text_file,
                 )
                 logger.warning(
                     'From %-16s: %s %s',
-                    self.nameserver_ip,
+                    record.nameserver_ip,
                     record.name,
-                    ' '.join(
-                        sorted(
-                            [
-                                x for x in
-                                str(record.rdataset_query).split('\n')
-                                if x
-                            ]
-                        )
-                    )
+                    record.text_received,
+                )
+            if problems:
+                logger.warning(
+                    'From %-16s: %s %s',
+                    record.nameserver_ip,
+                    record.key,
+                    ', '.join(problems),
+                )
+            self.write_result(result)
+        record.release()
+        return result
+
+    def response_problems(self, record):
+        '''
+        Returns what is wrong with the response to record besides its
+        rdataset, as a list of text: with no_recursion the name servers are
+        taken to be authoritative, and must set the AA flag on all but
+        referrals; and the answer section must hold no other RRsets than
+        the rdataset, its signatures, and an alias chain leading to it.
+        '''
+        verdict = record.verdict
+        if verdict is None:
+            return []
+        problems = []
+        if self.no_recursion and not verdict.authoritative and \
+                verdict.kind != REFERRAL:
+            problems.append('not authoritative')
+        if verdict.unexpected:
+            problems.append(
+                'unexpected {0}'.format(', '.join(verdict.unexpected)))
+        return problems
+
+    def check_probe(self, record):
+        '''
+        Checks that the name server answered NXDOMAIN for a queried probe
+        record, updates the mismatch counters and writes the result to the
+        results file.
+
+        :returns: the result of the check.
+        :rtype: dnszonetest.results.Result
+        '''
+        with self.profiler.stage('compare'):
+            mismatch = record.verdict.kind != NXDOMAIN
+            if mismatch:
+                self.mismatch_nxdomain += 1
+                self.nameserver_mismatches[record.nameserver_ip][
+                    'nxdomain'] += 1
+                self.count_mismatch()
+            result = Result.from_record(self.zonename, record,
+                                        NXDOMAIN if mismatch else MATCH)
+        with self.profiler.stage('log'):
+            if mismatch:
+                logger.warning(
+                    '%-21s: %s NXDOMAIN',
+                    'Expected',
+                    record.name,
+                )
+                logger.warning(
+                    'From %-16s: %s %s',
+                    record.nameserver_ip,
+                    record.name,
+                    record.text_received,
+                )
+            self.write_result(result)
+        record.release()
+        return result
+
+    def check_records(self, record):
+        '''
+        Compares a queried record and its siblings.
+
+        :returns: the results of the comparisons.
+        :rtype: list
+        '''
+        return [
+            self.check_record(item) for item in (record,) + record.siblings
+        ]
+
+    def count_mismatch(self):
+        self.mismatch_records += 1
+        if self.max_mismatches and _shared_mismatches is not None:
+            with _shared_mismatches.get_lock():
+                _shared_mismatches.value += 1
+
+    def should_abort(self):
+        '''
+        Returns True when max_mismatches records mismatched, in this process
+        or in any worker process of the comparison.
+        '''
+        if not self.max_mismatches:
+            return False
+        if _shared_mismatches is not None:
+            mismatches = _shared_mismatches.value
+        else:
+            mismatches = self.mismatch_records
+        if mismatches < self.max_mismatches:
+            return False
+        if not self.aborted:
+            self.aborted = True
+            logger.error('%-21s: %d mismatches', 'Stopped', mismatches)
+        return True
+
+    def open_results(self):
+        '''
+        Opens the results file, if given.
+        '''
+        if self.results_file and self.results_writer is None:
+            self.results_writer = open_writer(self.results_file,
+                                              self.results_format)
+
+    def write_result(self, result):
+        if self.results_writer is not None:
+            self.results_writer.write(result)
+
+    def close_results(self):
+        if self.results_writer is not None:
+            self.results_writer.close()
+            self.results_writer = None
+
+    def open_cache(self):
+        '''
+        Opens the response cache, if given.
+        '''
+        if self.cache_file and self.cache is None:
+            self.cache = ResponseCache(self.cache_file, self.cache_max_age,
+                                       self.metrics)
+
+    def close_cache(self):
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    def open_transports(self):
+        '''
+        Opens persistent connections to the name servers, if configured.
+        '''
+        if self.protocol == 'tcp' and self.tcp_connections > 0:
+            for nameserver_ip in self.nameserver_ips:
+                self.transports[nameserver_ip] = TCPPipeline(
+                    nameserver_ip,
+                    self.port,
+                    connections=self.tcp_connections,
                 )
-        if self.mismatch_ttl > 0 or self.mismatch_rdataset > 0:
+
+    def close_transports(self):
+        for transport in self.transports.values():
+            transport.close()
+        self.transports = {}
+
+    def compare_rdatasets(self):
+        '''
+        Queries and compares all records. With concurrency > 1 the queries
+        run in a pool of worker threads; the comparison itself always runs
+        in the calling thread.
+        '''
+        for _ in self.iterate_results():
+            pass
+
+    def iterate_results(self):
+        '''
+        As :meth:`compare_rdatasets`, yielding the
+        :class:`dnszonetest.results.Result` of every record as it
+        completes.
+        '''
+        self.open_transports()
+        self.open_cache()
+        records = itertools.chain(
+            self.records(),
+            self.removed_records(),
+            self.probe_records(),
+        )
+        if self.concurrency > 1:
+            records = imap_unordered(
+                self.query_record,
+                records,
+                self.concurrency,
+            )
+        else:
+            records = (self.query_record(record) for record in records)
+        try:
+            for record in records:
+                for result in self.check_records(record):
+                    yield result
+                if self.should_abort():
+                    break
+        finally:
+            # Closing the pool discards the records not queried yet.
+            records.close()
+            self.close_transports()
+            self.close_cache()
+        self.update_errno()
+
+    def compare_processes(self):
+        '''
+        Shards the rdatasets over self.processes worker processes by owner
+        name, and merges their mismatch counters into this DnsZoneTest.
+
+        The zone file (unless streamed) and previous_zonefile are read once,
+        here, and every worker gets the part of its names; streaming
+        workers read the zone file each and skip the names of the others.
+        The sample is drawn here too.
+        '''
+        zones = [None] * self.processes
+        if not self.stream:
+            self.get_zone_from_file()
+        if self.sample is not None or self.sample_fraction is not None:
+            self.sample_keys = self.select_sample()
+        if not self.stream:
+            zones, self.zone_planner = self.split_zone()
+            self.close_zone()
+            self.zone_from_file = None
+        diffs = [None] * self.processes
+        if self.previous_zonefile:
+            diffs = self.load_diff().split(self.processes, shard_index)
+        shards = []
+        for index in range(self.processes):
+            shard = copy.copy(self)
+            shard.shard = (index, self.processes)
+            shard.processes = 1
+            shard.metrics = Metrics(self.metrics.slowest)
+            shard.profiler = Profiler(self.profiler.enabled)
+            shard.probes = self.probes // self.processes + (
+                index < self.probes % self.processes)
+            shard.shard_zone = zones[index]
+            shard.diff = diffs[index]
+            shard.planner = None
+            shards.append(shard)
+        del zones, diffs
+        counter = multiprocessing.Value('i', 0)
+        pool = multiprocessing.Pool(self.processes, _init_worker, (counter,))
+        try:
+            results = pool.map(_compare_shard, shards)
+        finally:
+            pool.close()
+            pool.join()
+        for shard in results:
+            self.merge_shard(shard)
+        self.update_errno()
+
+    def merge_shard(self, shard):
+        '''
+        Adds the mismatch counters and state of shard, a DnsZoneTest that
+        ran in a worker process.
+        '''
+        self.mismatch_ttl += shard.mismatch_ttl
+        self.mismatch_rdataset += shard.mismatch_rdataset
+        self.mismatch_response += shard.mismatch_response
+        self.mismatch_nxdomain += shard.mismatch_nxdomain
+        self.mismatch_records += shard.mismatch_records
+        self.aborted = self.aborted or shard.aborted
+        self.unchanged += shard.unchanged
+        self.skipped.update(shard.skipped)
+        self.diff_counts.update(shard.diff_counts)
+        if not self.sample_population:
+            self.sample_population = shard.sample_population
+            self.sample_size = shard.sample_size
+        self.sample_checked.update(shard.sample_checked)
+        self.sample_mismatched.update(shard.sample_mismatched)
+        for nameserver_ip, mismatches in shard.nameserver_mismatches.items():
+            self.nameserver_mismatches[nameserver_ip].update(mismatches)
+        if self.state is not None:
+            self.state.merge(shard.state)
+        self.metrics.merge(shard.metrics)
+        self.profiler.merge(shard.profiler)
+        if shard.results_part is not None:
+            self.results_writer.append(shard.results_part)
+        if shard.profile_file:
+            self.profile_files.append(shard_profile_file(shard))
+
+    def compare_axfr(self):
+        '''
+        Compares all records against zone transfers from every name server,
+        and reports rdatasets that a name server serves but the zone file
+        lacks. The transfers run concurrently.
+        '''
+        for _ in self.iterate_axfr_results():
+            pass
+
+    def iterate_axfr_results(self):
+        '''
+        As :meth:`compare_axfr`, yielding the
+        :class:`dnszonetest.results.Result` of every record.
+        '''
+        zones = dict(
+            imap_unordered(
+                lambda nameserver_ip: (
+                    nameserver_ip,
+                    self.get_zone_from_axfr(nameserver_ip),
+                ),
+                self.nameserver_ips,
+                len(self.nameserver_ips),
+            )
+        )
+        in_file = set()
+        for record in self.records(planned=False):
+            key = (
+                record.name,
+                record.rdataset_file.rdtype,
+                record.rdataset_file.covers,
+            )
+            in_file.add(key)
+            record.rdataset_query = zones[record.nameserver_ip].get_rdataset(
+                *key
+            )
+            yield self.check_record(record)
+        for nameserver_ip in self.nameserver_ips:
+            for name, rdataset in zones[nameserver_ip].iterate_rdatasets():
+                if self.skip_rdataset(rdataset):
+                    continue
+                if (name, rdataset.rdtype, rdataset.covers) not in in_file:
+                    self.mismatch_extra += 1
+                    self.nameserver_mismatches[nameserver_ip]['extra'] += 1
+                    logger.warning(
+                        'Only on %-13s: %s %s',
+                        nameserver_ip,
+                        name,
+                        RdatasetText(rdataset),
+                    )
+                    result = Result(self.zonename, name, rdataset.rdtype,
+                                    rdataset.covers, nameserver_ip, EXTRA,
+                                    rdataset_query=rdataset)
+                    self.write_result(result)
+                    yield result
+        self.update_errno()
+
+    def update_errno(self):
+        if self.mismatch_ttl > 0 or self.mismatch_rdataset > 0 or \
+                self.mismatch_extra > 0 or self.mismatch_response > 0 or \
+                self.mismatch_nxdomain > 0:
             self.errno = 1
         else:
             self.errno = 0
 
+    def report(self):
+        '''
+        Logs the number of mismatches per name server.
+        '''
+        for nameserver_ip in self.nameserver_ips:
+            mismatches = self.nameserver_mismatches[nameserver_ip]
+            logger.info(
+                '%-21s: %d rdataset, %d TTL, %d extra, %d response, '
+                '%d NXDOMAIN mismatches',
+                nameserver_ip,
+                mismatches['rdataset'],
+                mismatches['ttl'],
+                mismatches['extra'],
+                mismatches['response'],
+                mismatches['nxdomain'],
+            )
+
+    def write_metrics(self):
+        '''
+        Writes the query metrics to the metrics files, if given.
+        '''
+        self.metrics.stop()
+        if self.metrics_file:
+            self.metrics.write_json(self.metrics_file,
+                                    self.nameserver_mismatches)
+        if self.prometheus_file:
+            self.metrics.write_prometheus(self.prometheus_file,
+                                          self.nameserver_mismatches,
+                                          self.zonename)
+
+    def finish(self):
+        '''
+        Saves the state file, writes the metrics, logs the stage times and
+        reports the mismatches per name server. Closes the snapshot the zone
+        was read from.
+        '''
+        self.close_zone()
+        self.write_metrics()
+        if self.profiler.enabled:
+            self.profiler.log()
+        if self.state is not None:
+            logger.info('%-21s: %d', 'Unchanged, skipped', self.unchanged)
+            self.state.save()
+        for reason, count in sorted(self.skipped.items()):
+            logger.info('%-21s: %d skipped', REASONS[reason], count)
+        if self.previous_zonefile:
+            self.log_diff()
+        if self.sample_population:
+            self.log_sample()
+        if len(self.nameserver_ips) > 1:
+            self.report()
+
+    def log_diff(self):
+        '''
+        Logs the changes since previous_zonefile.
+        '''
+        counts = self.diff_counts
+        logger.info(
+            '%-21s: %d added, %d changed, %d removed, %d unchanged, '
+            '%d sampled',
+            'Changes',
+            counts['added'],
+            counts['changed'],
+            counts['removed'],
+            counts['unchanged'] + counts['sampled'],
+            counts['sampled'],
+        )
+
+    def log_sample(self):
+        '''
+        Logs the size of the sample and the estimated mismatch rate of the
+        zone, with its 95% confidence interval.
+        '''
+        logger.info(
+            '%-21s: %d of %d rdatasets, %d records, %d strata',
+            'Sample',
+            self.sample_size,
+            sum(self.sample_population.values()),
+            sum(self.sample_checked.values()),
+            len(self.sample_population),
+        )
+        rate = estimate(self.sample_population, self.sample_checked,
+                        self.sample_mismatched)
+        if rate is not None:
+            logger.info(
+                '%-21s: %.2f%% (95%% confidence interval %.2f%% to %.2f%%)',
+                'Mismatch rate',
+                100 * rate[0],
+                100 * rate[1],
+                100 * rate[2],
+            )
+
     def compare(self):
-        self.get_nameserver_ip()
-        self.get_zone_from_file()
-        self.compare_rdatasets()
+        self.metrics.start()
+        self.open_results()
+        try:
+            with cprofile(self.profile_file, self.profile_files):
+                self.get_nameserver_ip()
+                if self.axfr:
+                    self.get_zone_from_file()
+                    self.compare_axfr()
+                elif self.processes > 1:
+                    self.compare_processes()
+                else:
+                    if not self.stream:
+                        self.get_zone_from_file()
+                    self.compare_rdatasets()
+        finally:
+            self.close_results()
+        self.finish()
+
+    def results(self):
+        '''
+        Runs the comparison as :meth:`compare` does, and yields the
+        :class:`dnszonetest.results.Result` of every record as it
+        completes. The results are also written to the results file, if
+        given. Runs in this process: processes is not used.
+        '''
+        self.metrics.start()
+        self.open_results()
+        try:
+            self.get_nameserver_ip()
+            if self.axfr or not self.stream:
+                self.get_zone_from_file()
+            if self.axfr:
+                results = self.iterate_axfr_results()
+            else:
+                results = self.iterate_results()
+            for result in results:
+                yield result
+        finally:
+            self.close_results()
+        self.finish()
+
+
+def shard_index(name, count):
+    '''
+    Returns the shard, of count, of the rdatasets of owner name.
+    '''
+    return (zlib.crc32(name.to_digestable()) & 0xffffffff) % count
+
+
+def shard_profile_file(dzt):
+    '''
+    Returns the name of the cProfile statistics file of the shard dzt.
+    '''
+    return '{0}.{1}'.format(dzt.profile_file, dzt.shard[0])
+
+
+def _init_worker(counter):
+    global _shared_mismatches
+    _shared_mismatches = counter
+
+
+def _compare_shard(dzt):
+    '''
+    Runs the queries of one shard in a worker process.
+
+    :param DnsZoneTest dzt: DnsZoneTest with shard set.
+
+    :returns: dzt with its mismatch counters and state.
+    :rtype: DnsZoneTest
+    '''
+    profile_file = shard_profile_file(dzt) if dzt.profile_file else None
+    if dzt.results_file:
+        fd, dzt.results_part = tempfile.mkstemp(
+            prefix='dnszonetest-results-')
+        os.close(fd)
+        dzt.results_writer = open_writer(
+            dzt.results_part,
+            results_format(dzt.results_file, dzt.results_format),
+        )
+    try:
+        with cprofile(profile_file):
+            if dzt.shard_zone is not None:
+                dzt.zone_from_file, dzt.shard_zone = dzt.shard_zone, None
+            elif not dzt.stream:
+                dzt.get_zone_from_file()
+            dzt.compare_rdatasets()
+    finally:
+        dzt.close_results()
+    return dzt
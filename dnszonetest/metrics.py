@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.metrics
+-------------------
+
+Query metrics of a run: round trip times, retries, timeouts, truncated
+responses and bytes per name server, and the slowest records. Exported as
+JSON or in the Prometheus text format.
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import bisect
+import collections
+import heapq
+import io
+import json
+import threading
+import time
+
+# Upper bounds of the round trip time histogram buckets in seconds.
+RTT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1,
+               2.5, 5, 10)
+
+COUNTERS = (
+    ('queries', 'Queries sent, including retries.'),
+    ('responses', 'Responses received.'),
+    ('retries', 'Queries sent again after a timeout.'),
+    ('timeouts', 'Queries that timed out.'),
+    ('truncated', 'Truncated UDP responses retried over TCP.'),
+    ('bytes_sent', 'Bytes of queries sent.'),
+    ('bytes_received', 'Bytes of responses received.'),
+    ('cached', 'Responses read from the response cache.'),
+)
+
+
+class _Server(object):
+    def __init__(self):
+        self.counters = collections.Counter()
+        self.rtt_buckets = [0] * (len(RTT_BUCKETS) + 1)
+        self.rtt_sum = 0.0
+
+
+class Metrics(object):
+    '''
+    Thread safe collector of query metrics.
+    '''
+    def __init__(self, slowest=10):
+        '''
+        :param int slowest: number of slowest records to keep.
+        '''
+        self.slowest = slowest
+        self.records = 0
+        self.started = None
+        self.stopped = None
+        self._servers = collections.defaultdict(_Server)
+        self._slowest = []
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.started is None:
+            self.started = time.time()
+
+    def stop(self):
+        self.stopped = time.time()
+
+    def sent(self, nameserver_ip, size, retry=False):
+        '''
+        Counts a query of size bytes sent to nameserver_ip.
+        '''
+        with self._lock:
+            counters = self._servers[nameserver_ip].counters
+            counters['queries'] += 1
+            counters['bytes_sent'] += size
+            if retry:
+                counters['retries'] += 1
+
+    def received(self, nameserver_ip, size, rtt):
+        '''
+        Counts a response of size bytes that took rtt seconds.
+        '''
+        with self._lock:
+            server = self._servers[nameserver_ip]
+            server.counters['responses'] += 1
+            server.counters['bytes_received'] += size
+            server.rtt_buckets[bisect.bisect_left(RTT_BUCKETS, rtt)] += 1
+            server.rtt_sum += rtt
+
+    def count(self, nameserver_ip, name):
+        '''
+        Adds one to counter name ('timeouts', 'truncated' or 'cached').
+        '''
+        with self._lock:
+            self._servers[nameserver_ip].counters[name] += 1
+
+    def record(self, name, nameserver_ip, seconds):
+        '''
+        Counts a record that took seconds to query, including retries.
+        '''
+        with self._lock:
+            self.records += 1
+            item = (seconds, '{0}'.format(name), nameserver_ip)
+            if len(self._slowest) < self.slowest:
+                heapq.heappush(self._slowest, item)
+            elif item > self._slowest[0]:
+                heapq.heapreplace(self._slowest, item)
+
+    def merge(self, other):
+        '''
+        Adds the metrics of other, collected in a worker process.
+        '''
+        with self._lock:
+            self.records += other.records
+            for nameserver_ip, theirs in other._servers.items():
+                server = self._servers[nameserver_ip]
+                server.counters.update(theirs.counters)
+                server.rtt_buckets = [
+                    a + b for a, b in
+                    zip(server.rtt_buckets, theirs.rtt_buckets)
+                ]
+                server.rtt_sum += theirs.rtt_sum
+            self._slowest = heapq.nlargest(
+                self.slowest, self._slowest + other._slowest)
+            heapq.heapify(self._slowest)
+
+    @property
+    def seconds(self):
+        if self.started is None:
+            return 0
+        return (self.stopped or time.time()) - self.started
+
+    def summary(self, mismatches=None):
+        '''
+        Returns the metrics as a dict.
+
+        :param dict mismatches: mismatch counters per name server IP
+            number, as in ``DnsZoneTest.nameserver_mismatches``.
+        '''
+        mismatches = mismatches or {}
+        seconds = self.seconds
+        with self._lock:
+            nameservers = {}
+            for nameserver_ip in sorted(
+                    set(self._servers) | set(mismatches)):
+                server = self._servers[nameserver_ip]
+                summary = dict(
+                    (name, server.counters[name]) for name, _ in COUNTERS)
+                responses = server.counters['responses']
+                summary['rtt'] = dict(
+                    buckets=dict(zip(
+                        [str(bound) for bound in RTT_BUCKETS] + ['+Inf'],
+                        server.rtt_buckets,
+                    )),
+                    sum=round(server.rtt_sum, 6),
+                    mean=round(server.rtt_sum / responses, 6)
+                    if responses else None,
+                )
+                summary['mismatches'] = dict(
+                    mismatches.get(nameserver_ip, {}))
+                nameservers[nameserver_ip] = summary
+            slowest = [
+                dict(name=name, nameserver=nameserver_ip,
+                     seconds=round(seconds_, 6))
+                for seconds_, name, nameserver_ip in
+                sorted(self._slowest, reverse=True)
+            ]
+        return dict(
+            seconds=round(seconds, 6),
+            records=self.records,
+            records_per_second=round(self.records / seconds, 1)
+            if seconds else None,
+            nameservers=nameservers,
+            slowest=slowest,
+        )
+
+    def json(self, mismatches=None):
+        '''
+        Returns :meth:`summary` as JSON text.
+        '''
+        return json.dumps(self.summary(mismatches), indent=2, sort_keys=True)
+
+    def prometheus(self, mismatches=None, zonename=None):
+        '''
+        Returns the metrics in the Prometheus text exposition format.
+
+        :param dict mismatches: as for :meth:`summary`.
+        :param str zonename: value of the zone label.
+        '''
+        summary = self.summary(mismatches)
+        zone = '' if zonename is None else 'zone="{0}",'.format(zonename)
+        lines = []
+
+        def metric(name, kind, text):
+            lines.append('# HELP dnszonetest_{0} {1}'.format(name, text))
+            lines.append('# TYPE dnszonetest_{0} {1}'.format(name, kind))
+
+        metric('duration_seconds', 'gauge', 'Duration of the run.')
+        lines.append('dnszonetest_duration_seconds{{{0}}} {1}'.format(
+            zone.rstrip(','), summary['seconds']))
+        metric('records_total', 'counter', 'Records queried.')
+        lines.append('dnszonetest_records_total{{{0}}} {1}'.format(
+            zone.rstrip(','), summary['records']))
+        nameservers = summary['nameservers']
+        for name, text in COUNTERS:
+            metric(name + '_total', 'counter', text)
+            for nameserver_ip, server in sorted(nameservers.items()):
+                lines.append(
+                    'dnszonetest_{0}_total{{{1}nameserver="{2}"}} {3}'.format(
+                        name, zone, nameserver_ip, server[name]))
+        metric('mismatches_total', 'counter',
+               'Records that differ from the zone file.')
+        for nameserver_ip, server in sorted(nameservers.items()):
+            for kind, count in sorted(server['mismatches'].items()):
+                lines.append(
+                    'dnszonetest_mismatches_total'
+                    '{{{0}nameserver="{1}",kind="{2}"}} {3}'.format(
+                        zone, nameserver_ip, kind, count))
+        metric('rtt_seconds', 'histogram', 'Round trip time of responses.')
+        for nameserver_ip, server in sorted(nameservers.items()):
+            labels = '{0}nameserver="{1}"'.format(zone, nameserver_ip)
+            rtt = server['rtt']
+            cumulative = 0
+            for bound in [str(bound) for bound in RTT_BUCKETS] + ['+Inf']:
+                cumulative += rtt['buckets'][bound]
+                lines.append(
+                    'dnszonetest_rtt_seconds_bucket{{{0},le="{1}"}} {2}'
+                    .format(labels, bound, cumulative))
+            lines.append('dnszonetest_rtt_seconds_sum{{{0}}} {1}'.format(
+                labels, rtt['sum']))
+            lines.append('dnszonetest_rtt_seconds_count{{{0}}} {1}'.format(
+                labels, cumulative))
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path, mismatches=None):
+        '''
+        Writes :meth:`json` to file path.
+        '''
+        with io.open(path, 'w', encoding='utf-8') as fh:
+            # json.dumps returns bytes on Python 2.
+            fh.write('{0}'.format(self.json(mismatches)))
+
+    def write_prometheus(self, path, mismatches=None, zonename=None):
+        '''
+        Writes :meth:`prometheus` to file path.
+        '''
+        with io.open(path, 'w', encoding='utf-8') as fh:
+            fh.write(self.prometheus(mismatches, zonename))
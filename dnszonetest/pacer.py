@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.pacer
+-----------------
+
+Token bucket query pacing, to stay below the response rate limit (RRL) of
+name servers.
+'''
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+import time
+
+try:
+    monotonic = time.monotonic
+except AttributeError:  # Python 2
+    monotonic = time.time
+
+
+class TokenBucket(object):
+    '''
+    Token bucket of `burst` tokens, refilled at `rate` tokens per second.
+    '''
+    def __init__(self, rate, burst=None):
+        '''
+        :param float rate: tokens per second.
+        :param int burst: bucket size (default: rate, at least 1).
+        '''
+        self.rate = rate
+        self.burst = burst if burst else max(rate, 1)
+        self.tokens = self.burst
+        self.last = monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        '''
+        Takes a token and returns the number of seconds to wait before it
+        may be used.
+        '''
+        with self._lock:
+            now = monotonic()
+            self.tokens = min(
+                self.burst,
+                self.tokens + (now - self.last) * self.rate,
+            )
+            self.last = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        '''
+        Takes a token, waiting until it is available.
+        '''
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Pacer(object):
+    '''
+    One token bucket per name server.
+    '''
+    def __init__(self, rate, burst=None):
+        '''
+        :param float rate: queries per second per name server.
+        :param int burst: queries that may be sent at once (default: rate).
+        '''
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, nameserver_ip):
+        with self._lock:
+            if nameserver_ip not in self._buckets:
+                self._buckets[nameserver_ip] = TokenBucket(
+                    self.rate, self.burst)
+            return self._buckets[nameserver_ip]
+
+    def reserve(self, nameserver_ip):
+        '''
+        Reserves a query to nameserver_ip and returns the number of seconds
+        to wait before sending it.
+        '''
+        return self.bucket(nameserver_ip).reserve()
+
+    def acquire(self, nameserver_ip):
+        '''
+        Waits until a query may be sent to nameserver_ip.
+        '''
+        self.bucket(nameserver_ip).acquire()
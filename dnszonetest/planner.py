@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.planner
+-------------------
+
+Plans the queries that verify the rdatasets of a zone file.
+
+A query per rdataset is not always the right question:
+
+* The RRSIG rdatasets of a name, one per type covered, are all answered by
+  one RRSIG query; they share one query.
+* Names below a zone cut (glue and delegated data) and below a DNAME are
+  not served by the zone; the name server answers with a referral or a
+  DNAME. They are not queried, nor is data at a zone cut other than the
+  delegation (NS) and DNSSEC records. The NS records of a delegation are
+  read from the referral.
+* A name with a CNAME has no other data (but DNSSEC records). Other
+  rdatasets at the name would be answered by the CNAME; they are not
+  queried.
+* The rdatasets of a wildcard name (``*.example.com``) are verified by
+  querying a name the wildcard covers, so the answer is synthesized from
+  the wildcard as for any other name.
+
+Names that are not in the zone are probed below names that are, where no
+wildcard, zone cut or DNAME applies, so the answer must be NXDOMAIN.
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import random
+
+import dns.name
+import dns.rdatatype
+
+# Label of the name queried for the rdatasets of a wildcard name.
+WILDCARD_LABEL = b'dnszonetest-wildcard'
+
+# Prefix of the label of names probed for NXDOMAIN.
+PROBE_LABEL = b'dnszonetest-probe'
+
+# Types that may be at a name with a CNAME.
+CNAME_TYPES = frozenset((
+    dns.rdatatype.CNAME,
+    dns.rdatatype.RRSIG,
+    dns.rdatatype.NSEC,
+))
+
+# Types served at a zone cut.
+CUT_TYPES = frozenset((
+    dns.rdatatype.NS,
+    dns.rdatatype.DS,
+    dns.rdatatype.RRSIG,
+    dns.rdatatype.NSEC,
+))
+
+# Types of which all rdatasets at a name share a query.
+SIG_TYPES = frozenset((
+    dns.rdatatype.RRSIG,
+    dns.rdatatype.SIG,
+))
+
+# Reasons not to query a group.
+OCCLUDED = 'occluded'
+CNAME_AND_OTHER_DATA = 'cname'
+
+REASONS = {
+    OCCLUDED: 'Not authoritative',
+    CNAME_AND_OTHER_DATA: 'CNAME and other data',
+}
+
+
+def wildcard_qname(name):
+    '''
+    Returns the name to query for the rdatasets of wildcard name.
+    '''
+    return dns.name.Name((WILDCARD_LABEL,) + name.labels[1:])
+
+
+def probe_qname(parent):
+    '''
+    Returns a name below parent with a random label, to probe for NXDOMAIN.
+    '''
+    label = PROBE_LABEL + '-{0:08x}'.format(
+        random.getrandbits(32)).encode('ascii')
+    return dns.name.Name((label,) + parent.labels)
+
+
+class QueryPlanner(object):
+    '''
+    Groups the rdatasets of a zone into queries.
+    '''
+    def __init__(self, origin, cuts=(), dnames=()):
+        '''
+        :param dns.name.Name origin: zone name.
+        :param cuts: names of the zone cuts (NS rdatasets below the origin).
+        :param dnames: names with a DNAME.
+
+        Zone cuts and DNAMEs not given are learnt from the rdatasets as they
+        are planned, which covers names below them that come later. Names
+        below them that come earlier, such as glue before the NS rdataset
+        of its delegation, are planned as if they were not. The parents of
+        wildcard names are learnt from the rdatasets planned.
+        '''
+        if not isinstance(origin, dns.name.Name):
+            origin = dns.name.from_text(origin)
+        self.origin = origin
+        self.cuts = set(cuts)
+        self.dnames = set(dnames)
+        self.wildcards = set()
+
+    @classmethod
+    def from_zone(cls, zone):
+        '''
+        Returns a QueryPlanner for zone, with all its zone cuts and DNAMEs.
+
+        :param zone: a :class:`dns.zone.Zone` or
+            :class:`dnszonetest.compact.CompactZone`.
+        '''
+        return cls(
+            zone.origin,
+            [
+                name for name, _ in
+                zone.iterate_rdatasets(dns.rdatatype.NS)
+                if name != zone.origin
+            ],
+            [
+                name for name, _ in
+                zone.iterate_rdatasets(dns.rdatatype.DNAME)
+            ],
+        )
+
+    def occluded(self, name):
+        '''
+        Returns True when name is below a zone cut or a DNAME.
+        '''
+        while len(name) > len(self.origin) + 1:
+            name = name.parent()
+            if name in self.cuts or name in self.dnames:
+                return True
+        return False
+
+    def authoritative(self, name, rdtype):
+        '''
+        Returns True when the zone serves rdatasets of type rdtype at name:
+        name is not below a zone cut or a DNAME, and rdtype is served at a
+        zone cut.
+        '''
+        if self.occluded(name):
+            return False
+        return name not in self.cuts or rdtype in CUT_TYPES
+
+    def nxdomain_below(self, name):
+        '''
+        Returns True when names below name that are not in the zone do not
+        exist: name is not a wildcard, is not at or below a zone cut or a
+        DNAME, and has no wildcard below it. Only holds once all rdatasets
+        were planned.
+        '''
+        return not (
+            name.is_wild() or
+            name in self.cuts or
+            name in self.dnames or
+            name in self.wildcards or
+            self.occluded(name)
+        )
+
+    def plan(self, rdatasets):
+        '''
+        Yields (qname, group, reason) for (name, rdataset) tuples
+        rdatasets: every rdataset of group, a list of (name, rdataset), is
+        verified by querying qname for the type of the group. reason is
+        None for groups to query, or why the group is not queried: OCCLUDED
+        or CNAME_AND_OTHER_DATA.
+
+        The rdatasets of a name must be next to each other in rdatasets.
+        '''
+        node = []
+        for name, rdataset in rdatasets:
+            if node and node[0][0] != name:
+                for group in self.plan_node(node):
+                    yield group
+                node = []
+            node.append((name, rdataset))
+        if node:
+            for group in self.plan_node(node):
+                yield group
+
+    def plan_node(self, node):
+        '''
+        Yields (qname, group, reason) for the rdatasets of one name.
+        '''
+        name = node[0][0]
+        rdtypes = set(rdataset.rdtype for _, rdataset in node)
+        if name != self.origin:
+            if dns.rdatatype.NS in rdtypes:
+                self.cuts.add(name)
+            if dns.rdatatype.DNAME in rdtypes:
+                self.dnames.add(name)
+        if self.occluded(name):
+            yield name, node, OCCLUDED
+            return
+        qname = name
+        if name.is_wild():
+            self.wildcards.add(name.parent())
+            qname = wildcard_qname(name)
+        sigs = {}
+        for item in node:
+            rdtype = item[1].rdtype
+            if name in self.cuts and rdtype not in CUT_TYPES:
+                yield qname, [item], OCCLUDED
+            elif dns.rdatatype.CNAME in rdtypes and \
+                    rdtype not in CNAME_TYPES:
+                yield qname, [item], CNAME_AND_OTHER_DATA
+            elif rdtype in SIG_TYPES:
+                sigs.setdefault(rdtype, []).append(item)
+            else:
+                yield qname, [item], None
+        for rdtype in sorted(sigs):
+            yield qname, sigs[rdtype], None
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.pool
+----------------
+
+Bounded worker thread pool for running DNS queries concurrently.
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+_DONE = object()
+
+
+def imap_unordered(func, iterable, workers, backlog=None):
+    '''
+    Apply func to every item of iterable in a pool of worker threads and
+    yield the results in order of completion.
+
+    Unlike :meth:`multiprocessing.pool.ThreadPool.imap_unordered` at most
+    `backlog` items are taken from iterable ahead of the results, so
+    iterable may be a lazy generator of any size. An exception raised by
+    func is re-raised in the consuming thread. Closing the generator
+    before it is exhausted discards items that have not been started yet.
+
+    :param callable func: function to apply to each item.
+    :param iterable: items to process.
+    :param int workers: number of worker threads.
+    :param int backlog: maximum number of queued items (default: 2 *
+        workers).
+    '''
+    if backlog is None:
+        backlog = workers * 2
+    tasks = queue.Queue(max(backlog, 1))
+    results = queue.Queue()
+    stop = threading.Event()
+
+    def worker():
+        while True:
+            item = tasks.get()
+            if item is _DONE:
+                return
+            if stop.is_set():
+                continue
+            try:
+                results.put((True, func(item)))
+            except Exception as err:
+                results.put((False, err))
+
+    for _ in range(workers):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+
+    def result():
+        ok, value = results.get()
+        if not ok:
+            raise value
+        return value
+
+    pending = 0
+    try:
+        for item in iterable:
+            tasks.put(item)
+            pending += 1
+            while not results.empty():
+                pending -= 1
+                yield result()
+        while pending:
+            pending -= 1
+            yield result()
+    finally:
+        stop.set()
+        for _ in range(workers):
+            tasks.put(_DONE)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.profiling
+---------------------
+
+Timing of the stages of a comparison, and cProfile statistics of a run.
+
+The stages are:
+
+resolve
+    resolving the name servers (``get_nameserver_ip``).
+parse
+    reading the zone file (``get_zone_from_file``).
+build
+    building a query.
+network
+    sending a query and waiting for its response, including retries and
+    rate limiting.
+response
+    reading a response.
+compare
+    comparing a response to the zone file.
+log
+    logging mismatches.
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import contextlib
+import cProfile
+import functools
+import logging
+import os
+import pstats
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('resolve', 'parse', 'build', 'network', 'response', 'compare',
+          'log')
+
+
+class _NullStage(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage(object):
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add(self.name, time.time() - self.start)
+        return False
+
+
+class Profiler(object):
+    '''
+    Thread safe timer of the stages of a comparison. Disabled profilers
+    time nothing, and cost one method call per stage.
+    '''
+    def __init__(self, enabled=False):
+        '''
+        :param bool enabled: time the stages.
+        '''
+        self.enabled = enabled
+        self.hooks = []
+        self.calls = collections.Counter()
+        self.seconds = collections.Counter()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Hooks stay in the process that added them.
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['hooks'] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        '''
+        Calls hook(stage, seconds) after every timed stage, in the thread
+        that ran the stage, and enables the profiler.
+
+        :param callable hook: function of the stage name and its duration
+            in seconds.
+        '''
+        self.hooks.append(hook)
+        self.enabled = True
+
+    def stage(self, name):
+        '''
+        Returns a context manager that times stage name.
+        '''
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def add(self, name, seconds):
+        '''
+        Adds a run of stage name that took seconds.
+        '''
+        with self._lock:
+            self.calls[name] += 1
+            self.seconds[name] += seconds
+        for hook in self.hooks:
+            hook(name, seconds)
+
+    def merge(self, other):
+        '''
+        Adds the stage times of other, collected in a worker process.
+        '''
+        with self._lock:
+            self.calls.update(other.calls)
+            self.seconds.update(other.seconds)
+
+    def summary(self):
+        '''
+        Returns {stage: {'calls': calls, 'seconds': seconds}} for the timed
+        stages. Stages that run in several threads at once add up to more
+        than the duration of the run.
+        '''
+        with self._lock:
+            return dict(
+                (name, dict(calls=self.calls[name],
+                            seconds=round(self.seconds[name], 6)))
+                for name in self.calls
+            )
+
+    def log(self):
+        '''
+        Logs the time of every stage.
+        '''
+        summary = self.summary()
+        for name in STAGES + tuple(sorted(set(summary) - set(STAGES))):
+            if name in summary:
+                logger.info(
+                    '%-21s: %.3f s in %d calls',
+                    'Stage ' + name,
+                    summary[name]['seconds'],
+                    summary[name]['calls'],
+                )
+
+
+# Profiler of code that is not given one.
+NULL_PROFILER = Profiler()
+
+
+def timed(stage):
+    '''
+    Decorator of methods that times them as stage with the profiler of
+    their object.
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.stage(stage):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def cprofile(path, extra=None):
+    '''
+    Context manager that runs its block under cProfile and writes the
+    statistics to file path, for :mod:`pstats` or a viewer like snakeviz.
+    Does nothing when path is empty.
+
+    cProfile only sees the thread it runs in; the queries of worker threads
+    show up in the stage times, not in the statistics.
+
+    :param str path: statistics file name.
+    :param list extra: statistics files of worker processes to add, and
+        remove. May be filled in by the block.
+    '''
+    if not path:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        stats = pstats.Stats(profile)
+        for name in extra or ():
+            stats.add(name)
+            os.remove(name)
+        stats.dump_stats(path)
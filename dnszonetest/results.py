@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.results
+-------------------
+
+Per-record results of a comparison, and writers that stream them to JSON
+lines or CSV files as records complete.
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import abc
+import csv
+import io
+import json
+import os
+import shutil
+import sys
+
+import dns.rdatatype
+
+# Status of a result: the record matched, or the kind of mismatch, as in
+# DnsZoneTest.nameserver_mismatches.
+MATCH = 'match'
+RDATASET = 'rdataset'
+TTL = 'ttl'
+EXTRA = 'extra'
+RESPONSE = 'response'
+NXDOMAIN = 'nxdomain'
+
+FIELDS = ('zone', 'name', 'type', 'covers', 'nameserver', 'status',
+          'response', 'expected', 'received', 'expected_ttl',
+          'received_ttl')
+
+_PY2 = sys.version_info < (3,)
+
+
+def _open(path, mode, binary):
+    if binary:
+        return open(path, mode + 'b')
+    return io.open(path, mode, encoding='utf-8', newline='')
+
+
+def _rdata(rdataset):
+    if rdataset is None:
+        return None
+    return sorted(rdata.to_text() for rdata in rdataset)
+
+
+class Result(object):
+    '''
+    Result of comparing one rdataset with one name server. The rdata are
+    only turned into text by :meth:`as_dict`.
+    '''
+    __slots__ = ('zonename', 'name', 'rdtype', 'covers', 'nameserver_ip',
+                 'status', 'rdataset_file', 'rdataset_query', 'response')
+
+    def __init__(self, zonename, name, rdtype, covers, nameserver_ip, status,
+                 rdataset_file=None, rdataset_query=None, response=None):
+        '''
+        :param str zonename: zone name.
+        :param dns.name.Name name: owner name.
+        :param int rdtype: record type.
+        :param int covers: type covered by an RRSIG, or 0.
+        :param str nameserver_ip: IP number of the name server.
+        :param str status: MATCH, RDATASET, TTL, RESPONSE (the rdataset
+            matched, but not the rest of the response), NXDOMAIN (a probe
+            name exists) or EXTRA.
+        :param dns.rdataset.Rdataset rdataset_file: rdataset from the zone
+            file; None for EXTRA and probes.
+        :param dns.rdataset.Rdataset rdataset_query: rdataset from the name
+            server; None when it did not answer.
+        :param str response: kind of response, see
+            :mod:`dnszonetest.classify`; None for zone transfers.
+        '''
+        self.zonename = zonename
+        self.name = name
+        self.rdtype = rdtype
+        self.covers = covers
+        self.nameserver_ip = nameserver_ip
+        self.status = status
+        self.rdataset_file = rdataset_file
+        self.rdataset_query = rdataset_query
+        self.response = response
+
+    @classmethod
+    def from_record(cls, zonename, record, status):
+        '''
+        Returns the Result of a compared
+        :class:`dnszonetest.main.Record`.
+        '''
+        verdict = record.verdict
+        return cls(zonename, record.name, record.rdataset_file.rdtype,
+                   record.rdataset_file.covers, record.nameserver_ip, status,
+                   None if record.probe else record.rdataset_file,
+                   record.rdataset_query,
+                   None if verdict is None else verdict.kind)
+
+    @property
+    def mismatch(self):
+        return self.status != MATCH
+
+    def as_dict(self):
+        '''
+        Returns the result as a dict with the keys of FIELDS. expected and
+        received are lists of rdata text, or None.
+        '''
+        return dict(
+            zone=self.zonename,
+            name='{0}'.format(self.name),
+            type=dns.rdatatype.to_text(self.rdtype),
+            covers=dns.rdatatype.to_text(self.covers)
+            if self.covers else None,
+            nameserver=self.nameserver_ip,
+            status=self.status,
+            response=self.response,
+            expected=_rdata(self.rdataset_file),
+            received=_rdata(self.rdataset_query),
+            expected_ttl=getattr(self.rdataset_file, 'ttl', None),
+            received_ttl=getattr(self.rdataset_query, 'ttl', None),
+        )
+
+
+# Python 2 and 3 base class with ABCMeta as metaclass.
+_ABC = abc.ABCMeta(str('_ABC'), (object,), {})
+
+
+class ResultWriter(_ABC):
+    '''
+    Writes results to an open file, one at a time. Subclasses implement
+    :meth:`write`.
+    '''
+    binary = False
+    skip_header = False
+
+    def __init__(self, fh):
+        '''
+        :param fh: file object to write to.
+        '''
+        self.fh = fh
+        self.write_header()
+
+    def write_header(self):
+        pass
+
+    @abc.abstractmethod
+    def write(self, result):
+        '''
+        Writes :class:`Result` result.
+        '''
+
+    def append(self, path):
+        '''
+        Copies the results in file path, written by a writer of the same
+        class, and removes the file.
+        '''
+        with _open(path, 'r', self.binary) as fh:
+            if self.skip_header:
+                fh.readline()
+            shutil.copyfileobj(fh, self.fh)
+        os.remove(path)
+
+    def close(self):
+        if self.fh in (sys.stdout, getattr(sys.stdout, 'buffer', None)):
+            self.fh.flush()
+        else:
+            self.fh.close()
+
+
+class JsonLinesWriter(ResultWriter):
+    '''
+    Writes a JSON object per result and line.
+    '''
+    def write(self, result):
+        self.fh.write('{0}\n'.format(
+            json.dumps(result.as_dict(), sort_keys=True)))
+
+
+class CsvWriter(ResultWriter):
+    '''
+    Writes a CSV row per result, after a header row with FIELDS. The rdata
+    of expected and received are separated by " | ".
+    '''
+    binary = _PY2
+    skip_header = True
+
+    def write_header(self):
+        self.writer = csv.writer(self.fh)
+        self._write(FIELDS)
+
+    def _write(self, values):
+        if _PY2:
+            values = [value.encode('utf-8') for value in values]
+        self.writer.writerow(values)
+
+    def write(self, result):
+        row = result.as_dict()
+        for field in ('expected', 'received'):
+            if row[field] is not None:
+                row[field] = ' | '.join(row[field])
+        self._write([
+            '' if row[field] is None else '{0}'.format(row[field])
+            for field in FIELDS
+        ])
+
+
+WRITERS = {
+    'jsonl': JsonLinesWriter,
+    'csv': CsvWriter,
+}
+
+
+def results_format(path, fmt=None):
+    '''
+    Returns fmt, or the format of results file path by its extension:
+    csv for .csv, jsonl otherwise.
+    '''
+    if fmt:
+        return fmt
+    if path.lower().endswith('.csv'):
+        return 'csv'
+    return 'jsonl'
+
+
+def open_writer(path, fmt=None):
+    '''
+    Returns a ResultWriter for file path, - for standard output.
+
+    :param str path: file name.
+    :param str fmt: jsonl or csv; by default from the extension of path.
+    '''
+    cls = WRITERS[results_format(path, fmt)]
+    if path == '-':
+        fh = sys.stdout
+        if cls.binary:
+            fh = getattr(fh, 'buffer', fh)
+    else:
+        fh = _open(path, 'w', cls.binary)
+    return cls(fh)
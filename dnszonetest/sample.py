@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.sample
+------------------
+
+Stratified random samples of the rdatasets of a zone, and an estimate of
+the mismatch rate of the whole zone from the records of a sample.
+
+The rdatasets are grouped in strata by type and subtree, the name one label
+below the zone name that the owner name is at or below. Every stratum gets
+a share of the sample in proportion to its size, the remainders going to
+the strata with the largest fractions. Which rdatasets of a stratum are in
+the sample is drawn from a seeded random number generator, so worker
+processes that count the same rdatasets in the same order with the same
+seed draw the same sample.
+
+The mismatch rate is the mean of the mismatch rates of the strata, weighted
+by their sizes. Its confidence interval is the Wilson score interval, for
+the effective sample size of the weighted mean.
+'''
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import math
+import random
+
+# Two-sided 95% confidence.
+Z_95 = 1.959964
+
+
+def stratum(name, rdtype, origin):
+    '''
+    Returns the stratum of an rdataset: (rdtype, subtree), subtree being
+    the name one label below origin that name is at or below, or origin.
+
+    :param dns.name.Name name: owner name.
+    :param int rdtype: type of the rdataset.
+    :param dns.name.Name origin: zone name.
+    '''
+    depth = len(origin) + 1
+    if len(name) < depth:
+        return rdtype, origin
+    return rdtype, name.split(depth)[1]
+
+
+def wilson_interval(rate, size, z=Z_95):
+    '''
+    Returns (low, high), the Wilson score interval of a proportion.
+
+    :param float rate: proportion in the sample.
+    :param float size: (effective) size of the sample.
+    :param float z: quantile of the standard normal distribution.
+    '''
+    if size <= 0:
+        return 0.0, 1.0
+    z2 = z * z
+    center = (rate + z2 / (2 * size)) / (1 + z2 / size)
+    margin = z / (1 + z2 / size) * math.sqrt(
+        rate * (1 - rate) / size + z2 / (4 * size * size))
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def estimate(population, checked, mismatched, z=Z_95):
+    '''
+    Returns (rate, low, high, size): the estimated mismatch rate of the
+    population, its confidence interval and the effective sample size, or
+    None when no records were checked. Strata without checked records are
+    left out.
+
+    :param dict population: number of rdatasets per stratum.
+    :param dict checked: number of checked records per stratum.
+    :param dict mismatched: number of mismatched records per stratum.
+    '''
+    total = weighted = squares = 0.0
+    for key, count in checked.items():
+        if not count:
+            continue
+        weight = population.get(key, count)
+        total += weight
+        weighted += weight * mismatched.get(key, 0) / count
+        squares += weight * weight / count
+    if not total:
+        return None
+    rate = weighted / total
+    size = total * total / squares
+    low, high = wilson_interval(rate, size, z)
+    return rate, low, high, size
+
+
+class StratifiedSample(object):
+    '''
+    Stratified random sample of the rdatasets of a zone, drawn in two
+    passes: :meth:`count` every rdataset, :meth:`draw`, then :meth:`check`
+    every rdataset again.
+    '''
+    def __init__(self, origin, size=None, fraction=None, seed=None):
+        '''
+        :param dns.name.Name origin: zone name.
+        :param int size: number of rdatasets in the sample.
+        :param float fraction: fraction of the rdatasets in the sample,
+            when size is not given.
+        :param seed: seed of the random number generator.
+        '''
+        self.origin = origin
+        self.size = size
+        self.fraction = fraction
+        self.random = random.Random(seed)
+        # Number of rdatasets per stratum.
+        self.population = collections.Counter()
+        # Number of rdatasets in the sample, once drawn.
+        self.drawn = 0
+        self._selected = {}
+        self._seen = collections.Counter()
+
+    def count(self, name, rdataset):
+        '''
+        Counts rdataset of owner name in its stratum.
+        '''
+        self.population[stratum(name, rdataset.rdtype, self.origin)] += 1
+
+    def quotas(self):
+        '''
+        Returns the number of rdatasets to sample per stratum.
+        '''
+        total = sum(self.population.values())
+        if not total:
+            return {}
+        if self.size is not None:
+            size = self.size
+        else:
+            size = int(round(self.fraction * total))
+            if self.fraction > 0:
+                size = max(size, 1)
+        size = min(size, total)
+        quotas = {}
+        remainders = []
+        for key, count in self.population.items():
+            share = size * count / total
+            quotas[key] = int(share)
+            remainders.append((share - int(share), self.random.random(), key))
+        left = size - sum(quotas.values())
+        remainders.sort(key=lambda item: item[:2], reverse=True)
+        for _, _, key in remainders[:left]:
+            quotas[key] += 1
+        return quotas
+
+    def draw(self):
+        '''
+        Draws the sample, after every rdataset was counted.
+        '''
+        for key, quota in self.quotas().items():
+            if quota:
+                self._selected[key] = set(
+                    self.random.sample(range(self.population[key]), quota))
+                self.drawn += quota
+
+    def check(self, name, rdataset):
+        '''
+        Returns True when rdataset of owner name is in the sample. Call once
+        for every counted rdataset, after :meth:`draw`.
+        '''
+        key = stratum(name, rdataset.rdtype, self.origin)
+        index = self._seen[key]
+        self._seen[key] += 1
+        return index in self._selected.get(key, ())
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.scheduler
+---------------------
+
+Retry scheduler with RTT based adaptive timeouts.
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import logging
+import socket
+import threading
+import time
+
+import dns.exception
+import dns.query
+import dnszonetest.transport
+from dnszonetest.wire import query_name, response_size, to_wire, truncated
+
+logger = logging.getLogger(__name__)
+
+# Errors of a failed attempt, besides timeouts: a refused or closed TCP
+# connection, or a response that does not answer the query.
+_FAILURES = (dns.exception.FormError, dns.query.BadResponse, socket.error,
+             EOFError)
+
+
+class RetryScheduler(object):
+    '''
+    Sends queries with retries. The timeout of the first attempt follows
+    the smoothed round trip time of the name server (as TCP does, RFC 6298)
+    and doubles with every retry, up to a maximum. Truncated UDP responses
+    are retried over TCP.
+    '''
+    def __init__(self, retries=2, timeout=10, initial_timeout=1,
+                 min_timeout=0.05, pacer=None, metrics=None):
+        '''
+        :param int retries: number of retries after the first attempt.
+        :param float timeout: maximum timeout of an attempt in seconds.
+        :param float initial_timeout: timeout of attempts to a name server
+            with no measured round trip time yet.
+        :param float min_timeout: minimum timeout of an attempt.
+        :param dnszonetest.pacer.Pacer pacer: paces every attempt.
+        :param dnszonetest.metrics.Metrics metrics: counts every attempt.
+        '''
+        self.retries = retries
+        self.max_timeout = timeout
+        self.initial_timeout = min(initial_timeout, timeout)
+        self.min_timeout = min_timeout
+        self.pacer = pacer
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._rtt = {}
+
+    def timeout(self, nameserver_ip, attempt=0):
+        '''
+        Returns the timeout for an attempt of a query to nameserver_ip.
+
+        :param str nameserver_ip: IP number of the name server.
+        :param int attempt: 0 for the first attempt, 1 for the first retry,
+            and so on.
+        '''
+        with self._lock:
+            rtt = self._rtt.get(nameserver_ip)
+        if rtt is None:
+            timeout = self.initial_timeout
+        else:
+            srtt, rttvar = rtt
+            timeout = max(srtt + 4 * rttvar, self.min_timeout)
+        return min(timeout * 2 ** attempt, self.max_timeout)
+
+    def update(self, nameserver_ip, rtt):
+        '''
+        Adds a round trip time sample for nameserver_ip.
+        '''
+        with self._lock:
+            if nameserver_ip not in self._rtt:
+                self._rtt[nameserver_ip] = (rtt, rtt / 2)
+            else:
+                srtt, rttvar = self._rtt[nameserver_ip]
+                rttvar = 0.75 * rttvar + 0.25 * abs(srtt - rtt)
+                srtt = 0.875 * srtt + 0.125 * rtt
+                self._rtt[nameserver_ip] = (srtt, rttvar)
+
+    def query(self, q, nameserver_ip, dns_query, tcp_query=None):
+        '''
+        Sends q with dns_query, retrying on timeouts.
+
+        :param q: query message, or query in wire format.
+        :type q: dns.message.Message or bytes
+        :param str nameserver_ip: IP number of the name server.
+        :param callable dns_query: :func:`dnszonetest.transport.udp`,
+            :func:`dns.query.udp` or a function with the same signature.
+        :param callable tcp_query: function to retry truncated responses
+            with (default: :func:`dnszonetest.transport.tcp`).
+
+        :raises dns.exception.Timeout: when all attempts timed out or
+            failed, or their truncated responses could not be retried over
+            TCP.
+
+        :returns: response message, in wire format if dns_query returns
+            that.
+        '''
+        if tcp_query is None:
+            tcp_query = dnszonetest.transport.tcp
+        metrics = self.metrics
+        size = len(to_wire(q)) if metrics is not None else 0
+        for attempt in range(self.retries + 1):
+            timeout = self.timeout(nameserver_ip, attempt)
+            if self.pacer is not None:
+                self.pacer.acquire(nameserver_ip)
+            if metrics is not None:
+                metrics.sent(nameserver_ip, size, attempt > 0)
+            start = time.time()
+            try:
+                response = dns_query(q, nameserver_ip, timeout=timeout)
+            except dns.exception.Timeout:
+                if metrics is not None:
+                    metrics.count(nameserver_ip, 'timeouts')
+                logger.debug(
+                    '%-21s: %s after %.3fs (attempt %d)',
+                    'Timeout',
+                    query_name(q),
+                    timeout,
+                    attempt + 1,
+                )
+                continue
+            except _FAILURES as err:
+                logger.debug(
+                    '%-21s: %s: %r (attempt %d)',
+                    'Failed',
+                    query_name(q),
+                    err,
+                    attempt + 1,
+                )
+                continue
+            rtt = time.time() - start
+            self.update(nameserver_ip, rtt)
+            if metrics is not None:
+                metrics.received(nameserver_ip, response_size(response), rtt)
+            if truncated(response) and dns_query is not tcp_query:
+                logger.debug(
+                    '%-21s: %s retry over TCP',
+                    'Truncated',
+                    query_name(q),
+                )
+                if self.pacer is not None:
+                    self.pacer.acquire(nameserver_ip)
+                if metrics is not None:
+                    metrics.count(nameserver_ip, 'truncated')
+                    metrics.sent(nameserver_ip, size)
+                start = time.time()
+                try:
+                    response = tcp_query(
+                        q,
+                        nameserver_ip,
+                        timeout=self.max_timeout,
+                    )
+                except (dns.exception.Timeout,) + _FAILURES as err:
+                    # A failed attempt: retry over UDP after the backoff.
+                    logger.debug(
+                        '%-21s: %s over TCP: %r (attempt %d)',
+                        'Failed',
+                        query_name(q),
+                        err,
+                        attempt + 1,
+                    )
+                    continue
+                if metrics is not None:
+                    metrics.received(nameserver_ip, response_size(response),
+                                     time.time() - start)
+            return response
+        raise dns.exception.Timeout(timeout=timeout)
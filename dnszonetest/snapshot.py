@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.snapshot
+--------------------
+
+Binary snapshots of parsed zone files.
+
+Parsing a large zone file is slow, and is repeated on every run. A snapshot
+keeps the rdatasets of the parsed zone in wire format, in a file that is
+memory-mapped and read while iterating instead of parsed. It is keyed by the
+zone file's path, size, modification time and SHA-256 digest, and by the
+origin. A snapshot is fresh when the size and modification time match, as
+for make; a zone file of the same size with another modification time is
+hashed, and matches when its digest does. A stale snapshot is replaced
+after the zone file is parsed again.
+
+Snapshot file layout, all integers in network byte order::
+
+    magic         8 bytes, MAGIC
+    header        mtime (double), size, rdataset count (unsigned 64 bit),
+                  SHA-256 digest (32 bytes), origin length (unsigned 16 bit)
+    origin        in wire format
+    rdatasets     rdclass, rdtype, covers (unsigned 16 bit), TTL, rdata
+                  length (unsigned 32 bit), name length (unsigned 16 bit),
+                  the owner name in wire format, and the rdata as
+                  :func:`dnszonetest.compact.rdata_wire` returns them
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import io
+import logging
+import mmap
+import os
+import struct
+import tempfile
+
+import dns.exception
+import dns.name
+import dns.rdatatype
+
+from dnszonetest.compact import rdata_wire, rdataset_from_wire
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'DZTSNAP1'
+
+_HEADER = struct.Struct(str('!dQQ32sH'))
+_RDATASET = struct.Struct(str('!HHHIIH'))
+
+
+def file_key(path):
+    '''
+    Returns (mtime, size, digest) of file path, digest being its SHA-256
+    digest.
+
+    :raises IOError: when the file can not be read.
+    '''
+    stat = os.stat(path)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(chunk)
+    return stat.st_mtime, stat.st_size, digest.digest()
+
+
+def _name(wire):
+    '''
+    Returns the name in uncompressed wire format wire, without the parsing
+    of :func:`dns.name.from_wire` that handles compression.
+    '''
+    lengths = bytearray(wire)
+    labels = []
+    offset = 0
+    while True:
+        length = lengths[offset]
+        labels.append(wire[offset + 1:offset + 1 + length])
+        offset += length + 1
+        if not length:
+            return dns.name.Name(labels)
+
+
+def snapshot_path(directory, zonefile, origin):
+    '''
+    Returns the name of the snapshot of zonefile with origin in directory.
+    '''
+    key = '{0}\0{1}'.format(os.path.abspath(zonefile), origin)
+    return os.path.join(
+        directory,
+        '{0}.snapshot'.format(
+            hashlib.sha1(key.encode('utf-8')).hexdigest()),
+    )
+
+
+class SnapshotZone(object):
+    '''
+    Read-only sequence of the rdatasets of a zone, read from a
+    memory-mapped snapshot file.
+    '''
+    def __init__(self, path):
+        '''
+        :param str path: snapshot file name.
+
+        :raises ValueError: when the file is not a snapshot.
+        '''
+        self.path = path
+        with open(path, 'rb') as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if self._map[:len(MAGIC)] != MAGIC:
+                raise ValueError('not a snapshot')
+            offset = len(MAGIC)
+            mtime, size, self._count, digest, length = \
+                _HEADER.unpack_from(self._map, offset)
+            offset += _HEADER.size
+            self.key = (mtime, size, digest)
+            self.origin = _name(self._map[offset:offset + length])
+            self._start = offset + length
+        except (struct.error, IndexError, dns.exception.DNSException):
+            self._map.close()
+            raise ValueError('truncated snapshot')
+
+    def __len__(self):
+        return self._count
+
+    def iterate_rdatasets(self, rdtype=dns.rdatatype.ANY):
+        '''
+        Yields (name, rdataset) for every rdataset, or every rdataset of
+        type rdtype, as :meth:`dns.zone.Zone.iterate_rdatasets` does. The
+        owner names of consecutive rdatasets of a name are the same object.
+        '''
+        snapshot = self._map
+        offset = self._start
+        name_wire = name = None
+        for _ in range(self._count):
+            rdclass, rdtype_, covers, ttl, rdlen, length = \
+                _RDATASET.unpack_from(snapshot, offset)
+            offset += _RDATASET.size
+            start = offset + length
+            offset = start + rdlen
+            if rdtype not in (dns.rdatatype.ANY, rdtype_):
+                continue
+            wire = snapshot[start - length:start]
+            if wire != name_wire:
+                name_wire = wire
+                name = _name(wire)
+            yield name, rdataset_from_wire(rdclass, rdtype_, covers, ttl,
+                                           snapshot[start:offset])
+
+    def close(self):
+        self._map.close()
+
+
+def write_snapshot(path, zone, key):
+    '''
+    Writes the rdatasets of zone to snapshot file path. The file is
+    replaced at once, so readers see the old or the new snapshot.
+
+    :param str path: snapshot file name.
+    :param zone: a :class:`dns.zone.Zone` or
+        :class:`dnszonetest.compact.CompactZone`.
+    :param tuple key: :func:`file_key` of the zone file.
+    '''
+    directory = os.path.dirname(path) or '.'
+    fd, tmp = tempfile.mkstemp(prefix='.dnszonetest-', dir=directory)
+    try:
+        with io.open(fd, 'wb') as fh:
+            origin = zone.origin.to_wire()
+            fh.write(MAGIC)
+            fh.write(_HEADER.pack(key[0], key[1], 0, key[2], len(origin)))
+            fh.write(origin)
+            count = 0
+            for name, rdataset in zone.iterate_rdatasets():
+                name_wire = name.to_wire()
+                wire = rdata_wire(rdataset)
+                fh.write(_RDATASET.pack(
+                    rdataset.rdclass,
+                    rdataset.rdtype,
+                    rdataset.covers,
+                    rdataset.ttl,
+                    len(wire),
+                    len(name_wire),
+                ))
+                fh.write(name_wire)
+                fh.write(wire)
+                count += 1
+            fh.seek(len(MAGIC))
+            fh.write(_HEADER.pack(key[0], key[1], count, key[2],
+                                  len(origin)))
+        # os.replace overwrites an existing snapshot on Windows too.
+        getattr(os, 'replace', os.rename)(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def load_snapshot(directory, zonefile, origin):
+    '''
+    Returns the :class:`SnapshotZone` of zonefile with origin from
+    directory, or None when there is none, or it is stale or unreadable.
+    '''
+    path = snapshot_path(directory, zonefile, origin)
+    try:
+        zone = SnapshotZone(path)
+    except (IOError, OSError, ValueError) as err:
+        logger.debug('%-21s: %s %s', 'No snapshot', path, err)
+        return None
+    try:
+        stat = os.stat(zonefile)
+        # Only a zone file that was touched, or rewritten with the same
+        # size, is hashed.
+        fresh = zone.key[:2] == (stat.st_mtime, stat.st_size) or \
+            zone.key[1] == stat.st_size and \
+            zone.key[2] == file_key(zonefile)[2]
+    except (IOError, OSError):
+        fresh = False
+    if not fresh:
+        logger.debug('%-21s: %s', 'Stale snapshot', path)
+        zone.close()
+        return None
+    logger.debug('%-21s: %s', 'Snapshot', path)
+    return zone
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.state
+-----------------
+
+State file with digests of the rdatasets that matched in previous runs, so
+a run only needs to query rdatasets that changed in the zone file.
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import io
+import json
+import logging
+import os
+
+import dns.name
+
+logger = logging.getLogger(__name__)
+
+# os.replace is Python 3 only; os.rename replaces files on POSIX.
+_replace = getattr(os, 'replace', os.rename)
+
+
+def rdataset_digest(name, rdataset):
+    '''
+    Returns a digest of name, type, TTL and rdata of rdataset.
+    '''
+    text = '\n'.join(sorted(rdataset.to_text(name).split('\n')))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:20]
+
+
+class State(object):
+    '''
+    Rdataset digests per zone and name server IP number.
+
+    Digests of the previous run are read from the state file. Only the
+    digests passed to :meth:`keep` during this run are written back by
+    :meth:`save`, so rdatasets that did not match, or that were removed from
+    the zone file, are queried again on the next run.
+    '''
+    def __init__(self, path):
+        '''
+        :param str path: state file name. It need not exist yet.
+        '''
+        self.path = path
+        self.previous = {}
+        self.current = {}
+        self.checked = set()
+        self._sections = {}
+        try:
+            with io.open(path, 'r', encoding='utf-8') as fh:
+                self.previous = json.load(fh)
+        except IOError:
+            logger.debug('No state file %s', path)
+        except ValueError as err:
+            logger.warning('Ignoring invalid state file %s: %s', path, err)
+
+    def section(self, zonename, nameserver_ip):
+        try:
+            return self._sections[(zonename, nameserver_ip)]
+        except KeyError:
+            section = self._sections[(zonename, nameserver_ip)] = \
+                '{0} {1}'.format(
+                    dns.name.from_text(zonename).to_text().lower(),
+                    nameserver_ip,
+                )
+            return section
+
+    def unchanged(self, zonename, nameserver_ip, key, digest):
+        '''
+        Returns True when digest is the digest of key in the previous run.
+        '''
+        section = self.section(zonename, nameserver_ip)
+        self.checked.add(section)
+        return self.previous.get(section, {}).get(key) == digest
+
+    def keep(self, zonename, nameserver_ip, key, digest):
+        '''
+        Stores the digest of key for the next run.
+        '''
+        self.current.setdefault(
+            self.section(zonename, nameserver_ip), {})[key] = digest
+
+    def merge(self, other):
+        '''
+        Adds the digests kept by other, the State of a worker process.
+        '''
+        self.checked.update(other.checked)
+        for section, digests in other.current.items():
+            self.current.setdefault(section, {}).update(digests)
+
+    def save(self):
+        '''
+        Writes the digests kept in this run to the state file, replacing
+        those of the zones and name servers checked.
+        '''
+        state = dict(self.previous)
+        for section in self.checked:
+            state[section] = self.current.get(section, {})
+        tmp = '{0}.tmp'.format(self.path)
+        with io.open(tmp, 'w', encoding='utf-8') as fh:
+            # json.dumps returns bytes on Python 2.
+            fh.write('{0}'.format(json.dumps(state, sort_keys=True)))
+        _replace(tmp, self.path)
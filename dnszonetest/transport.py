@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.transport
+---------------------
+
+DNS transports that return responses in wire format, and persistent DNS
+transports shared by all queries of a run.
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import itertools
+import logging
+import random
+import socket
+import struct
+import threading
+import time
+
+import dns.exception
+import dns.inet
+import dns.message
+import dns.query
+
+from dnszonetest.wire import is_response, to_wire
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionClosed(EOFError):
+    '''
+    Raised when a TCP connection closed before the response arrived.
+    '''
+
+
+def _recv(sock, count):
+    data = b''
+    while len(data) < count:
+        chunk = sock.recv(count - len(data))
+        if not chunk:
+            raise ConnectionClosed('connection closed by name server')
+        data += chunk
+    return data
+
+
+def udp(q, where, timeout=10, port=53):
+    '''
+    Sends query q over UDP, as :func:`dns.query.udp` does, but returns the
+    response in wire format without parsing it.
+
+    :param q: query message, or query in wire format.
+    :type q: dns.message.Message or bytes
+    :param str where: IP number of the name server.
+    :param float timeout: seconds to wait for the response.
+    :param int port: port of the name server.
+
+    :raises dns.exception.Timeout: when no response arrived in time, or
+        the name server could not be reached.
+
+    :returns: response message in wire format.
+    :rtype: bytes
+    '''
+    wire = to_wire(q)
+    af = dns.inet.af_for_address(where)
+    destination = dns.inet.inet_pton(af, where)
+    sock = socket.socket(af, socket.SOCK_DGRAM)
+    deadline = time.time() + timeout
+    try:
+        # Unconnected, so an ICMP port unreachable is not raised as
+        # ConnectionRefusedError, but waited out as dns.query.udp does.
+        sock.sendto(wire, (where, port))
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise dns.exception.Timeout(timeout=timeout)
+            sock.settimeout(remaining)
+            data, source = sock.recvfrom(65535)
+            if dns.inet.inet_pton(af, source[0]) != destination or \
+                    source[1] != port:
+                continue
+            if is_response(wire, data):
+                return data
+            # Not an answer to our question; keep waiting.
+    except socket.error:
+        # socket.timeout, or an unreachable name server.
+        raise dns.exception.Timeout(timeout=timeout)
+    finally:
+        sock.close()
+
+
+def tcp(q, where, timeout=10, port=53):
+    '''
+    Sends query q over a new TCP connection, as :func:`dns.query.tcp` does,
+    but returns the response in wire format without parsing it. Takes the
+    arguments of :func:`udp`.
+
+    :raises dns.exception.Timeout: when no response arrived in time.
+    :raises ConnectionClosed: when the server closed the connection.
+    :raises dns.query.BadResponse: when the response does not answer q.
+    '''
+    wire = to_wire(q)
+    try:
+        sock = socket.create_connection((where, port), timeout)
+    except socket.timeout:
+        raise dns.exception.Timeout(timeout=timeout)
+    try:
+        sock.sendall(struct.pack('!H', len(wire)) + wire)
+        data = _recv(sock, struct.unpack('!H', _recv(sock, 2))[0])
+    except socket.timeout:
+        raise dns.exception.Timeout(timeout=timeout)
+    finally:
+        sock.close()
+    if not is_response(wire, data):
+        raise dns.query.BadResponse
+    return data
+
+
+class _Pending(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class _Connection(object):
+    '''
+    One TCP connection with any number of outstanding queries.
+    '''
+    def __init__(self, nameserver_ip, port, timeout):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.closed = False
+        self.sock = socket.socket(
+            dns.inet.af_for_address(nameserver_ip),
+            socket.SOCK_STREAM,
+        )
+        try:
+            self.sock.settimeout(timeout)
+            self.sock.connect((nameserver_ip, port))
+            self.sock.settimeout(None)
+        except socket.error:
+            self.sock.close()
+            raise
+        reader = threading.Thread(target=self._read)
+        reader.daemon = True
+        reader.start()
+
+    def _recv(self, count):
+        return _recv(self.sock, count)
+
+    def _read(self):
+        try:
+            while True:
+                (length,) = struct.unpack('!H', self._recv(2))
+                data = self._recv(length)
+                with self.lock:
+                    pending = self.pending.pop(
+                        struct.unpack('!H', data[:2])[0], None)
+                if pending is not None:
+                    pending.response = data
+                    pending.event.set()
+        except (socket.error, EOFError, struct.error) as err:
+            self.close(err)
+
+    def close(self, err=None):
+        with self.lock:
+            self.closed = True
+            pending, self.pending = self.pending, {}
+        for item in pending.values():
+            item.error = ConnectionClosed(str(err))
+            item.event.set()
+        try:
+            self.sock.close()
+        except socket.error:
+            pass
+
+    def exchange(self, wire, timeout):
+        '''
+        Sends query wire (the first two bytes, the message ID, are replaced)
+        and returns the response wire.
+        '''
+        pending = _Pending()
+        with self.lock:
+            if self.closed:
+                raise ConnectionClosed('connection closed')
+            qid = random.randint(0, 0xffff)
+            while qid in self.pending:
+                qid = random.randint(0, 0xffff)
+            self.pending[qid] = pending
+            wire = struct.pack('!HH', len(wire), qid) + wire[2:]
+            try:
+                self.sock.sendall(wire)
+                err = None
+            except socket.error as exc:
+                err = exc
+        if err is not None:
+            self.close(err)
+            raise ConnectionClosed(str(err))
+        if not pending.event.wait(timeout):
+            with self.lock:
+                self.pending.pop(qid, None)
+            raise dns.exception.Timeout(timeout=timeout)
+        if pending.error is not None:
+            raise pending.error
+        return pending.response
+
+
+class TCPPipeline(object):
+    '''
+    Pipelines queries over a few persistent TCP connections to one name
+    server (RFC 7766). Responses may arrive out of order and are matched to
+    their queries by message ID. Connections closed by the server are
+    reopened on the next query.
+    '''
+    def __init__(self, nameserver_ip, port=53, connections=1, timeout=10):
+        '''
+        :param str nameserver_ip: IP number of the name server.
+        :param int port: port of the name server.
+        :param int connections: number of connections to use.
+        :param float timeout: connect timeout in seconds.
+        '''
+        self.nameserver_ip = nameserver_ip
+        self.port = port
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._connections = [None] * connections
+        self._next = itertools.cycle(range(connections))
+
+    def _connection(self):
+        with self._lock:
+            index = next(self._next)
+            connection = self._connections[index]
+            if connection is None or connection.closed:
+                logger.debug('Open TCP connection to %s', self.nameserver_ip)
+                connection = _Connection(self.nameserver_ip, self.port,
+                                         self.timeout)
+                self._connections[index] = connection
+        return connection
+
+    def exchange(self, wire, timeout=10):
+        '''
+        Sends query wire and returns the response wire. A query that was
+        lost because the server closed the connection is sent once more on
+        a new connection.
+
+        :param bytes wire: query message in wire format.
+        :param float timeout: seconds to wait for the response.
+
+        :raises dns.exception.Timeout: when no response arrived in time, the
+            connection could not be opened, or it closed again.
+        '''
+        try:
+            try:
+                return self._connection().exchange(wire, timeout)
+            except ConnectionClosed:
+                return self._connection().exchange(wire, timeout)
+        except (socket.error, ConnectionClosed) as err:
+            logger.debug('TCP connection to %s failed: %s',
+                         self.nameserver_ip, err)
+            raise dns.exception.Timeout(timeout=timeout)
+
+    def query_wire(self, q, where=None, timeout=10):
+        '''
+        As :meth:`query`, but returns the response in wire format without
+        parsing it.
+
+        :rtype: bytes
+        '''
+        wire = to_wire(q)
+        data = self.exchange(wire, timeout)
+        if not isinstance(q, bytes):
+            q.id = struct.unpack('!H', data[:2])[0]
+        if not is_response(data[:2] + wire[2:], data):
+            raise dns.query.BadResponse
+        return data
+
+    def query(self, q, where=None, timeout=10):
+        '''
+        Drop-in replacement for :func:`dns.query.tcp`; `where` is ignored.
+
+        :param dns.message.Message q: query message.
+        :param float timeout: seconds to wait for the response.
+
+        :returns: response message.
+        :rtype: dns.message.Message
+        '''
+        data = self.exchange(q.to_wire(), timeout)
+        q.id = struct.unpack('!H', data[:2])[0]
+        response = dns.message.from_wire(data)
+        if not q.is_response(response):
+            raise dns.query.BadResponse
+        return response
+
+    def close(self):
+        with self._lock:
+            for connection in self._connections:
+                if connection is not None:
+                    connection.close()
+            self._connections = [None] * len(self._connections)
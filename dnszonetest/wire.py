@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.wire
+----------------
+
+Builds DNS queries and reads DNS responses in wire format, without
+message objects.
+
+Most records match the zone file, so the answer is compared to the zone
+file rdata in wire format first, and the response is only parsed when they
+differ. This works for types whose rdata holds no domain names: names in
+rdata may be compressed, and compare case-insensitively.
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import struct
+
+import dns.entropy
+import dns.flags
+import dns.name
+import dns.rdataclass
+import dns.rdatatype
+
+# Types without domain names in their rdata.
+NAME_FREE_TYPES = frozenset(
+    getattr(dns.rdatatype, rdtype)
+    for rdtype in (
+        'A', 'AAAA', 'CAA', 'CDNSKEY', 'CDS', 'DNSKEY', 'DS', 'HINFO',
+        'NSEC3PARAM', 'SPF', 'SSHFP', 'TLSA', 'TXT',
+    )
+    if hasattr(dns.rdatatype, rdtype)
+)
+
+_HEADER = struct.Struct(str('!HHHHHH'))
+_RR = struct.Struct(str('!HHIH'))
+_QUESTION = struct.Struct(str('!HH'))
+_ID = struct.Struct(str('!H'))
+
+
+def _byte(wire, offset):
+    return bytearray(wire[offset:offset + 1])[0]
+
+
+def read_name(wire, offset):
+    '''
+    Returns (labels, offset) for the domain name at offset in wire, with the
+    labels in lower case and offset just past the name.
+
+    :raises ValueError: on a malformed name.
+    '''
+    labels = []
+    end = None
+    hops = 0
+    while True:
+        length = _byte(wire, offset)
+        if length & 0xc0 == 0xc0:
+            if end is None:
+                end = offset + 2
+            hops += 1
+            if hops > 127:
+                raise ValueError('compression loop')
+            offset = struct.unpack('!H', wire[offset:offset + 2])[0] & 0x3fff
+            continue
+        if length & 0xc0:
+            raise ValueError('unknown label type')
+        offset += 1
+        if length == 0:
+            break
+        labels.append(wire[offset:offset + length].lower())
+        offset += length
+    return tuple(labels), end if end is not None else offset
+
+
+class QueryTemplate(object):
+    '''
+    Builds queries in wire format from a fixed header and EDNS OPT record;
+    only the ID and question differ between queries. The queries are those
+    of ``dns.message.make_query(name, rdtype, use_edns=True,
+    payload=payload)``.
+    '''
+    def __init__(self, recursion_desired=True, payload=2048):
+        '''
+        :param bool recursion_desired: set the RD flag.
+        :param int payload: EDNS UDP payload size.
+        '''
+        flags = dns.flags.RD if recursion_desired else 0
+        self.header = _HEADER.pack(0, flags, 1, 0, 0, 1)[2:]
+        self.opt = b'\0' + _RR.pack(dns.rdatatype.OPT, payload, 0, 0)
+
+    def make(self, name, rdtype, rdclass=dns.rdataclass.IN):
+        '''
+        Returns a query for name and rdtype in wire format, with a random
+        ID.
+
+        :param name: query name.
+        :type name: dns.name.Name or str
+        :param int rdtype: query type.
+        '''
+        if not isinstance(name, dns.name.Name):
+            name = dns.name.from_text(name)
+        return b''.join((
+            _ID.pack(dns.entropy.random_16()),
+            self.header,
+            name.to_wire(),
+            _QUESTION.pack(rdtype, rdclass),
+            self.opt,
+        ))
+
+
+def query_name(q):
+    '''
+    Returns the question name of query q, a message or its wire format.
+    '''
+    if isinstance(q, bytes):
+        return dns.name.from_wire(q, _HEADER.size)[0]
+    return q.question[0].name
+
+
+def to_wire(q):
+    '''
+    Returns query q, a message or its wire format, in wire format.
+    '''
+    if isinstance(q, bytes):
+        return q
+    return q.to_wire()
+
+
+def is_response(query, response):
+    '''
+    Returns True when response (wire) answers query (wire): same ID, the
+    QR flag set and the same question.
+    '''
+    if len(response) < 12 or response[:2] != query[:2] or \
+            not _byte(response, 2) & (dns.flags.QR >> 8):
+        return False
+    try:
+        name, end = read_name(query, 12)
+        response_name, response_end = read_name(response, 12)
+    except (IndexError, ValueError, struct.error):
+        return False
+    return name == response_name and \
+        query[end:end + 4] == response[response_end:response_end + 4]
+
+
+def response_size(response):
+    '''
+    Returns the size in bytes of response in wire format; 0 for a message,
+    which does not keep its size.
+    '''
+    if isinstance(response, bytes):
+        return len(response)
+    return 0
+
+
+def truncated(response):
+    '''
+    Returns True when the TC flag of response, a message or its wire
+    format, is set.
+    '''
+    if isinstance(response, bytes):
+        return bool(_byte(response, 2) & (dns.flags.TC >> 8))
+    return bool(response.flags & dns.flags.TC)
+
+
+def rdataset_wire(rdataset):
+    '''
+    Returns the rdata of rdataset in wire format as a frozenset, or None
+    when its type is not in NAME_FREE_TYPES.
+    '''
+    if rdataset.rdtype not in NAME_FREE_TYPES:
+        return None
+    rdatas = []
+    for rdata in rdataset:
+        fh = io.BytesIO()
+        rdata.to_wire(fh, None, None)
+        rdatas.append(fh.getvalue())
+    return frozenset(rdatas)
+
+
+def read_header(wire):
+    '''
+    Returns (flags, ancount) of response wire. The rcode is in the low four
+    bits of flags.
+    '''
+    flags, _, ancount = _HEADER.unpack_from(wire, 0)[1:4]
+    return flags, ancount
+
+
+def read_question(wire):
+    '''
+    Returns (flags, labels, rdtype, rdclass) of the question of query wire,
+    with the labels in lower case.
+
+    :raises ValueError: on a malformed name.
+    '''
+    flags = _HEADER.unpack_from(wire, 0)[1]
+    labels, offset = read_name(wire, _HEADER.size)
+    rdtype, rdclass = _QUESTION.unpack_from(wire, offset)
+    return flags, labels, rdtype, rdclass
+
+
+def min_ttl(wire):
+    '''
+    Returns the lowest TTL of the records of response wire, leaving out the
+    EDNS OPT record, or None when it has no records or is malformed.
+    '''
+    try:
+        counts = _HEADER.unpack_from(wire, 0)[2:]
+        offset = _HEADER.size
+        for _ in range(counts[0]):
+            offset = read_name(wire, offset)[1] + 4
+        ttl = None
+        for _ in range(sum(counts[1:])):
+            offset = read_name(wire, offset)[1]
+            rdtype, _, rr_ttl, rdlen = _RR.unpack_from(wire, offset)
+            offset += _RR.size + rdlen
+            if rdtype != dns.rdatatype.OPT:
+                ttl = rr_ttl if ttl is None else min(ttl, rr_ttl)
+        if offset > len(wire):
+            return None
+    except (IndexError, ValueError, struct.error):
+        return None
+    return ttl
+
+
+def read_answer(wire):
+    '''
+    Returns (owner, rdclass, rdtype, ttl, rdatas) of the first RRset of the
+    answer section of response wire, owner as labels in lower case like
+    :func:`read_name` and rdatas as :func:`rdataset_wire` returns them.
+    Returns None when the answer section is empty, the RRset type is not in
+    NAME_FREE_TYPES, or the response is malformed.
+    '''
+    try:
+        qdcount, ancount = _HEADER.unpack_from(wire, 0)[2:4]
+        offset = _HEADER.size
+        for _ in range(qdcount):
+            offset = read_name(wire, offset)[1] + 4
+        owner = None
+        ttl = None
+        rdatas = set()
+        for _ in range(ancount):
+            name, offset = read_name(wire, offset)
+            rdtype, rdclass, rr_ttl, rdlen = _RR.unpack_from(wire, offset)
+            offset += _RR.size
+            if owner is None:
+                if rdtype not in NAME_FREE_TYPES:
+                    return None
+                owner, first = name, (rdclass, rdtype)
+            if (name, rdclass, rdtype) == (owner,) + first:
+                rdatas.add(wire[offset:offset + rdlen])
+                ttl = rr_ttl if ttl is None else min(ttl, rr_ttl)
+            offset += rdlen
+        if owner is None or offset > len(wire):
+            return None
+    except (IndexError, ValueError, struct.error):
+        return None
+    return (owner,) + first + (ttl, frozenset(rdatas))
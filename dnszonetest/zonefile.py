@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: ai et ts=4 sw=4 sts=4 fenc=UTF-8 ft=python
+
+'''
+dnszonetest.zonefile
+--------------------
+
+Streaming zone file reader.
+
+The zone file is split at owner name boundaries into chunks of a bounded
+number of records, which are parsed one at a time by dnspython. Memory use
+is bounded by the chunk size instead of the zone size, and the first
+rdatasets are available as soon as the first chunk is parsed.
+
+Rdatasets are merged across adjacent chunks, but not across the whole
+file: all records of an owner name must be close together, as written by
+``named-compilezone`` and most zone file generators. Records of the same
+owner name and type further apart are separate rdatasets.
+
+Records without a TTL get the TTL dnspython gives them in the whole file:
+that of $TTL, or else the last TTL given before them, carried over from
+chunk to chunk.
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import io
+
+import dns.name
+import dns.rdataclass
+import dns.rdatatype
+import dns.ttl
+import dns.zone
+
+from dnszonetest.exceptions import NoZoneFileException
+
+
+class _State(object):
+    def __init__(self, origin, ttl=None):
+        self.origin = origin
+        self.ttl = ttl
+        # Last TTL given by a record, or the SOA minimum before any.
+        self.last_ttl = None
+
+
+def _record_ttl(line):
+    '''
+    Returns the TTL given by the record starting at line, or None. The TTL
+    is one of the two fields after the owner name, the other being the
+    class.
+    '''
+    fields = line.split(';', 1)[0].split()
+    if line[:1] not in (' ', '\t'):
+        fields = fields[1:]
+    for field in fields[:2]:
+        try:
+            return dns.ttl.from_text(field)
+        except dns.ttl.BadTTL:
+            pass
+        try:
+            dns.rdataclass.from_text(field)
+        except Exception:
+            return None
+    return None
+
+
+def _paren_depth(line, depth):
+    '''
+    Returns the parenthesis depth after line, skipping quoted strings,
+    escaped characters and comments.
+    '''
+    quoted = False
+    escaped = False
+    for char in line:
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif quoted:
+            if char == '"':
+                quoted = False
+        elif char == '"':
+            quoted = True
+        elif char == ';':
+            break
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+    return depth
+
+
+def _chunks(zonefile, state, chunk_size):
+    '''
+    Yields (origin, ttl, last_ttl, text) for chunks of at most chunk_size
+    owner lines of zonefile, with the state before the chunk. $INCLUDE files
+    are read in place.
+    '''
+    try:
+        fh = io.open(zonefile, 'r', encoding='utf-8')
+    except IOError as err:
+        raise NoZoneFileException(
+            'Unable to read zone file: {0}'.format(err)
+        )
+    with fh:
+        lines = []
+        owners = 0
+        start = (state.origin, state.ttl, state.last_ttl)
+        depth = 0
+        for line in fh:
+            if depth == 0 and line.startswith('$'):
+                fields = line.split(';', 1)[0].split()
+                directive = fields[0].upper()
+                if directive == '$ORIGIN' and len(fields) > 1:
+                    state.origin = dns.name.from_text(
+                        fields[1], state.origin)
+                elif directive == '$TTL' and len(fields) > 1:
+                    state.ttl = dns.ttl.from_text(fields[1])
+                elif directive == '$INCLUDE' and len(fields) > 1:
+                    if lines:
+                        yield start + (''.join(lines),)
+                        lines, owners = [], 0
+                    origin = state.origin
+                    if len(fields) > 2:
+                        state.origin = dns.name.from_text(
+                            fields[2], state.origin)
+                    for chunk in _chunks(fields[1], state, chunk_size):
+                        yield chunk
+                    state.origin = origin
+                    start = (state.origin, state.ttl, state.last_ttl)
+                    continue
+            elif depth == 0:
+                if line[:1] not in ('', ' ', '\t', ';', '\n', '\r'):
+                    if owners >= chunk_size:
+                        yield start + (''.join(lines),)
+                        lines, owners = [], 0
+                        start = (state.origin, state.ttl, state.last_ttl)
+                    owners += 1
+                ttl = _record_ttl(line)
+                if ttl is not None:
+                    state.last_ttl = ttl
+            depth = _paren_depth(line, depth)
+            lines.append(line)
+        if lines:
+            yield start + (''.join(lines),)
+
+
+def _parse(origin, ttl, last_ttl, text, zonename, zonefile):
+    prefix = '$ORIGIN {0}\n'.format(origin.to_text())
+    placeholder = None
+    if ttl is not None:
+        prefix += '$TTL {0}\n'.format(ttl)
+    elif last_ttl is not None:
+        # Without $TTL, records without TTL get the last TTL given, which
+        # only a record can set: a placeholder, removed after parsing.
+        placeholder = dns.name.Name((b'\0dnszonetest-ttl',) +
+                                    zonename.labels)
+        prefix += '{0} {1} IN TXT ""\n'.format(
+            placeholder.to_text(), last_ttl)
+    zone = dns.zone.from_text(
+        prefix + text,
+        origin=zonename,
+        relativize=False,
+        filename=zonefile,
+        check_origin=False,
+    )
+    if placeholder is not None:
+        zone.delete_node(placeholder)
+    return zone
+
+
+def stream_rdatasets(zonefile, zonename, chunk_size=1000):
+    '''
+    Yields (name, rdataset) for every rdataset in zonefile, reading the file
+    in chunks.
+
+    :param str zonefile: zone file name.
+    :param str zonename: zone name.
+    :param int chunk_size: number of owner lines parsed at once.
+
+    :raises NoZoneFileException: when the zone file can not be read.
+    '''
+    zonename = dns.name.from_text(zonename)
+    state = _State(zonename)
+    # Rdatasets of the previous chunk are held back until the next chunk is
+    # parsed, so owner names that continue in it can be merged.
+    previous = collections.OrderedDict()
+    for origin, ttl, last_ttl, text in _chunks(zonefile, state, chunk_size):
+        zone = _parse(origin, ttl, last_ttl, text, zonename, zonefile)
+        if state.ttl is None and state.last_ttl is None:
+            # Without $TTL, records without TTL before any record with one
+            # get the SOA minimum.
+            soa = zone.get_rdataset(zonename, dns.rdatatype.SOA)
+            if soa is not None:
+                state.last_ttl = soa[0].minimum
+        names = set(name for name, _ in previous.values())
+        current = collections.OrderedDict()
+        for name, rdataset in zone.iterate_rdatasets():
+            key = (name, rdataset.rdclass, rdataset.rdtype, rdataset.covers)
+            rdatasets = previous if name in names else current
+            if key in rdatasets:
+                rdatasets[key][1].union_update(rdataset)
+            else:
+                rdatasets[key] = (name, rdataset)
+        if current:
+            for item in previous.values():
+                yield item
+            previous = current
+    for item in previous.values():
+        yield item
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/conftest.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import io
+import sys
+import pytest
+import dns.zone
+import dnszonetest.transport
+from tests import dnsserver
+
+# dnszonetest.aio needs Python 3.7 or later.
+collect_ignore = ['test_aio.py'] if sys.version_info < (3, 7) else []
+
+
+@pytest.fixture(scope='module')
+def zonefile(tmpdir_factory):
+    zonefile = tmpdir_factory.mktemp('data').join('example.com')
+    with io.open(str(zonefile), 'w', encoding='utf-8') as fh:
+        fh.write('''$ORIGIN example.com.
+$TTL 8h
+example.com.  IN  SOA   ns.example.com. username.example.com. (
+    2001052542
+    1d
+    2h
+    4w
+    1h
+    )
+example.com.  IN  NS    ns
+example.com.  IN  NS    ns.somewhere.example.
+example.com.  IN  MX    10 mail.example.com.
+@             IN  MX    20 mail2.example.com.
+@             IN  MX    50 mail3
+example.com.  IN  A     192.0.2.1
+IN  AAAA  2001:db8:10::1
+ns            IN  A     192.0.2.2
+IN  AAAA  2001:db8:10::2
+www           IN  CNAME example.com.
+wwwtest       IN  CNAME www
+mail          IN  A     192.0.2.3
+mail2         IN  A     192.0.2.4
+mail3         IN  A     192.0.2.5''')
+    return str(zonefile)
+
+
+@pytest.fixture(scope='module')
+def zone(zonefile):
+    return dns.zone.from_file(zonefile, origin='example.com',
+                              relativize=False)
+
+
+@pytest.fixture
+def server(zone, monkeypatch):
+    '''
+    Returns serve(overrides=None, nameservers=None), which makes
+    dnszonetest.transport.udp answer from zone.
+
+    overrides maps (name, rdtype) to the rdatasets answered instead of those
+    of zone; nameservers maps name server IP numbers to their own overrides.
+    '''
+    def serve(overrides=None, nameservers=None):
+        def udp(query_message, nameserver, timeout=0, port=53):
+            return dnsserver.answer(
+                zone,
+                query_message,
+                (nameservers or {}).get(nameserver, overrides),
+            ).to_wire()
+        monkeypatch.setattr(dnszonetest.transport, 'udp', udp)
+    return serve
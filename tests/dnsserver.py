@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/dnsserver.py
+
+'''
+Stand-in authoritative name server for tests.
+'''
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import socket
+import struct
+import threading
+import dns.flags
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+
+try:
+    import socketserver
+except ImportError:  # Python 2
+    import SocketServer as socketserver
+
+
+def closed_port(kind=socket.SOCK_DGRAM):
+    '''
+    Returns a port on 127.0.0.1 that nothing listens on.
+    '''
+    sock = socket.socket(socket.AF_INET, kind)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def answer(zone, query_message, overrides=None):
+    '''
+    Returns the response to query_message (a message or its wire format)
+    from zone, with the rdatasets in overrides ({(name, rdtype): rdataset})
+    served instead.
+    '''
+    if isinstance(query_message, bytes):
+        query_message = dns.message.from_wire(query_message)
+    overrides = overrides or {}
+    question = query_message.question[0]
+    response = dns.message.make_response(query_message)
+    response.flags |= dns.flags.AA
+    if question.rdtype == dns.rdatatype.AXFR:
+        rdatasets = dict(
+            ((name, rdataset.rdtype), rdataset)
+            for name, rdataset in zone.iterate_rdatasets()
+        )
+        rdatasets.update(overrides)
+        soa = rdatasets.pop((zone.origin, dns.rdatatype.SOA))
+        for (name, _), rdataset in [((zone.origin, None), soa)] + \
+                sorted(rdatasets.items()) + [((zone.origin, None), soa)]:
+            rrset = dns.rrset.RRset(name, rdataset.rdclass, rdataset.rdtype)
+            rrset.update(rdataset)
+            response.answer.append(rrset)
+        return response
+    rdataset = overrides.get(
+        (question.name, question.rdtype),
+        zone.get_rdataset(question.name, question.rdtype),
+    )
+    if rdataset is not None:
+        rrset = response.find_rrset(
+            response.answer,
+            question.name,
+            rdataset.rdclass,
+            rdataset.rdtype,
+            create=True,
+        )
+        rrset.update(rdataset)
+    elif zone.get_node(question.name) is None:
+        response.set_rcode(dns.rcode.NXDOMAIN)
+    return response
+
+
+class _UDPHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        data, sock = self.request
+        server = self.server
+        server.queries += 1
+        response = answer(
+            server.zone,
+            dns.message.from_wire(data),
+            server.overrides,
+        )
+        sock.sendto(response.to_wire(), self.client_address)
+
+
+class UDPServer(socketserver.ThreadingUDPServer):
+    '''
+    UDP name server on 127.0.0.1 answering from zone. Use as a context
+    manager; the port is in `self.port`.
+    '''
+    daemon_threads = True
+
+    def __init__(self, zone, overrides=None):
+        socketserver.ThreadingUDPServer.__init__(
+            self, ('127.0.0.1', 0), _UDPHandler)
+        self.zone = zone
+        self.overrides = overrides
+        self.queries = 0
+        self.port = self.server_address[1]
+
+    def __enter__(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+class _TCPHandler(socketserver.BaseRequestHandler):
+    def recv(self, count):
+        data = b''
+        while len(data) < count:
+            chunk = self.request.recv(count - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def respond(self, data, lock):
+        server = self.server
+        response = answer(
+            server.zone,
+            dns.message.from_wire(data),
+            server.overrides,
+        ).to_wire()
+        with lock:
+            self.request.sendall(struct.pack('!H', len(response)) + response)
+
+    def handle(self):
+        lock = threading.Lock()
+        self.server.connections += 1
+        while True:
+            try:
+                (length,) = struct.unpack('!H', self.recv(2))
+                data = self.recv(length)
+            except EOFError:
+                return
+            self.server.queries += 1
+            # Answer every query from its own thread, so responses to
+            # pipelined queries can be sent out of order.
+            thread = threading.Thread(target=self.respond, args=(data, lock))
+            thread.daemon = True
+            thread.start()
+
+
+class TCPServer(socketserver.ThreadingTCPServer):
+    '''
+    TCP name server on 127.0.0.1 answering from zone that accepts
+    pipelined queries. Use as a context manager; the port is in
+    `self.port`.
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, zone, overrides=None):
+        socketserver.ThreadingTCPServer.__init__(
+            self, ('127.0.0.1', 0), _TCPHandler)
+        self.zone = zone
+        self.overrides = overrides
+        self.queries = 0
+        self.connections = 0
+        self.port = self.server_address[1]
+
+    def __enter__(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_aio.py
+
+import asyncio
+import pytest
+import dns.exception
+import dns.message
+import dns.name
+import dns.rdataset
+from dnszonetest.aio import AsyncDnsZoneTest, UDPMultiplexer
+from tests import dnsserver
+
+
+def test_udp_multiplexer(zone):
+    async def run(port):
+        async with UDPMultiplexer('127.0.0.1', port, sockets=2) as mux:
+            queries = [
+                dns.message.make_query(name, 'A')
+                for name in ('mail.example.com', 'mail2.example.com',
+                             'mail3.example.com')
+            ]
+            return await asyncio.gather(*[mux.query(q) for q in queries])
+
+    with dnsserver.UDPServer(zone) as server:
+        responses = asyncio.run(run(server.port))
+    assert [str(r.answer[0][0]) for r in responses] == \
+        ['192.0.2.3', '192.0.2.4', '192.0.2.5']
+
+
+def test_udp_multiplexer_timeout():
+    async def run():
+        async with UDPMultiplexer('127.0.0.1', 9) as mux:
+            await mux.query(dns.message.make_query('example.com', 'A'),
+                            timeout=0.1)
+
+    with pytest.raises(dns.exception.Timeout):
+        asyncio.run(run())
+
+
+@pytest.mark.parametrize('sockets', [1, 3])
+def test_async_dzt_compare(zonefile, zone, sockets):
+    mail = dns.name.from_text('mail.example.com')
+    overrides = {(mail, 1): dns.rdataset.from_text(1, 1, 28800, '192.0.2.9')}
+    with dnsserver.UDPServer(zone, overrides) as server:
+        dzt = AsyncDnsZoneTest('example.com', zonefile, '127.0.0.1',
+                               sockets=sockets, port=server.port)
+        asyncio.run(dzt.compare())
+    assert dzt.mismatch_rdataset == 1
+    assert dzt.errno == 1
+
+
+def test_async_dzt_compare_max_mismatches(zonefile, zone):
+    overrides = dict(
+        ((dns.name.from_text(name), 1),
+         dns.rdataset.from_text(1, 1, 28800, '192.0.2.9'))
+        for name in ('example.com', 'ns.example.com', 'mail.example.com',
+                     'mail2.example.com', 'mail3.example.com')
+    )
+    with dnsserver.UDPServer(zone, overrides) as server:
+        dzt = AsyncDnsZoneTest('example.com', zonefile, '127.0.0.1',
+                               port=server.port, concurrency=1,
+                               max_mismatches=2)
+        asyncio.run(dzt.compare())
+    assert dzt.aborted
+    assert dzt.mismatch_records == 2
+    assert dzt.errno == 1
+
+
+def test_async_dzt_compare_probes(zonefile, zone):
+    with dnsserver.UDPServer(zone) as server:
+        dzt = AsyncDnsZoneTest('example.com', zonefile, '127.0.0.1',
+                               port=server.port, probes=2)
+        asyncio.run(dzt.compare())
+    assert len(dzt.probe_parents) == 2
+    assert dzt.mismatch_nxdomain == 0
+    assert dzt.errno == 0
+
+
+def test_async_dzt_compare_cache(zonefile, zone, tmpdir):
+    cache_file = str(tmpdir.join('cache.db'))
+    with dnsserver.UDPServer(zone) as server:
+        dzt = AsyncDnsZoneTest('example.com', zonefile, '127.0.0.1',
+                               port=server.port, cache_file=cache_file)
+        asyncio.run(dzt.compare())
+        assert dzt.errno == 0
+        queries = server.queries
+        dzt = AsyncDnsZoneTest('example.com', zonefile, '127.0.0.1',
+                               port=server.port, cache_file=cache_file)
+        asyncio.run(dzt.compare())
+        assert dzt.errno == 0
+        assert server.queries == queries
+    counters = dzt.metrics.summary()['nameservers']['127.0.0.1']
+    assert counters['cached'] == dzt.metrics.records
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_batch.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import io
+import shutil
+import pytest
+import dns.name
+import dns.rdataset
+import dnszonetest.transport
+from dnszonetest.batch import BatchZoneTest, read_zones
+from tests import dnsserver
+
+
+@pytest.fixture
+def zonedir(tmpdir, zonefile):
+    shutil.copy(zonefile, str(tmpdir.join('db.example.com')))
+    shutil.copy(zonefile, str(tmpdir.join('example.com.zone')))
+    tmpdir.join('.hidden').write('')
+    return tmpdir
+
+
+def test_read_zones_directory(zonedir):
+    assert [zonename for zonename, _ in read_zones(str(zonedir))] == \
+        ['example.com', 'example.com']
+
+
+def test_read_zones_manifest(zonedir):
+    manifest = zonedir.join('manifest')
+    with io.open(str(manifest), 'w', encoding='utf-8') as fh:
+        fh.write('# zones\nexample.com db.example.com\n\n'
+                 'example.com example.com.zone  # copy\n')
+    assert read_zones(str(manifest)) == [
+        ('example.com', str(zonedir.join('db.example.com'))),
+        ('example.com', str(zonedir.join('example.com.zone'))),
+    ]
+
+
+@pytest.mark.parametrize('concurrency', [1, 4])
+def test_batch_compare(zonedir, zone, monkeypatch, concurrency):
+    mail = dns.name.from_text('mail.example.com')
+    overrides = {(mail, 1): dns.rdataset.from_text(1, 1, 28800, '192.0.2.9')}
+    monkeypatch.setattr(
+        dnszonetest.transport,
+        'udp',
+        lambda q, where, timeout=0, port=53:
+            dnsserver.answer(zone, q, overrides)
+    )
+    zones = read_zones(str(zonedir))
+    zones.append(('example.org', str(zonedir.join('missing'))))
+    batch = BatchZoneTest(zones, nameserver='192.0.2.53',
+                          concurrency=concurrency)
+    batch.compare()
+    assert [dzt.mismatch_rdataset for dzt in batch.tests] == [1, 1, 0]
+    assert [dzt.errno for dzt in batch.tests] == [1, 1, 3]
+    assert batch.errno == 3
+
+
+def test_batch_compare_max_mismatches(zonedir, zone, monkeypatch):
+    mail = dns.name.from_text('mail.example.com')
+    overrides = {(mail, 1): dns.rdataset.from_text(1, 1, 28800, '192.0.2.9')}
+    monkeypatch.setattr(
+        dnszonetest.transport,
+        'udp',
+        lambda q, where, timeout=0, port=53:
+            dnsserver.answer(zone, q, overrides)
+    )
+    batch = BatchZoneTest(read_zones(str(zonedir)), nameserver='192.0.2.53',
+                          max_mismatches=1)
+    batch.compare()
+    assert batch.aborted
+    assert [dzt.mismatch_rdataset for dzt in batch.tests] == [1, 0]
+    assert batch.errno == 1
+
+
+@pytest.mark.parametrize('concurrency', [1, 4])
+def test_batch_compare_broken_zone(zonedir, zone, monkeypatch, concurrency):
+    monkeypatch.setattr(
+        dnszonetest.transport,
+        'udp',
+        lambda q, where, timeout=0, port=53: dnsserver.answer(zone, q)
+    )
+    zonedir.join('broken.zone').write('$ORIGIN example.net.\n@ IN SOA ns\n')
+    manifest = zonedir.join('manifest')
+    manifest.write('example.net broken.zone\nexample.com db.example.com\n')
+    batch = BatchZoneTest(read_zones(str(manifest)), nameserver='192.0.2.53',
+                          concurrency=concurrency)
+    batch.compare()
+    assert [dzt.errno for dzt in batch.tests] == [3, 0]
+    assert batch.errno == 3
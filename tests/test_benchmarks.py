@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_benchmarks.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import pytest
+from benchmarks import bench
+
+
+@pytest.mark.parametrize('mode', ['udp', 'tcp-pipeline'])
+def test_run_case(tmpdir, mode):
+    zonefile = str(tmpdir.join('zone'))
+    bench.write_zonefile(zonefile, bench.ORIGIN, 50)
+    args = bench.parse_args(['--truncation', '0.1', '-c', '4'])
+    args.mode = mode
+    args.records = 50
+    args.zonefile = zonefile
+    result = bench.run_case(args)
+    assert result['mismatches'] == 0
+    assert result['qps'] > 0
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_cache.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import dns.message
+import dns.rcode
+import dns.rrset
+import dnszonetest.cache
+from dnszonetest.cache import ResponseCache
+from dnszonetest.metrics import Metrics
+
+
+def exchange(name='www.example.com', rdtype='A', ttl=300):
+    q = dns.message.make_query(name, rdtype)
+    r = dns.message.make_response(q)
+    r.answer.append(dns.rrset.from_text(q.question[0].name, ttl, 'IN',
+                                        'A', '192.0.2.1'))
+    return q.to_wire(), r.to_wire()
+
+
+def test_response_cache(tmpdir):
+    path = str(tmpdir.join('cache.db'))
+    metrics = Metrics()
+    cache = ResponseCache(path, metrics=metrics)
+    query, response = exchange()
+    assert cache.get('192.0.2.53', 53, query) is None
+    cache.put('192.0.2.53', 53, query, response)
+    cache.close()
+    cache = ResponseCache(path, metrics=metrics)
+    other_query = exchange('WWW.example.com')[0]
+    cached = cache.get('192.0.2.53', 53, other_query)
+    assert cached[:2] == other_query[:2]
+    assert cached[2:] == response[2:]
+    assert cache.get('192.0.2.54', 53, query) is None
+    assert cache.get('192.0.2.53', 5353, query) is None
+    assert cache.get('192.0.2.53', 53, exchange(rdtype='AAAA')[0]) is None
+    assert metrics.summary()['nameservers']['192.0.2.53']['cached'] == 1
+    cache.close()
+
+
+def test_response_cache_expires(tmpdir, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(dnszonetest.cache.time, 'time', lambda: now[0])
+    cache = ResponseCache(str(tmpdir.join('cache.db')), max_age=60)
+    query, response = exchange(ttl=30)
+    cache.put('192.0.2.53', 53, query, response)
+    query2, response2 = exchange('mail.example.com', ttl=300)
+    cache.put('192.0.2.53', 53, query2, response2)
+    now[0] += 45
+    assert cache.get('192.0.2.53', 53, query) is None
+    assert cache.get('192.0.2.53', 53, query2) is not None
+    now[0] += 30
+    assert cache.get('192.0.2.53', 53, query2) is None
+    cache.close()
+
+
+def test_response_cache_negative(tmpdir):
+    cache = ResponseCache(str(tmpdir.join('cache.db')))
+    q = dns.message.make_query('www.example.com', 'A')
+    for rcode in (dns.rcode.NXDOMAIN, dns.rcode.SERVFAIL):
+        r = dns.message.make_response(q)
+        r.set_rcode(rcode)
+        cache.put('192.0.2.53', 53, q.to_wire(), r)
+    # No records, no TTL.
+    assert cache.get('192.0.2.53', 53, q.to_wire()) is None
+    cache.max_age = 60
+    cache.put('192.0.2.53', 53, q.to_wire(), r)
+    assert cache.get('192.0.2.53', 53, q.to_wire()) is None
+    r.set_rcode(dns.rcode.NXDOMAIN)
+    cache.put('192.0.2.53', 53, q.to_wire(), r)
+    assert cache.get('192.0.2.53', 53, q.to_wire()) is not None
+    cache.close()
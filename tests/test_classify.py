@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_classify.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import pytest
+import dns.flags
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rrset
+from dnszonetest.classify import Verdict, classify
+
+www = dns.name.from_text('www.example.com')
+
+
+def response(qname, rdtype, answer=(), authority=(), aa=True):
+    '''
+    Returns a response to a query for qname and rdtype with the RRsets of
+    answer and authority, given as text.
+    '''
+    r = dns.message.make_response(dns.message.make_query(qname, rdtype))
+    if aa:
+        r.flags |= dns.flags.AA
+    for section, rrsets in ((r.answer, answer), (r.authority, authority)):
+        for text in rrsets:
+            name, ttl, rdtype, rdata = text.split(None, 3)
+            section.append(
+                dns.rrset.from_text(name, int(ttl), 'IN', rdtype, rdata))
+    return r
+
+
+def test_classify_answer():
+    verdict = classify(
+        response(www, 'A', ['www.example.com. 300 A 192.0.2.1']), www, 1)
+    assert verdict.kind == 'answer'
+    assert verdict.authoritative
+    assert verdict.unexpected == []
+    assert str(verdict) == 'answer'
+
+
+def test_classify_cname():
+    verdict = classify(
+        response(www, 'A', ['www.example.com. 300 CNAME example.com.',
+                            'example.com. 300 A 192.0.2.1'], aa=False),
+        www, 1)
+    assert verdict.kind == 'cname'
+    assert not verdict.authoritative
+    assert verdict.unexpected == []
+    assert str(verdict) == 'CNAME example.com.'
+
+
+def test_classify_unexpected():
+    verdict = classify(
+        response(www, 'A', ['www.example.com. 300 A 192.0.2.1',
+                            'www.example.com. 300 TXT text',
+                            'mail.example.com. 300 A 192.0.2.3']),
+        www, 1)
+    assert verdict.kind == 'answer'
+    assert verdict.unexpected == ['www.example.com. TXT',
+                                  'mail.example.com. A']
+
+
+@pytest.mark.parametrize(('rcode', 'authority', 'aa', 'kind', 'text'), [
+    (dns.rcode.NXDOMAIN, ['example.com. 300 SOA . . 1 2 3 4 5'], True,
+     'nxdomain', 'NXDOMAIN'),
+    (dns.rcode.NOERROR, ['example.com. 300 SOA . . 1 2 3 4 5'], True,
+     'nodata', 'NODATA'),
+    (dns.rcode.NOERROR, ['www.example.com. 300 NS ns.example.net.'], False,
+     'referral', 'referral to www.example.com.'),
+    (dns.rcode.SERVFAIL, [], False, 'servfail', 'SERVFAIL'),
+])
+def test_classify_negative(rcode, authority, aa, kind, text):
+    r = response(www, 'A', authority=authority, aa=aa)
+    r.set_rcode(rcode)
+    verdict = classify(r, www, 1)
+    assert verdict.kind == kind
+    assert str(verdict) == text
+
+
+def test_verdict_timeout():
+    assert str(Verdict('timeout')) == 'timeout'
@@ -28,23 +28,78 @@ def test_parse_args_short():
             '-v',
             '-q',
             '-d', 'ns.example.com',
+            '-d', 'ns2.example.com',
             '-r',
             '-t',
             '-n',
             '-s',
+            '-c', '8',
+            '-p', 'tcp',
+            '--tcp-connections', '2',
+            '-x',
+            '--timeout', '2.5',
+            '--retries', '4',
+            '--rate', '500',
+            '--burst', '50',
+            '--stream',
+            '--state-file', '/var/lib/dnszonetest/state.json',
+            '--recheck-fraction', '0.01',
+            '-P', '4',
+            '--compact',
+            '--port', '5353',
+            '--metrics', '/tmp/metrics.json',
+            '--prometheus', '/tmp/dnszonetest.prom',
+            '--profile', '/tmp/dnszonetest.pstats',
+            '--results', '-',
+            '--results-format', 'csv',
+            '--max-mismatches', '10',
+            '--probes', '20',
+            '--cache', '/var/cache/dnszonetest.db',
+            '--cache-max-age', '600',
+            '--snapshots', '/var/cache/dnszonetest',
+            '--diff', '/var/named/zone/example.com.prev',
+            '--sanity-sample', '10',
         ]
     )
     assert vars(args) == {
         'zonename': 'example.com',
         'zonefile': '/var/named/zone/example.com',
+        'batch': None,
         'verbose': True,
         'quiet': True,
-        'nameserver': 'ns.example.com',
-        'protocol': 'udp',
+        'nameserver': ['ns.example.com', 'ns2.example.com'],
+        'protocol': 'tcp',
         'no_recursion': True,
         'compare_ttl': True,
         'compare_ns': True,
-        'compare_soa': True
+        'compare_soa': True,
+        'concurrency': 8,
+        'tcp_connections': 2,
+        'axfr': True,
+        'timeout': 2.5,
+        'retries': 4,
+        'rate': 500,
+        'burst': 50,
+        'stream': True,
+        'state_file': '/var/lib/dnszonetest/state.json',
+        'recheck_fraction': 0.01,
+        'processes': 4,
+        'compact': True,
+        'port': 5353,
+        'metrics_file': '/tmp/metrics.json',
+        'prometheus_file': '/tmp/dnszonetest.prom',
+        'profile_file': '/tmp/dnszonetest.pstats',
+        'results_file': '-',
+        'results_format': 'csv',
+        'max_mismatches': 10,
+        'probes': 20,
+        'cache_file': '/var/cache/dnszonetest.db',
+        'cache_max_age': 600.0,
+        'snapshot_dir': '/var/cache/dnszonetest',
+        'previous_zonefile': '/var/named/zone/example.com.prev',
+        'sanity_sample': 10,
+        'sample': None,
+        'sample_fraction': None,
     }
 
 
@@ -63,19 +118,73 @@ def test_parse_args_long():
             '--ttl',
             '--ns',
             '--soa',
+            '--concurrency', '8',
+            '--protocol', 'tcp',
+            '--tcp-connections', '2',
+            '--axfr',
+            '--timeout', '2.5',
+            '--retries', '4',
+            '--rate', '500',
+            '--burst', '50',
+            '--stream',
+            '--state-file', '/var/lib/dnszonetest/state.json',
+            '--recheck-fraction', '0.01',
+            '--processes', '4',
+            '--compact',
+            '--port', '5353',
+            '--metrics', '/tmp/metrics.json',
+            '--prometheus', '/tmp/dnszonetest.prom',
+            '--profile', '/tmp/dnszonetest.pstats',
+            '--results', '-',
+            '--results-format', 'csv',
+            '--max-mismatches', '10',
+            '--probes', '20',
+            '--cache', '/var/cache/dnszonetest.db',
+            '--cache-max-age', '600',
+            '--snapshots', '/var/cache/dnszonetest',
+            '--diff', '/var/named/zone/example.com.prev',
+            '--sanity-sample', '10',
         ]
     )
     assert vars(args) == {
         'zonename': 'example.com',
         'zonefile': '/var/named/example.com',
+        'batch': None,
         'verbose': True,
         'quiet': True,
-        'nameserver': 'ns.example.com',
-        'protocol': 'udp',
+        'nameserver': ['ns.example.com'],
+        'protocol': 'tcp',
         'no_recursion': True,
         'compare_ttl': True,
         'compare_ns': True,
-        'compare_soa': True
+        'compare_soa': True,
+        'concurrency': 8,
+        'tcp_connections': 2,
+        'axfr': True,
+        'timeout': 2.5,
+        'retries': 4,
+        'rate': 500,
+        'burst': 50,
+        'stream': True,
+        'state_file': '/var/lib/dnszonetest/state.json',
+        'recheck_fraction': 0.01,
+        'processes': 4,
+        'compact': True,
+        'port': 5353,
+        'metrics_file': '/tmp/metrics.json',
+        'prometheus_file': '/tmp/dnszonetest.prom',
+        'profile_file': '/tmp/dnszonetest.pstats',
+        'results_file': '-',
+        'results_format': 'csv',
+        'max_mismatches': 10,
+        'probes': 20,
+        'cache_file': '/var/cache/dnszonetest.db',
+        'cache_max_age': 600.0,
+        'snapshot_dir': '/var/cache/dnszonetest',
+        'previous_zonefile': '/var/named/zone/example.com.prev',
+        'sanity_sample': 10,
+        'sample': None,
+        'sample_fraction': None,
     }
 
 
@@ -92,6 +201,7 @@ def test_parse_args_pos():
     assert vars(args) == {
         'zonename': 'example.com',
         'zonefile': '/var/named/zone/example.com',
+        'batch': None,
         'verbose': False,
         'quiet': False,
         'nameserver': None,
@@ -100,9 +210,66 @@ def test_parse_args_pos():
         'compare_ttl': False,
         'compare_ns': False,
         'compare_soa': False,
+        'concurrency': 1,
+        'tcp_connections': 0,
+        'axfr': False,
+        'timeout': 10,
+        'retries': 2,
+        'rate': 0,
+        'burst': None,
+        'stream': False,
+        'state_file': None,
+        'recheck_fraction': 0,
+        'processes': 1,
+        'compact': False,
+        'port': 53,
+        'metrics_file': None,
+        'prometheus_file': None,
+        'profile_file': None,
+        'results_file': None,
+        'results_format': None,
+        'max_mismatches': 0,
+        'probes': 0,
+        'cache_file': None,
+        'cache_max_age': None,
+        'snapshot_dir': None,
+        'previous_zonefile': None,
+        'sanity_sample': 100,
+        'sample': None,
+        'sample_fraction': None,
     }
 
 
+def test_parse_args_batch():
+    args = cli.parse_args(['--batch', '/var/named/zones'])
+    assert args.batch == '/var/named/zones'
+    assert args.zonename is None
+    with pytest.raises(SystemExit):
+        cli.parse_args(['-b', '/var/named/zones', 'example.com'])
+    with pytest.raises(SystemExit):
+        cli.parse_args(['example.com'])
+    with pytest.raises(SystemExit):
+        cli.parse_args(['-b', '/var/named/zones', '--diff', '/tmp/prev'])
+    with pytest.raises(SystemExit):
+        cli.parse_args(['-b', '/var/named/zones', '-P', '4'])
+    assert cli.parse_args(['-b', '/var/named/zones', '-P', '1']).processes == 1
+
+
+def test_parse_args_sample():
+    args = cli.parse_args(['example.com', 'example.com.zone', '--sample',
+                           '1000'])
+    assert args.sample == 1000
+    args = cli.parse_args(['example.com', 'example.com.zone',
+                           '--sample-fraction', '0.01'])
+    assert args.sample_fraction == 0.01
+    with pytest.raises(SystemExit):
+        cli.parse_args(['example.com', 'example.com.zone', '--sample', '10',
+                        '--sample-fraction', '0.1'])
+    with pytest.raises(SystemExit):
+        cli.parse_args(['example.com', 'example.com.zone', '--sample', '10',
+                        '--diff', '/tmp/prev'])
+
+
 @pytest.mark.parametrize(
     ('verbose', 'quiet', 'log_level'),
     [
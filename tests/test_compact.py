@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_compact.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import dns.name
+import dns.zone
+from dnszonetest.compact import CompactZone
+from dnszonetest.zonefile import stream_rdatasets
+
+
+def test_compact_zone(zonefile, zone):
+    expected = list(zone.iterate_rdatasets())
+    parsed = dns.zone.from_file(zonefile, origin='example.com',
+                                relativize=False)
+    compact = CompactZone.from_zone(parsed)
+    assert not parsed.nodes
+    assert len(compact) == len(expected)
+    rdatasets = list(compact.iterate_rdatasets())
+    assert rdatasets == expected
+    assert [rdataset.ttl for _, rdataset in rdatasets] == \
+        [rdataset.ttl for _, rdataset in expected]
+
+
+def test_compact_zone_from_rdatasets(zonefile, zone):
+    compact = CompactZone.from_rdatasets(
+        zone.origin, stream_rdatasets(zonefile, 'example.com'))
+
+    def key(item):
+        return item[0], item[1].rdtype, item[1].covers
+
+    assert sorted(compact.iterate_rdatasets(), key=key) == \
+        sorted(zone.iterate_rdatasets(), key=key)
+
+
+def test_compact_zone_from_rdatasets_merges(tmpdir):
+    zonefile = tmpdir.join('example.com')
+    with zonefile.open('w') as fh:
+        fh.write('''$ORIGIN example.com.
+$TTL 300
+@ IN SOA ns hostmaster 1 1d 2h 4w 300
+@ IN NS ns
+www IN A 192.0.2.1
+ns IN A 192.0.2.2
+mail IN A 192.0.2.3
+www IN A 192.0.2.4
+''')
+    zone = dns.zone.from_file(str(zonefile), 'example.com',
+                              relativize=False)
+    # With one owner name per chunk, the www records are chunks apart.
+    compact = CompactZone.from_rdatasets(
+        zone.origin, stream_rdatasets(str(zonefile), 'example.com', 1))
+    assert len(compact) == len(list(zone.iterate_rdatasets()))
+    www = dns.name.from_text('www.example.com')
+    assert [
+        rdataset for name, rdataset in compact.iterate_rdatasets(1)
+        if name == www
+    ] == [zone.find_rdataset(www, 1)]
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_diff.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import pytest
+import dns.name
+import dns.rdataset
+import dns.rdatatype
+from dnszonetest.diff import (
+    ADDED,
+    CHANGED,
+    SAMPLED,
+    UNCHANGED,
+    ZoneDiff,
+    load_previous,
+)
+from dnszonetest.exceptions import NoZoneFileException
+from dnszonetest.snapshot import SnapshotZone, file_key, write_snapshot
+
+
+def test_zone_diff(zone):
+    diff = ZoneDiff(zone)
+    mail = dns.name.from_text('mail.example.com')
+    new = dns.name.from_text('new.example.com')
+    assert diff.check(mail, zone.get_rdataset(mail, 'A')) == UNCHANGED
+    changed = dns.rdataset.from_text('IN', 'A', 28800, '192.0.2.30')
+    ns = dns.name.from_text('ns.example.com')
+    assert diff.check(ns, changed) == CHANGED
+    assert diff.check(new, changed) == ADDED
+    # The TTL is part of the rdataset.
+    origin = dns.name.from_text('example.com')
+    soa = zone.get_rdataset(origin, 'SOA').copy()
+    soa.ttl = 60
+    assert diff.check(origin, soa) == CHANGED
+    removed = diff.removed()
+    www = dns.name.from_text('www.example.com')
+    assert (www, dns.rdatatype.CNAME, dns.rdatatype.NONE) in removed
+    assert (ns, dns.rdatatype.A, dns.rdatatype.NONE) not in removed
+    assert (mail, dns.rdatatype.A, dns.rdatatype.NONE) not in removed
+    assert len(removed) == len(list(zone.iterate_rdatasets())) - 3
+
+
+def test_zone_diff_sample(zone):
+    rdatasets = list(zone.iterate_rdatasets())
+    diff = ZoneDiff(zone, sample=3)
+    changes = [diff.check(name, rdataset) for name, rdataset in rdatasets]
+    assert changes.count(SAMPLED) == 3
+    assert changes.count(UNCHANGED) == len(rdatasets) - 3
+    assert diff.removed() == []
+    diff = ZoneDiff(zone, sample=1000)
+    assert set(diff.check(name, rdataset)
+               for name, rdataset in rdatasets) == {SAMPLED}
+
+
+def test_load_previous(zonefile, zone, tmpdir):
+    previous = load_previous(zonefile, 'example.com')
+    assert len(list(previous.iterate_rdatasets())) == \
+        len(list(zone.iterate_rdatasets()))
+    path = str(tmpdir.join('snapshot'))
+    write_snapshot(path, zone, file_key(zonefile))
+    assert isinstance(load_previous(path, 'example.com'), SnapshotZone)
+    with pytest.raises(NoZoneFileException):
+        load_previous(str(tmpdir.join('missing')), 'example.com')
@@ -4,20 +4,35 @@
 
 from __future__ import print_function
 from __future__ import unicode_literals
-import io
+import csv
+import json
+import logging
+import os
 import pytest
+import dns.flags
+import dns.message
 import dns.name
 import dns.rdataset
 import dns.resolver
 import dns.zone
+import dnszonetest.transport
 import sys
+from dnszonetest.compact import CompactZone
 from dnszonetest.main import DnsZoneTest
+from dnszonetest.main import QUERY_TEMPLATES
+from dnszonetest.main import RdatasetText
 from dnszonetest.main import Record
+from tests import dnsserver
 from dnszonetest.exceptions import (
     NoZoneFileException,
-    UnableToResolveNameServerException
+    UnableToResolveNameServerException,
+    ZoneTransferException,
 )
 
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 
 if sys.version_info < (3,):
     ip_192_0_2_1 = b'192.0.2.1'
@@ -26,6 +41,12 @@ else:
     ip_192_0_2_1 = '192.0.2.1'
     ip_192_0_2_2 = '192.0.2.2'
 
+# A name server that serves another address for mail.example.com.
+MAIL_OVERRIDES = {
+    (dns.name.from_text('mail.example.com'), 1):
+        dns.rdataset.from_text(1, 1, 28800, ip_192_0_2_2),
+}
+
 
 @pytest.mark.parametrize(
     ('rdataset_file', 'rdataset_query', 'rdataset_match', 'ttl_match'),
@@ -63,105 +84,104 @@ def test_record(rdataset_file, rdataset_query, rdataset_match, ttl_match):
     assert record.ttl_match is ttl_match
 
 
-def test_record_query(monkeypatch):
-    rdataset = dns.rdataset.from_text(1, 1, 28800, ip_192_0_2_1)
+def test_rdataset_text():
+    rdataset = dns.rdataset.from_text(1, 1, 28800, ip_192_0_2_2,
+                                      ip_192_0_2_1)
+    text = RdatasetText(rdataset)
+    assert text._text is None
+    assert str(text) == '28800 IN A 192.0.2.1 28800 IN A 192.0.2.2'
+    assert text._text == '28800 IN A 192.0.2.1 28800 IN A 192.0.2.2'
 
-    class Answer(object):
-        def to_rdataset(self):
-            return rdataset
 
-    class Result(object):
-        def __init__(self):
-            self.answer = [Answer()]
+def test_rdataset_text_built_once():
+    rdataset = mock.MagicMock()
+    rdataset.__str__.return_value = '28800 IN A 192.0.2.1'
+    text = RdatasetText(rdataset)
+    assert str(text) == '28800 IN A 192.0.2.1'
+    assert str(text) == '28800 IN A 192.0.2.1'
+    assert rdataset.__str__.call_count == 1
+
+
+def test_query_template():
+    q = QUERY_TEMPLATES[True].make('www.example.com', 1)
+    expected = dns.message.make_query('www.example.com', 1, use_edns=True,
+                                      payload=2048)
+    expected.id = dns.message.from_wire(q).id
+    assert q == expected.to_wire()
+    q = QUERY_TEMPLATES[False].make(dns.name.from_text('example.com'), 15)
+    assert dns.message.from_wire(q).flags == 0
+
+
+def test_record_text_not_built_when_not_logged(caplog):
+    caplog.set_level(logging.INFO, logger='dnszonetest.main')
+    record = Record('www.example.com',
+                    dns.rdataset.from_text(1, 1, 28800, ip_192_0_2_1))
+    record.make_query_msg()
+    assert record.text_file._text is None
+    record.rdataset_query = dns.rdataset.from_text(1, 1, 28800, ip_192_0_2_2)
+    assert record.text_query.rdataset is record.rdataset_query
+
+
+def answer_with(rdataset):
+    '''
+    Returns a dnszonetest.transport.udp stand-in that answers every query
+    with rdataset.
+    '''
+    def udp_mock(query_message, nameserver, timeout=0, port=53):
+        query_message = dns.message.from_wire(query_message)
+        response = dns.message.make_response(query_message)
+        if rdataset is not None:
+            response.find_rrset(
+                response.answer,
+                query_message.question[0].name,
+                rdataset.rdclass,
+                rdataset.rdtype,
+                create=True,
+            ).update(rdataset)
+        return response
+    return udp_mock
+
 
-    def udp_mock(query_message, nameserver, timeout=0):
-        return Result()
+def test_record_query(monkeypatch):
+    rdataset = dns.rdataset.from_text(1, 1, 28800, ip_192_0_2_1)
 
     monkeypatch.setattr(
-        dns.query,
+        dnszonetest.transport,
         'udp',
-        udp_mock
+        answer_with(rdataset)
     )
     record = Record('example.com', rdataset)
     record.query('192.0.2.2', False)
-    assert record.query_msg.flags == 256
+    assert dns.message.from_wire(record.query_msg).flags == 256
     assert record.rdataset_query == rdataset
 
 
 def test_record_query_no_recursion(monkeypatch):
     rdataset = dns.rdataset.from_text(1, 1, 28800, ip_192_0_2_1)
 
-    class Answer(object):
-        def to_rdataset(self):
-            return rdataset
-
-    class Result(object):
-        def __init__(self):
-            self.answer = [Answer()]
-
-    def udp_mock(query_message, nameserver, timeout=0):
-        return Result()
-
     monkeypatch.setattr(
-        dns.query,
+        dnszonetest.transport,
         'udp',
-        udp_mock
+        answer_with(rdataset)
     )
     record = Record('example.com', rdataset)
     record.query('192.0.2.2', True)
-    assert record.query_msg.flags == 0
+    assert dns.message.from_wire(record.query_msg).flags == 0
 
 
 def test_dzt_query_no_result(monkeypatch):
     rdataset = dns.rdataset.from_text(1, 1, 28800, ip_192_0_2_1)
 
-    class Result(object):
-        def __init__(self):
-            self.answer = []
-
-    def udp_mock(query_message, nameserver, timeout=0):
-        return Result()
-
     monkeypatch.setattr(
-        dns.query,
+        dnszonetest.transport,
         'udp',
-        udp_mock
+        answer_with(None)
     )
     record = Record('example.com', rdataset)
     record.query('192.0.2.2', False)
     assert record.rdataset_query is None
 
 
-@pytest.fixture(scope='module')
-def zonefile(tmpdir_factory):
-    zonefile = tmpdir_factory.mktemp('data').join('example.com')
-    with io.open(str(zonefile), 'w', encoding='utf-8') as fh:
-        fh.write('''$ORIGIN example.com.
-$TTL 8h
-example.com.  IN  SOA   ns.example.com. username.example.com. (
-    2001052542
-    1d
-    2h
-    4w
-    1h
-    )
-example.com.  IN  NS    ns
-example.com.  IN  NS    ns.somewhere.example.
-example.com.  IN  MX    10 mail.example.com.
-@             IN  MX    20 mail2.example.com.
-@             IN  MX    50 mail3
-example.com.  IN  A     192.0.2.1
-IN  AAAA  2001:db8:10::1
-ns            IN  A     192.0.2.2
-IN  AAAA  2001:db8:10::2
-www           IN  CNAME example.com.
-wwwtest       IN  CNAME www
-mail          IN  A     192.0.2.3
-mail2         IN  A     192.0.2.4
-mail3         IN  A     192.0.2.5''')
-    return str(zonefile)
-
-
 @pytest.fixture(scope='module')
 def dzt(zonefile):
     '''
@@ -191,6 +211,15 @@ def test_dzt_get_nameserver_ip_without_given_nameserver(dzt, monkeypatch):
     )
     dzt.get_nameserver_ip()
     assert dzt.nameserver_ip == '192.0.2.1'
+    assert dzt.nameserver_ips == ['192.0.2.1']
+
+
+def test_dzt_get_nameserver_ip_with_given_nameservers(zonefile):
+    dzt = DnsZoneTest('example.com', zonefile,
+                      ['192.0.2.1', '2001:db8::1', '192.0.2.1'])
+    dzt.get_nameserver_ip()
+    assert dzt.nameserver_ip == '192.0.2.1'
+    assert dzt.nameserver_ips == ['192.0.2.1', '2001:db8::1']
 
 
 def test_dzt_get_nameserver_ip_with_given_nameserver(dzt_ns):
@@ -217,3 +246,354 @@ def test_dzt_get_zone_from_file_raises_NoZoneFileException():
     dzt = DnsZoneTest('example.com', '/path/to/non/existing/zone/file')
     with pytest.raises(NoZoneFileException):
         dzt.get_zone_from_file()
+
+
+def test_dzt_compare_axfr(zonefile, zone):
+    mail = dns.name.from_text('mail.example.com')
+    extra = dns.name.from_text('extra.example.com')
+    overrides = {
+        (mail, 1): dns.rdataset.from_text(1, 1, 28800, ip_192_0_2_2),
+        (extra, 1): dns.rdataset.from_text(1, 1, 28800, ip_192_0_2_1),
+    }
+    with dnsserver.TCPServer(zone, overrides) as server:
+        dzt = DnsZoneTest('example.com', zonefile, axfr=True,
+                          port=server.port)
+        dzt.nameserver_ips = ['127.0.0.1']
+        dzt.get_zone_from_file()
+        dzt.compare_axfr()
+    assert dzt.mismatch_rdataset == 1
+    assert dzt.mismatch_extra == 1
+    assert dzt.errno == 1
+
+
+def test_dzt_get_zone_from_axfr_raises_ZoneTransferException(zonefile):
+    dzt = DnsZoneTest('example.com', zonefile, axfr=True, port=9)
+    with pytest.raises(ZoneTransferException):
+        dzt.get_zone_from_axfr('127.0.0.1')
+
+
+def test_dzt_compare_nameservers(zonefile, server):
+    server(nameservers={'192.0.2.53': None, '192.0.2.54': MAIL_OVERRIDES})
+    nameservers = ['192.0.2.53', '192.0.2.54']
+    dzt = DnsZoneTest('example.com', zonefile, nameservers, concurrency=4)
+    dzt.compare()
+    assert dzt.nameserver_ips == nameservers
+    assert dzt.mismatch_rdataset == 1
+    assert dzt.nameserver_mismatches['192.0.2.53']['rdataset'] == 0
+    assert dzt.nameserver_mismatches['192.0.2.54']['rdataset'] == 1
+
+
+def test_dzt_records_shard(zonefile):
+    dzt = DnsZoneTest('example.com', zonefile, '192.0.2.53')
+    dzt.nameserver_ips = ['192.0.2.53']
+    dzt.get_zone_from_file()
+    keys = [record.key for record in dzt.records()]
+    shards = []
+    for index in range(3):
+        dzt.shard = (index, 3)
+        shards.extend(record.key for record in dzt.records())
+    assert sorted(shards) == sorted(keys)
+
+
+def test_dzt_split_zone(zonefile):
+    dzt = DnsZoneTest('example.com', zonefile, '192.0.2.53', processes=3)
+    dzt.nameserver_ips = ['192.0.2.53']
+    dzt.get_zone_from_file()
+    keys = [record.key for record in dzt.records()]
+    zones, planner = dzt.split_zone()
+    assert planner.cuts == set()
+    shards = []
+    for index, zone in enumerate(zones):
+        dzt.shard = (index, 3)
+        dzt.zone_from_file = zone
+        dzt.zone_planner = planner
+        shards.extend(record.key for record in dzt.records())
+    assert sorted(shards) == sorted(keys)
+
+
+@pytest.mark.parametrize(('options', 'parses', 'zone_type'), [
+    ({}, True, dns.zone.Zone),
+    ({'concurrency': 4}, True, dns.zone.Zone),
+    ({'stream': True}, False, type(None)),
+    ({'compact': True}, False, CompactZone),
+    ({'processes': 2}, True, type(None)),
+])
+def test_dzt_compare_modes(zonefile, zone, server, monkeypatch, options,
+                           parses, zone_type):
+    # Worker processes are forked with the patched transport.
+    server(MAIL_OVERRIDES)
+    from_file = dns.zone.from_file
+    parent = os.getpid()
+
+    def parse(*args, **kwargs):
+        # Streamed and compact zones are built from the streamed zone file.
+        assert parses, 'parsed the whole zone'
+        assert os.getpid() == parent, 'worker parsed the zone file'
+        return from_file(*args, **kwargs)
+
+    monkeypatch.setattr(dns.zone, 'from_file', parse)
+    dzt = DnsZoneTest('example.com', zonefile, '192.0.2.53', **options)
+    dzt.compare()
+    assert isinstance(dzt.zone_from_file, zone_type)
+    if zone_type is CompactZone:
+        assert len(dzt.zone_from_file) == len(list(zone.iterate_rdatasets()))
+    assert dzt.mismatch_rdataset == 1
+    assert dzt.nameserver_mismatches['192.0.2.53']['rdataset'] == 1
+    assert dzt.errno == 1
+
+
+def test_record_release():
+    record = Record('www.example.com',
+                    dns.rdataset.from_text(1, 1, 28800, ip_192_0_2_1))
+    assert not hasattr(record, '__dict__')
+    record.make_query_msg()
+    record.release()
+    assert record.query_msg is None
+
+
+def test_dzt_compare_metrics(zonefile, tmpdir, server):
+    server()
+    metrics_file = str(tmpdir.join('metrics.json'))
+    prometheus_file = str(tmpdir.join('dnszonetest.prom'))
+    dzt = DnsZoneTest('example.com', zonefile, '192.0.2.53',
+                      metrics_file=metrics_file,
+                      prometheus_file=prometheus_file, processes=2)
+    dzt.compare()
+    with open(metrics_file) as fh:
+        summary = json.load(fh)
+    assert summary['records'] == 9
+    assert summary['nameservers']['192.0.2.53']['responses'] == 9
+    with open(prometheus_file) as fh:
+        assert 'dnszonetest_responses_total' in fh.read()
+
+
+def test_dzt_compare_profile(zonefile, tmpdir, server):
+    server()
+    profile_file = str(tmpdir.join('dnszonetest.pstats'))
+    dzt = DnsZoneTest('example.com', zonefile, '192.0.2.53',
+                      profile_file=profile_file, processes=2)
+    stages = []
+    dzt.add_hook(lambda stage, seconds: stages.append(stage))
+    dzt.compare()
+    # Hooks are called in this process only.
+    assert stages == ['resolve', 'parse']
+    summary = dzt.profiler.summary()
+    for stage in ('resolve', 'parse', 'build', 'network', 'response',
+                  'compare', 'log'):
+        assert summary[stage]['calls'] > 0
+    assert summary['network']['calls'] == 9
+    assert not tmpdir.join('dnszonetest.pstats.0').exists()
+    assert tmpdir.join('dnszonetest.pstats').size() > 0
+
+
+def test_dzt_results(zonefile, server):
+    mail = dns.name.from_text('mail.example.com')
+    server(MAIL_OVERRIDES)
+    dzt = DnsZoneTest('example.com', zonefile, '192.0.2.53', concurrency=4)
+    results = list(dzt.results())
+    assert len(results) == 9
+    assert [result.name for result in results if result.mismatch] == [mail]
+    assert dzt.errno == 1
+
+
+def test_dzt_compare_results_file(zonefile, tmpdir, server):
+    server(MAIL_OVERRIDES)
+    results_file = str(tmpdir.join('results.csv'))
+    dzt = DnsZoneTest('example.com', zonefile, '192.0.2.53', processes=2,
+                      results_file=results_file)
+    dzt.compare()
+    with open(results_file) as fh:
+        rows = list(csv.DictReader(fh))
+    assert len(rows) == 9
+    assert [row['name'] for row in rows if row['status'] != 'match'] == [
+        'mail.example.com.']
+
+
+def test_record_query_siblings(monkeypatch):
+    name = dns.name.from_text('ns.example.com')
+    rdatasets = [
+        dns.rdataset.from_text(
+            'IN', 'RRSIG', 3600,
+            '{0} 8 3 3600 20300101000000 20200101000000 1 example.com. '
+            'AAAA'.format(covers))
+        for covers in ('A', 'AAAA')
+    ]
+
+    def udp_mock(query_message, nameserver, timeout=0, port=53):
+        query_message = dns.message.from_wire(query_message)
+        response = dns.message.make_response(query_message)
+        for rdataset in reversed(rdatasets):
+            response.find_rrset(response.answer, name, rdataset.rdclass,
+                                rdataset.rdtype, rdataset.covers,
+                                create=True).update(rdataset)
+        return response
+
+    monkeypatch.setattr(dnszonetest.transport, 'udp', udp_mock)
+    record = Record(name, rdatasets[0])
+    record.siblings = (Record(name, rdatasets[1]),)
+    record.query('192.0.2.2')
+    assert record.rdataset_query == rdatasets[0]
+    assert record.siblings[0].rdataset_query == rdatasets[1]
+    assert record.siblings[0].nameserver_ip == '192.0.2.2'
+
+
+@pytest.mark.parametrize(('concurrency', 'processes'), [
+    (1, 1),
+    (4, 1),
+    (1, 2),
+])
+def test_dzt_compare_max_mismatches(zonefile, monkeypatch, concurrency,
+                                    processes):
+    monkeypatch.setattr(
+        dnszonetest.transport,
+        'udp',
+        answer_with(dns.rdataset.from_text(1, 1, 28800, ip_192_0_2_2)),
+    )
+    dzt = DnsZoneTest('example.com', zonefile, '192.0.2.53',
+                      concurrency=concurrency, processes=processes,
+                      max_mismatches=2)
+    dzt.compare()
+    assert dzt.aborted
+    assert 2 <= dzt.mismatch_records < 9
+    assert dzt.errno == 1
+    if processes == 1:
+        assert dzt.mismatch_records == 2
+
+
+def test_dzt_compare_probes(zonefile, server, monkeypatch):
+    server()
+    dzt = DnsZoneTest('example.com', zonefile, probes=3)
+    dzt.nameserver_ips = ['192.0.2.53']
+    dzt.get_zone_from_file()
+    results = [
+        result for result in dzt.iterate_results()
+        if result.response == 'nxdomain'
+    ]
+    assert len(results) == 3
+    assert len(set(result.name for result in results)) == 3
+    assert not any(result.mismatch for result in results)
+    assert dzt.errno == 0
+    # A name server that serves the probe names.
+    mail = dns.name.from_text('mail.example.com')
+    monkeypatch.setattr(dnszonetest.main, 'probe_qname',
+                        lambda parent: mail)
+    dzt = DnsZoneTest('example.com', zonefile, probes=3)
+    dzt.nameserver_ips = ['192.0.2.53']
+    dzt.get_zone_from_file()
+    dzt.compare_rdatasets()
+    assert dzt.mismatch_nxdomain == 3
+    assert dzt.nameserver_mismatches['192.0.2.53']['nxdomain'] == 3
+    assert dzt.errno == 1
+
+
+def test_dzt_compare_response(zonefile, monkeypatch):
+    dzt = DnsZoneTest('example.com', zonefile, no_recursion=True)
+    dzt.nameserver_ips = ['192.0.2.53']
+    dzt.get_zone_from_file()
+    mail = dns.name.from_text('mail.example.com')
+
+    def server(query_message, nameserver, timeout=0, port=53):
+        response = dnsserver.answer(dzt.zone_from_file, query_message)
+        if response.question[0].name in (mail, dzt.zone_from_file.origin):
+            response.flags &= ~dns.flags.AA
+        return response.to_wire()
+
+    monkeypatch.setattr(dnszonetest.transport, 'udp', server)
+    results = list(dzt.iterate_results())
+    assert dzt.mismatch_rdataset == 0
+    # mail A, and example.com A and MX.
+    assert dzt.mismatch_response == 3
+    assert sorted(
+        '{0}'.format(result.name) for result in results
+        if result.status == 'response'
+    ) == ['example.com.'] * 2 + ['mail.example.com.']
+    assert dzt.errno == 1
+
+
+def test_dzt_compare_cache(zonefile, tmpdir, server, monkeypatch):
+    cache_file = str(tmpdir.join('cache.db'))
+    server()
+    dzt = DnsZoneTest('example.com', zonefile, '192.0.2.53',
+                      cache_file=cache_file)
+    dzt.compare()
+    assert dzt.errno == 0
+    counters = dzt.metrics.summary()['nameservers']['192.0.2.53']
+    assert counters['queries'] > 0
+    assert counters['cached'] == 0
+
+    def unreachable(*args, **kwargs):
+        raise AssertionError('queried a cached response')
+
+    monkeypatch.setattr(dnszonetest.transport, 'udp', unreachable)
+    dzt = DnsZoneTest('example.com', zonefile, '192.0.2.53',
+                      cache_file=cache_file, concurrency=4)
+    dzt.compare()
+    assert dzt.errno == 0
+    counters = dzt.metrics.summary()['nameservers']['192.0.2.53']
+    assert counters['queries'] == 0
+    assert counters['cached'] == dzt.metrics.records
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_dzt_compare_diff(zonefile, tmpdir, server, processes):
+    with open(zonefile) as fh:
+        text = fh.read()
+    previous = str(tmpdir.join('example.com.prev'))
+    with open(previous, 'w') as fh:
+        fh.write(
+            text.replace('192.0.2.3\n', '192.0.2.30\n')
+            .replace('mail3         IN  A     192.0.2.5', '')
+            + '\nold IN A 192.0.2.9\n'
+        )
+    server()
+    results_file = str(tmpdir.join('results.csv'))
+    dzt = DnsZoneTest('example.com', zonefile, '192.0.2.53',
+                      processes=processes, results_file=results_file,
+                      previous_zonefile=previous, sanity_sample=2)
+    dzt.compare()
+    assert dzt.errno == 0
+    with open(results_file) as fh:
+        rows = list(csv.DictReader(fh))
+    names = sorted(row['name'] for row in rows)
+    for name in ('mail.example.com.', 'mail3.example.com.',
+                 'old.example.com.'):
+        assert name in names
+    sampled = dzt.diff_counts['sampled']
+    # Sampled rdatasets may turn out changed, removed or skipped.
+    assert sampled <= 2
+    assert len(names) == 3 + sampled
+    assert dzt.diff_counts['unchanged'] + sampled == 7
+    assert (dzt.diff_counts['added'], dzt.diff_counts['changed'],
+            dzt.diff_counts['removed']) == (1, 1, 1)
+
+    # The server still has the removed record.
+    old = dns.name.from_text('old.example.com')
+    server({(old, 1): dns.rdataset.from_text(1, 1, 28800, '192.0.2.9')})
+    dzt = DnsZoneTest('example.com', zonefile, '192.0.2.53',
+                      previous_zonefile=previous, sanity_sample=0)
+    dzt.compare()
+    assert dzt.mismatch_rdataset == 1
+    assert dzt.errno == 1
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_dzt_compare_sample(zonefile, tmpdir, server, processes):
+    server(MAIL_OVERRIDES)
+    results_file = str(tmpdir.join('results.csv'))
+    dzt = DnsZoneTest('example.com', zonefile, '192.0.2.53',
+                      processes=processes, results_file=results_file,
+                      sample=3)
+    dzt.compare()
+    with open(results_file) as fh:
+        rows = list(csv.DictReader(fh))
+    assert len(rows) == 3
+    assert dzt.sample_size == 3
+    assert sum(dzt.sample_population.values()) == 9
+    assert sum(dzt.sample_checked.values()) == 3
+    assert sum(dzt.sample_mismatched.values()) == dzt.mismatch_records
+
+    dzt = DnsZoneTest('example.com', zonefile, '192.0.2.53',
+                      sample_fraction=1.0)
+    dzt.compare()
+    assert sum(dzt.sample_checked.values()) == 9
+    assert dzt.mismatch_rdataset == 1
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_metrics.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import collections
+import json
+import pickle
+from dnszonetest.metrics import Metrics
+
+
+def test_metrics():
+    metrics = Metrics(slowest=2)
+    metrics.start()
+    metrics.sent('192.0.2.53', 40)
+    metrics.count('192.0.2.53', 'timeouts')
+    metrics.sent('192.0.2.53', 40, retry=True)
+    metrics.received('192.0.2.53', 100, 0.003)
+    for name, seconds in [('a', 0.1), ('b', 0.3), ('c', 0.2)]:
+        metrics.record(name, '192.0.2.53', seconds)
+    other = pickle.loads(pickle.dumps(metrics))
+    metrics.merge(other)
+    metrics.stop()
+    mismatches = {'192.0.2.53': collections.Counter(rdataset=1)}
+    summary = json.loads(metrics.json(mismatches))
+    server = summary['nameservers']['192.0.2.53']
+    assert summary['records'] == 6
+    assert server['queries'] == 4
+    assert server['retries'] == 2
+    assert server['timeouts'] == 2
+    assert server['bytes_received'] == 200
+    assert server['rtt']['buckets']['0.005'] == 2
+    assert server['mismatches'] == {'rdataset': 1}
+    assert [item['name'] for item in summary['slowest']] == ['b', 'b']
+    text = metrics.prometheus(mismatches, 'example.com')
+    assert 'dnszonetest_queries_total{zone="example.com",' \
+        'nameserver="192.0.2.53"} 4\n' in text
+    assert 'dnszonetest_rtt_seconds_bucket{zone="example.com",' \
+        'nameserver="192.0.2.53",le="+Inf"} 2\n' in text
+    assert 'kind="rdataset"} 1\n' in text
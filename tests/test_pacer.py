@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_pacer.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import pytest
+from dnszonetest.pacer import Pacer, TokenBucket
+
+
+def test_token_bucket():
+    bucket = TokenBucket(100, 5)
+    assert [bucket.reserve() for _ in range(5)] == [0] * 5
+    assert bucket.reserve() == pytest.approx(0.01, abs=0.005)
+    assert bucket.reserve() == pytest.approx(0.02, abs=0.005)
+
+
+def test_pacer_per_nameserver():
+    pacer = Pacer(10)
+    assert [pacer.reserve('192.0.2.1') for _ in range(10)] == [0] * 10
+    assert pacer.reserve('192.0.2.1') > 0
+    assert pacer.reserve('192.0.2.2') == 0
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_planner.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import dns.name
+import dns.rdataset
+import dns.rdatatype
+import dns.zone
+from dnszonetest.compact import CompactZone
+from dnszonetest.planner import (
+    CNAME_AND_OTHER_DATA,
+    OCCLUDED,
+    QueryPlanner,
+    probe_qname,
+)
+
+ZONE = '''$ORIGIN example.com.
+$TTL 3600
+@       SOA   ns hostmaster 1 3600 900 604800 300
+@       NS    ns
+ns      A     192.0.2.1
+ns      AAAA  2001:db8::1
+ns      RRSIG A 8 3 3600 20300101000000 20200101000000 1 example.com. AAAA
+ns      RRSIG AAAA 8 3 3600 20300101000000 20200101000000 1 example.com. AAAA
+sub     NS    ns.sub
+sub     DS    1 8 2 {0}
+sub     A     192.0.2.2
+ns.sub  A     192.0.2.3
+*.wild  TXT   "wildcard"
+old     DNAME new.example.net.
+a.old   A     192.0.2.4
+'''.format('ab' * 32)
+
+
+def plan(planner, rdatasets):
+    return dict(
+        (
+            ('{0}'.format(group[0][0]),
+             dns.rdatatype.to_text(group[0][1].rdtype)),
+            ('{0}'.format(qname), len(group), reason),
+        )
+        for qname, group, reason in planner.plan(rdatasets)
+    )
+
+
+def check_plan(groups):
+    assert groups[('ns.example.com.', 'RRSIG')] == \
+        ('ns.example.com.', 2, None)
+    assert groups[('sub.example.com.', 'NS')] == \
+        ('sub.example.com.', 1, None)
+    assert groups[('sub.example.com.', 'DS')][2] is None
+    assert groups[('sub.example.com.', 'A')][2] == OCCLUDED
+    assert groups[('ns.sub.example.com.', 'A')][2] == OCCLUDED
+    assert groups[('a.old.example.com.', 'A')][2] == OCCLUDED
+    assert groups[('old.example.com.', 'DNAME')][2] is None
+    assert groups[('*.wild.example.com.', 'TXT')] == \
+        ('dnszonetest-wildcard.wild.example.com.', 1, None)
+
+
+def test_planner_from_zone():
+    zone = dns.zone.from_text(ZONE, relativize=False)
+    check_plan(plan(QueryPlanner.from_zone(zone), zone.iterate_rdatasets()))
+    compact = CompactZone.from_zone(
+        dns.zone.from_text(ZONE, relativize=False))
+    check_plan(
+        plan(QueryPlanner.from_zone(compact), compact.iterate_rdatasets()))
+
+
+def test_planner_learns_cuts():
+    zone = dns.zone.from_text(ZONE, relativize=False)
+    # In zone file order: names sorted, zone cuts before the names below.
+    rdatasets = sorted(zone.iterate_rdatasets(), key=lambda item: item[0])
+    check_plan(plan(QueryPlanner('example.com'), rdatasets))
+    # Glue before its delegation is planned before the zone cut is known.
+    groups = plan(QueryPlanner('example.com'), reversed(rdatasets))
+    assert groups[('ns.sub.example.com.', 'A')][2] is None
+
+
+def test_planner_cname_and_other_data():
+    name = dns.name.from_text('www.example.com')
+    rdatasets = [
+        (name, dns.rdataset.from_text('IN', 'CNAME', 300, 'example.com.')),
+        (name, dns.rdataset.from_text('IN', 'A', 300, '192.0.2.1')),
+    ]
+    groups = plan(QueryPlanner('example.com'), rdatasets)
+    assert groups[('www.example.com.', 'CNAME')][2] is None
+    assert groups[('www.example.com.', 'A')][2] == CNAME_AND_OTHER_DATA
+
+
+def test_planner_nxdomain_below():
+    zone = dns.zone.from_text(ZONE, relativize=False)
+    planner = QueryPlanner('example.com')
+    plan(planner, zone.iterate_rdatasets())
+    nxdomain_below = dict(
+        (name, planner.nxdomain_below(dns.name.from_text(name)))
+        for name in ('example.com', 'ns.example.com', 'sub.example.com',
+                     'ns.sub.example.com', 'wild.example.com',
+                     '*.wild.example.com', 'old.example.com')
+    )
+    assert nxdomain_below == {
+        'example.com': True,
+        'ns.example.com': True,
+        'sub.example.com': False,
+        'ns.sub.example.com': False,
+        'wild.example.com': False,
+        '*.wild.example.com': False,
+        'old.example.com': False,
+    }
+
+
+def test_probe_qname():
+    parent = dns.name.from_text('example.com')
+    qname = probe_qname(parent)
+    assert qname.parent() == parent
+    assert qname.labels[0].startswith(b'dnszonetest-probe-')
+    assert qname != probe_qname(parent)
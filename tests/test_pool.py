@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_pool.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import itertools
+import pytest
+from dnszonetest.pool import imap_unordered
+
+
+def test_imap_unordered():
+    assert sorted(imap_unordered(lambda x: x * 2, range(100), 8)) == \
+        [x * 2 for x in range(100)]
+
+
+def test_imap_unordered_is_lazy():
+    results = imap_unordered(lambda x: x, itertools.count(), 4)
+    assert len([x for x, _ in zip(results, range(50))]) == 50
+    results.close()
+
+
+def test_imap_unordered_raises():
+    def func(x):
+        if x == 5:
+            raise ValueError(x)
+        return x
+
+    with pytest.raises(ValueError):
+        list(imap_unordered(func, range(10), 4))
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_profiling.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import pickle
+import pstats
+from dnszonetest.profiling import Profiler, cprofile
+
+
+def test_profiler_disabled():
+    profiler = Profiler()
+    with profiler.stage('network'):
+        pass
+    assert profiler.summary() == {}
+
+
+def test_profiler():
+    profiler = Profiler()
+    calls = []
+    profiler.add_hook(lambda stage, seconds: calls.append(stage))
+    for stage in ('build', 'network', 'network'):
+        with profiler.stage(stage):
+            pass
+    assert calls == ['build', 'network', 'network']
+    other = pickle.loads(pickle.dumps(profiler))
+    assert other.hooks == []
+    profiler.merge(other)
+    summary = profiler.summary()
+    assert summary['network']['calls'] == 4
+    assert summary['build']['calls'] == 2
+
+
+def test_cprofile(tmpdir):
+    path = str(tmpdir.join('run.pstats'))
+    extra = str(tmpdir.join('run.pstats.0'))
+    with cprofile(extra):
+        sorted(range(10))
+    with cprofile(path, [extra]):
+        sorted(range(10))
+    assert not os.path.exists(extra)
+    stats = pstats.Stats(path)
+    assert stats.total_calls > 0
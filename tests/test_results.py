@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_results.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import csv
+import io
+import json
+import pytest
+import dns.name
+import dns.rdataset
+from dnszonetest.results import (
+    MATCH,
+    RDATASET,
+    Result,
+    ResultWriter,
+    open_writer,
+)
+
+
+def make_results():
+    name = dns.name.from_text('www.example.com')
+    expected = dns.rdataset.from_text('IN', 'A', 300, '192.0.2.2',
+                                      '192.0.2.1')
+    return [
+        Result('example.com', name, 1, 0, '192.0.2.53', MATCH, expected,
+               expected),
+        Result('example.com', name, 1, 0, '192.0.2.54', RDATASET, expected,
+               response='nxdomain'),
+    ]
+
+
+def test_result_as_dict():
+    match, mismatch = make_results()
+    assert not match.mismatch
+    assert mismatch.mismatch
+    assert mismatch.as_dict() == {
+        'zone': 'example.com',
+        'name': 'www.example.com.',
+        'type': 'A',
+        'covers': None,
+        'nameserver': '192.0.2.54',
+        'status': 'rdataset',
+        'response': 'nxdomain',
+        'expected': ['192.0.2.1', '192.0.2.2'],
+        'received': None,
+        'expected_ttl': 300,
+        'received_ttl': None,
+    }
+
+
+def test_jsonl_writer(tmpdir):
+    path = str(tmpdir.join('results.jsonl'))
+    part = str(tmpdir.join('part'))
+    results = make_results()
+    writer = open_writer(part)
+    writer.write(results[1])
+    writer.close()
+    writer = open_writer(path)
+    writer.write(results[0])
+    writer.append(part)
+    writer.close()
+    assert not tmpdir.join('part').exists()
+    with io.open(path, encoding='utf-8') as fh:
+        rows = [json.loads(line) for line in fh]
+    assert [row['status'] for row in rows] == ['match', 'rdataset']
+
+
+def test_csv_writer(tmpdir):
+    path = str(tmpdir.join('results.csv'))
+    part = str(tmpdir.join('part'))
+    results = make_results()
+    writer = open_writer(part, 'csv')
+    writer.write(results[1])
+    writer.close()
+    writer = open_writer(path)
+    writer.write(results[0])
+    writer.append(part)
+    writer.close()
+    with open(path) as fh:
+        rows = list(csv.DictReader(fh))
+    assert [row['status'] for row in rows] == ['match', 'rdataset']
+    assert rows[0]['received'] == '192.0.2.1 | 192.0.2.2'
+    assert rows[1]['received'] == ''
+
+
+def test_result_writer_abstract():
+    with pytest.raises(TypeError):
+        ResultWriter(io.StringIO())
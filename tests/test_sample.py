@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_sample.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import pytest
+import dns.name
+import dns.rdataset
+import dns.rdatatype
+from dnszonetest.sample import (
+    StratifiedSample,
+    estimate,
+    stratum,
+    wilson_interval,
+)
+
+origin = dns.name.from_text('example.com')
+
+
+def test_stratum():
+    a = dns.rdatatype.A
+    assert stratum(origin, a, origin) == (a, origin)
+    www = dns.name.from_text('www.example.com')
+    assert stratum(www, a, origin) == (a, www)
+    assert stratum(dns.name.from_text('a.b.www.example.com'), a, origin) == \
+        (a, www)
+
+
+def test_wilson_interval():
+    low, high = wilson_interval(0.0, 10)
+    assert low == 0.0
+    assert high == pytest.approx(0.2775, abs=1e-4)
+    low, high = wilson_interval(0.5, 100)
+    assert (low, high) == pytest.approx((0.4038, 0.5962), abs=1e-4)
+    assert wilson_interval(0.0, 0) == (0.0, 1.0)
+
+
+def test_estimate():
+    assert estimate({'a': 10}, {}, {}) is None
+    rate, low, high, size = estimate({'a': 100}, {'a': 10}, {'a': 1})
+    assert rate == pytest.approx(0.1)
+    assert size == pytest.approx(10)
+    assert low < rate < high
+    # A stratum of 900 with no mismatches outweighs a stratum of 100.
+    rate, low, high, size = estimate(
+        {'a': 100, 'b': 900}, {'a': 10, 'b': 10}, {'a': 5})
+    assert rate == pytest.approx(0.05)
+    assert size < 20
+
+
+def sample(size=None, fraction=None, seed=1):
+    names = [dns.name.from_text(text) for text in (
+        'a.example.com', 'x.a.example.com', 'y.a.example.com',
+        'b.example.com',
+    )]
+    rdatasets = [
+        (name, dns.rdataset.Rdataset(1, rdtype))
+        for name in names
+        for rdtype in (dns.rdatatype.A, dns.rdatatype.TXT)
+        for _ in range(5)
+    ]
+    sampler = StratifiedSample(origin, size, fraction, seed)
+    for name, rdataset in rdatasets:
+        sampler.count(name, rdataset)
+    sampler.draw()
+    return sampler, [sampler.check(name, rdataset)
+                     for name, rdataset in rdatasets]
+
+
+def test_stratified_sample():
+    sampler, chosen = sample(size=8)
+    assert len(sampler.population) == 4
+    # In proportion to the 15 and 5 rdatasets of the strata.
+    assert sorted(sampler.quotas().values()) == [1, 1, 3, 3]
+    assert sampler.drawn == 8
+    assert sum(chosen) == 8
+    assert sum(chosen[0:5] + chosen[10:15] + chosen[20:25]) == 3
+    assert sum(chosen[30:35]) == 1
+    assert sample(size=8)[1] == chosen
+    assert sum(sample(fraction=0.5)[1]) == 20
+    assert sum(sample(size=1000)[1]) == 40
+    assert sum(sample(fraction=0.001)[1]) == 1
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_scheduler.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import functools
+import socket
+import pytest
+import dns.exception
+import dns.flags
+import dns.message
+from dnszonetest.scheduler import RetryScheduler
+from dnszonetest.transport import tcp
+from tests import dnsserver
+
+
+def test_retry_scheduler_timeout():
+    scheduler = RetryScheduler(retries=3, timeout=2, initial_timeout=1)
+    assert scheduler.timeout('192.0.2.1') == 1
+    assert scheduler.timeout('192.0.2.1', 1) == 2
+    assert scheduler.timeout('192.0.2.1', 2) == 2
+    for _ in range(20):
+        scheduler.update('192.0.2.1', 0.02)
+    assert scheduler.timeout('192.0.2.1') == pytest.approx(0.05, abs=0.01)
+    assert scheduler.timeout('192.0.2.1', 1) == pytest.approx(0.1, abs=0.02)
+    assert scheduler.timeout('192.0.2.2') == 1
+
+
+def test_retry_scheduler_retries():
+    timeouts = []
+
+    def udp(q, where, timeout=0):
+        timeouts.append(timeout)
+        if len(timeouts) < 3:
+            raise dns.exception.Timeout
+        return dns.message.make_response(q)
+
+    scheduler = RetryScheduler(retries=2, timeout=10, initial_timeout=0.5)
+    scheduler.query(dns.message.make_query('example.com', 'A'),
+                    '192.0.2.1', udp)
+    assert timeouts == [0.5, 1, 2]
+
+
+def test_retry_scheduler_raises_timeout():
+    def udp(q, where, timeout=0):
+        raise dns.exception.Timeout
+
+    scheduler = RetryScheduler(retries=1)
+    with pytest.raises(dns.exception.Timeout):
+        scheduler.query(dns.message.make_query('example.com', 'A'),
+                        '192.0.2.1', udp)
+
+
+def test_retry_scheduler_truncated():
+    def udp(q, where, timeout=0):
+        response = dns.message.make_response(q)
+        response.flags |= dns.flags.TC
+        return response
+
+    def tcp(q, where, timeout=0):
+        return dns.message.make_response(q)
+
+    scheduler = RetryScheduler()
+    response = scheduler.query(dns.message.make_query('example.com', 'A'),
+                               '192.0.2.1', udp, tcp)
+    assert not response.flags & dns.flags.TC
+
+
+def test_retry_scheduler_truncated_tcp_refused():
+    attempts = []
+
+    def udp(q, where, timeout=0):
+        attempts.append(timeout)
+        response = dns.message.make_response(q)
+        response.flags |= dns.flags.TC
+        return response.to_wire()
+
+    port = dnsserver.closed_port(socket.SOCK_STREAM)
+    scheduler = RetryScheduler(retries=2, timeout=1)
+    with pytest.raises(dns.exception.Timeout):
+        scheduler.query(dns.message.make_query('example.com', 'A'),
+                        '127.0.0.1', udp,
+                        functools.partial(tcp, port=port))
+    assert len(attempts) == 3
+
+
+def test_retry_scheduler_tcp_refused():
+    attempts = []
+    port = dnsserver.closed_port(socket.SOCK_STREAM)
+
+    def query(q, where, timeout=0):
+        attempts.append(timeout)
+        return tcp(q, where, timeout=timeout, port=port)
+
+    scheduler = RetryScheduler(retries=2, timeout=1)
+    with pytest.raises(dns.exception.Timeout):
+        scheduler.query(dns.message.make_query('example.com', 'A'),
+                        '127.0.0.1', query, query)
+    assert len(attempts) == 3
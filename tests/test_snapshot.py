@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_snapshot.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import io
+import os
+import shutil
+import pytest
+import dns.rdatatype
+import dns.zone
+import dnszonetest.snapshot
+from dnszonetest.main import DnsZoneTest
+from dnszonetest.snapshot import (
+    SnapshotZone,
+    file_key,
+    load_snapshot,
+    snapshot_path,
+    write_snapshot,
+)
+
+
+def rdatasets(zone, rdtype=dns.rdatatype.ANY):
+    return sorted(
+        (name, rdataset.rdtype, rdataset.covers, rdataset.ttl,
+         sorted(rdata.to_text() for rdata in rdataset))
+        for name, rdataset in zone.iterate_rdatasets(rdtype)
+    )
+
+
+def test_snapshot(zonefile, zone, tmpdir):
+    path = str(tmpdir.join('snapshot'))
+    write_snapshot(path, zone, file_key(zonefile))
+    snapshot = SnapshotZone(path)
+    assert snapshot.origin == zone.origin
+    assert len(snapshot) == len(list(zone.iterate_rdatasets()))
+    assert rdatasets(snapshot) == rdatasets(zone)
+    assert rdatasets(snapshot, dns.rdatatype.MX) == \
+        rdatasets(zone, dns.rdatatype.MX)
+    snapshot.close()
+
+
+def test_load_snapshot(zonefile, zone, tmpdir):
+    copy = str(tmpdir.join('example.com'))
+    shutil.copy(zonefile, copy)
+    directory = str(tmpdir.mkdir('snapshots'))
+    assert load_snapshot(directory, copy, 'example.com') is None
+    write_snapshot(snapshot_path(directory, copy, 'example.com'), zone,
+                   file_key(copy))
+    snapshot = load_snapshot(directory, copy, 'example.com')
+    assert rdatasets(snapshot) == rdatasets(zone)
+    assert load_snapshot(directory, copy, 'example.net') is None
+    with io.open(copy, 'a', encoding='utf-8') as fh:
+        fh.write('\nnew IN A 192.0.2.9\n')
+    assert load_snapshot(directory, copy, 'example.com') is None
+
+
+def test_dzt_get_zone_from_snapshot(zonefile, zone, tmpdir):
+    directory = str(tmpdir.join('snapshots'))
+    dzt = DnsZoneTest('example.com', zonefile, snapshot_dir=directory)
+    dzt.get_zone_from_file()
+    assert isinstance(dzt.zone_from_file, dns.zone.Zone)
+    dzt.get_zone_from_file()
+    assert isinstance(dzt.zone_from_file, SnapshotZone)
+    assert rdatasets(dzt.zone_from_file) == rdatasets(zone)
+
+
+def test_load_snapshot_hashes_touched(zonefile, zone, tmpdir, monkeypatch):
+    copy = str(tmpdir.join('example.com'))
+    shutil.copy(zonefile, copy)
+    directory = str(tmpdir.mkdir('snapshots'))
+    write_snapshot(snapshot_path(directory, copy, 'example.com'), zone,
+                   file_key(copy))
+
+    def unhashed(path):
+        raise AssertionError('hashed an unchanged zone file')
+
+    monkeypatch.setattr(dnszonetest.snapshot, 'file_key', unhashed)
+    load_snapshot(directory, copy, 'example.com').close()
+    monkeypatch.undo()
+    # Touched, same content.
+    os.utime(copy, (0, 0))
+    load_snapshot(directory, copy, 'example.com').close()
+    # Rewritten, same size.
+    with io.open(copy, 'r+b') as fh:
+        fh.write(b';')
+    os.utime(copy, (1, 1))
+    assert load_snapshot(directory, copy, 'example.com') is None
+
+
+def test_dzt_finish_closes_snapshot(zonefile, tmpdir):
+    directory = str(tmpdir.join('snapshots'))
+    dzt = DnsZoneTest('example.com', zonefile, snapshot_dir=directory)
+    dzt.get_zone_from_file()
+    dzt.get_zone_from_file()
+    snapshot = dzt.zone_from_file
+    assert isinstance(snapshot, SnapshotZone)
+    dzt.finish()
+    assert dzt.zone_from_file is None
+    # A closed map raises ValueError; mmap.closed is Python 3 only.
+    with pytest.raises(ValueError):
+        snapshot._map[:1]
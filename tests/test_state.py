@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_state.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import dns.message
+import dns.name
+import dns.rdataset
+import dnszonetest.transport
+from dnszonetest.main import DnsZoneTest
+from dnszonetest.state import State, rdataset_digest
+from tests import dnsserver
+
+
+def test_rdataset_digest():
+    name = dns.name.from_text('www.example.com')
+    assert rdataset_digest(
+        name, dns.rdataset.from_text(1, 1, 300, '192.0.2.1', '192.0.2.2')
+    ) == rdataset_digest(
+        name, dns.rdataset.from_text(1, 1, 300, '192.0.2.2', '192.0.2.1')
+    )
+    assert rdataset_digest(
+        name, dns.rdataset.from_text(1, 1, 300, '192.0.2.1')
+    ) != rdataset_digest(
+        name, dns.rdataset.from_text(1, 1, 600, '192.0.2.1')
+    )
+
+
+def test_state(tmpdir):
+    path = str(tmpdir.join('state.json'))
+    state = State(path)
+    assert not state.unchanged('example.com', '192.0.2.1', 'www A', 'a')
+    state.keep('example.com', '192.0.2.1', 'www A', 'a')
+    state.save()
+    state = State(path)
+    assert state.unchanged('example.com.', '192.0.2.1', 'www A', 'a')
+    assert not state.unchanged('example.com', '192.0.2.2', 'www A', 'a')
+    assert not state.unchanged('example.com', '192.0.2.1', 'www A', 'b')
+    state.save()
+    assert not State(path).unchanged('example.com', '192.0.2.1', 'www A',
+                                     'a')
+
+
+def test_dzt_compare_state(zonefile, zone, tmpdir, monkeypatch):
+    mail = dns.name.from_text('mail.example.com')
+    overrides = {(mail, 1): dns.rdataset.from_text(1, 1, 28800, '192.0.2.9')}
+    queries = []
+
+    def udp(q, where, timeout=0, port=53):
+        queries.append(dns.message.from_wire(q).question[0].name)
+        return dnsserver.answer(zone, q, overrides)
+
+    monkeypatch.setattr(dnszonetest.transport, 'udp', udp)
+    state_file = str(tmpdir.join('state.json'))
+    for _ in range(2):
+        del queries[:]
+        dzt = DnsZoneTest('example.com', zonefile, '192.0.2.53',
+                          state_file=state_file)
+        dzt.compare()
+        assert dzt.mismatch_rdataset == 1
+    assert queries == [mail]
+    assert dzt.unchanged > 0
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_transport.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import socket
+import pytest
+import dns.exception
+import dns.message
+import dns.rdataset
+from dnszonetest.main import Record
+from dnszonetest.pool import imap_unordered
+from dnszonetest.scheduler import RetryScheduler
+from dnszonetest.main import QUERY_TEMPLATES
+from dnszonetest.transport import TCPPipeline, tcp, udp
+from tests import dnsserver
+
+
+def test_tcp_pipeline(zone):
+    names = ['mail.example.com', 'mail2.example.com', 'mail3.example.com']
+    with dnsserver.TCPServer(zone) as server:
+        pipeline = TCPPipeline('127.0.0.1', server.port, connections=2)
+        responses = list(
+            imap_unordered(
+                lambda name: pipeline.query(
+                    dns.message.make_query(name, 'A')),
+                names * 20,
+                8,
+            )
+        )
+        pipeline.close()
+    assert len(responses) == 60
+    assert server.connections == 2
+    assert server.queries == 60
+
+
+def test_tcp_pipeline_reconnects(zone):
+    with dnsserver.TCPServer(zone) as server:
+        pipeline = TCPPipeline('127.0.0.1', server.port)
+        pipeline.query(dns.message.make_query('mail.example.com', 'A'))
+        pipeline._connections[0].sock.shutdown(2)
+        response = pipeline.query(
+            dns.message.make_query('mail.example.com', 'A'))
+        pipeline.close()
+    assert str(response.answer[0][0]) == '192.0.2.3'
+
+
+def test_record_query_transport(zone):
+    rdataset = dns.rdataset.from_text(1, 1, 28800, '192.0.2.3')
+    with dnsserver.TCPServer(zone) as server:
+        pipeline = TCPPipeline('127.0.0.1', server.port)
+        record = Record('mail.example.com', rdataset, 'tcp')
+        record.query('127.0.0.1', transport=pipeline)
+        pipeline.close()
+    assert record.rdataset_match
+
+
+def test_tcp_pipeline_refused():
+    port = dnsserver.closed_port(socket.SOCK_STREAM)
+    pipeline = TCPPipeline('127.0.0.1', port)
+    with pytest.raises(dns.exception.Timeout):
+        pipeline.query(dns.message.make_query('mail.example.com', 'A'))
+    rdataset = dns.rdataset.from_text(1, 1, 28800, '192.0.2.3')
+    record = Record('mail.example.com', rdataset, 'tcp')
+    record.query('127.0.0.1', transport=pipeline)
+    assert record.query_res is None
+    pipeline.close()
+
+
+def test_tcp(zone):
+    with dnsserver.TCPServer(zone) as server:
+        data = tcp(QUERY_TEMPLATES[True].make('mail.example.com', 1),
+                   '127.0.0.1', port=server.port)
+    assert str(dns.message.from_wire(data).answer[0][0]) == '192.0.2.3'
+
+
+def test_udp_closed_port():
+    port = dnsserver.closed_port()
+    with pytest.raises(dns.exception.Timeout):
+        udp(QUERY_TEMPLATES[True].make('mail.example.com', 1),
+            '127.0.0.1', timeout=0.2, port=port)
+    rdataset = dns.rdataset.from_text(1, 1, 28800, '192.0.2.3')
+    record = Record('mail.example.com', rdataset, 'udp')
+    record.query('127.0.0.1', scheduler=RetryScheduler(0, 0.2), port=port)
+    assert record.query_res is None
+    assert not record.rdataset_match
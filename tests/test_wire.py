@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_wire.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import dns.flags
+import dns.message
+import dns.name
+import dns.rdataset
+import dns.rrset
+from dnszonetest import transport
+from dnszonetest.main import Record
+from dnszonetest.wire import (
+    is_response,
+    min_ttl,
+    rdataset_wire,
+    read_answer,
+    read_question,
+    truncated,
+)
+from tests import dnsserver
+
+
+def response(name, rdtype, *rdatas):
+    q = dns.message.make_query(name, rdtype)
+    r = dns.message.make_response(q)
+    if rdatas:
+        r.answer.append(dns.rrset.from_text(q.question[0].name, 300, 'IN',
+                                            rdtype, *rdatas))
+    return q, r
+
+
+def test_read_answer():
+    q, r = response('www.example.com', 'A', '192.0.2.2', '192.0.2.1')
+    expected = dns.rdataset.from_text('IN', 'A', 300, '192.0.2.1',
+                                      '192.0.2.2')
+    assert read_answer(r.to_wire()) == ((b'www', b'example', b'com'), 1, 1,
+                                        300, rdataset_wire(expected))
+    assert is_response(q.to_wire(), r.to_wire())
+    assert not is_response(q.to_wire(), q.to_wire())
+    assert not truncated(r.to_wire())
+    r.flags |= dns.flags.TC
+    assert truncated(r.to_wire())
+    assert truncated(r)
+
+
+def test_read_answer_names():
+    _, r = response('example.com', 'MX', '10 mail.example.com.')
+    assert read_answer(r.to_wire()) is None
+    assert rdataset_wire(r.answer[0]) is None
+    _, r = response('example.com', 'A')
+    assert read_answer(r.to_wire()) is None
+
+
+def test_record_read_wire():
+    rdataset = dns.rdataset.from_text('IN', 'A', 28800, '192.0.2.1')
+    record = Record('www.example.com', rdataset)
+    _, record.query_res = response('www.example.com', 'A', '192.0.2.1')
+    record.query_res = record.query_res.to_wire()
+    record.read_response('192.0.2.53')
+    assert isinstance(record.query_res, bytes)
+    assert record.rdataset_match
+    assert not record.ttl_match
+    _, record.query_res = response('www.example.com', 'A', '192.0.2.2')
+    record.query_res = record.query_res.to_wire()
+    record.read_response('192.0.2.53')
+    assert isinstance(record.query_res, dns.message.Message)
+    assert not record.rdataset_match
+
+
+def test_record_read_wire_owner():
+    rdataset = dns.rdataset.from_text('IN', 'A', 28800, '192.0.2.1')
+    record = Record('www.example.com', rdataset)
+    _, r = response('www.example.com', 'A')
+    r.answer.append(dns.rrset.from_text('mail.example.com.', 300, 'IN', 'A',
+                                        '192.0.2.1'))
+    record.query_res = r.to_wire()
+    record.read_response('192.0.2.53')
+    assert isinstance(record.query_res, dns.message.Message)
+    assert not record.rdataset_match
+    _, r = response('WWW.Example.com', 'A', '192.0.2.1')
+    record.query_res = r.to_wire()
+    record.read_response('192.0.2.53')
+    assert isinstance(record.query_res, bytes)
+    assert record.rdataset_match
+
+
+def test_transport_udp(zone):
+    with dnsserver.UDPServer(zone) as server:
+        data = transport.udp(
+            dns.message.make_query('mail.example.com', 'A'),
+            '127.0.0.1',
+            port=server.port,
+        )
+    assert read_answer(data)[4] == rdataset_wire(
+        dns.rdataset.from_text('IN', 'A', 300, '192.0.2.3'))
+
+
+def test_record_read_wire_whole_response():
+    rdataset = dns.rdataset.from_text('IN', 'A', 28800, '192.0.2.1')
+    record = Record('www.example.com', rdataset)
+    _, r = response('www.example.com', 'A', '192.0.2.1')
+    r.flags |= dns.flags.AA
+    record.query_res = r.to_wire()
+    record.read_response('192.0.2.53')
+    assert isinstance(record.query_res, bytes)
+    assert record.verdict.authoritative
+    r.answer.append(dns.rrset.from_text('mail.example.com.', 300, 'IN', 'A',
+                                        '192.0.2.3'))
+    record.query_res = r.to_wire()
+    record.read_response('192.0.2.53')
+    assert isinstance(record.query_res, dns.message.Message)
+    assert record.rdataset_match
+    assert record.verdict.unexpected == ['mail.example.com. A']
+
+
+def test_read_question_min_ttl():
+    q, r = response('WWW.example.com', 'A', '192.0.2.1')
+    r.authority.append(dns.rrset.from_text('example.com.', 60, 'IN', 'NS',
+                                           'ns.example.com.'))
+    assert read_question(q.to_wire()) == (
+        dns.flags.RD, (b'www', b'example', b'com'), 1, 1)
+    assert min_ttl(r.to_wire()) == 60
+    q.use_edns(0)
+    assert min_ttl(dns.message.make_response(q).to_wire()) is None
+    assert min_ttl(b'\0') is None
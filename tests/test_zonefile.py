@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# vim: ts=4 et sw=4 sts=4 ft=python fenc=UTF-8 ai
+# tests/test_zonefile.py
+
+from __future__ import print_function
+from __future__ import unicode_literals
+import io
+import pytest
+import dns.zone
+from dnszonetest.exceptions import NoZoneFileException
+from dnszonetest.zonefile import stream_rdatasets
+
+
+def rdatasets(items):
+    return sorted(
+        (name.to_text(), rdataset.rdtype, rdataset.ttl,
+         sorted(rdata.to_text() for rdata in rdataset))
+        for name, rdataset in items
+    )
+
+
+# The zone file has two lines for owner name "IN" two owner lines apart, so
+# they are merged from chunks of 2 owner lines up.
+@pytest.mark.parametrize('chunk_size', [2, 5, 1000])
+def test_stream_rdatasets(zonefile, zone, chunk_size):
+    assert rdatasets(stream_rdatasets(zonefile, 'example.com', chunk_size)) \
+        == rdatasets(zone.iterate_rdatasets())
+
+
+def test_stream_rdatasets_directives(tmpdir):
+    included = tmpdir.join('included')
+    with io.open(str(included), 'w', encoding='utf-8') as fh:
+        fh.write('host IN A 192.0.2.10\n')
+    zonefile = tmpdir.join('example.com')
+    with io.open(str(zonefile), 'w', encoding='utf-8') as fh:
+        fh.write('''$ORIGIN example.com.
+@ 3600 IN SOA ns hostmaster 1 1d 2h 4w 300
+@ IN NS ns
+$INCLUDE {0} sub.example.com.
+ns IN TXT "not ( a paren" ; nor ( this
+$ORIGIN sub
+www IN A 192.0.2.11
+$TTL 60
+txt IN TXT ( "a"
+"b" )
+'''.format(included))
+    result = rdatasets(stream_rdatasets(str(zonefile), 'example.com', 1))
+    assert ('txt.sub.example.com.', 16, 60, ['"a" "b"']) in result
+    # The TTL of records without one depends on the dnspython version.
+    result = [item[:2] + item[3:] for item in result]
+    assert ('host.sub.example.com.', 1, ['192.0.2.10']) in result
+    assert ('ns.example.com.', 16, ['"not ( a paren"']) in result
+    assert ('www.sub.example.com.', 1, ['192.0.2.11']) in result
+
+
+def test_stream_rdatasets_last_ttl(tmpdir):
+    zonefile = tmpdir.join('example.com')
+    with io.open(str(zonefile), 'w', encoding='utf-8') as fh:
+        fh.write('''$ORIGIN example.com.
+@ IN SOA ns hostmaster 1 1d 2h 4w 5
+@ IN NS ns
+ns 100 IN A 192.0.2.2
+''')
+        for index in range(10):
+            fh.write('host{0} IN A 192.0.2.{0}\n'.format(index))
+    result = rdatasets(stream_rdatasets(str(zonefile), 'example.com', 2))
+    # With dnspython 2, the hosts get the TTL of ns, not the SOA minimum.
+    assert result == rdatasets(dns.zone.from_file(
+        str(zonefile), 'example.com', relativize=False).iterate_rdatasets())
+
+
+def test_stream_rdatasets_raises_NoZoneFileException():
+    with pytest.raises(NoZoneFileException):
+        list(stream_rdatasets('/path/to/non/existing/zone/file',
+                              'example.com'))